@@ -32,8 +32,11 @@ setup(
     ],
     test_suite='turgles.tests',
     install_requires=[
-        'cffi>=0.6,<0.8',
+        'cffi>=1.12',
         'pycparser>=2.10,<3.0',
         'pyglet==1.2alpha1',
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
 )
@@ -0,0 +1,288 @@
+#include <math.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define TURTLE_DATA_SIZE 16
+/* set when a turtle's previous position is worth interpolating from */
+#define PREV_VALID 15
+
+/* must match the cdef in boids.py */
+typedef struct {
+    float magnitude;
+    float half_w;
+    float half_h;
+    float radius;
+    float separation;
+    float separation_weight;
+    float alignment_weight;
+    float cohesion_weight;
+    float max_turn;
+} boids_params;
+
+/* A live turtle, as it was at the start of the step */
+typedef struct {
+    float x, y, heading, ct, st;
+    float *data;
+    int cell;
+} boid;
+
+static float wrap(float v, float half)
+{
+    if (v > half)
+    {
+        return v - 2 * half;
+    }
+    if (v < -half)
+    {
+        return v + 2 * half;
+    }
+    return v;
+}
+
+/*
+ * The grid cell along one axis that v is in, of cells cells of size size
+ * from -half. Values outside the world, or NaN, are clamped to the edge
+ * cells, which keeps neighbours within a cell of each other.
+ */
+static int grid_cell(float v, float half, float size, int cells)
+{
+    float f = (v + half) / size;
+    if (!(f >= 0))
+    {
+        return 0;
+    }
+    if (f >= cells)
+    {
+        return cells - 1;
+    }
+    return (int)f;
+}
+
+/*
+ * Cells along an axis of length 2 * half, each at least radius wide, so
+ * neighbours are within one cell.
+ */
+static int grid_cells(float half, float radius)
+{
+    float cells = floorf(2 * half / radius);
+    if (!(cells >= 1))
+    {
+        return 1;
+    }
+    /* capped again by boids() */
+    if (cells > 65536)
+    {
+        return 65536;
+    }
+    return (int)cells;
+}
+
+/* Moves one boid, see boids.py for the rules */
+static void steer(boid *b, const boid *boids, const int *cell_start,
+                  int columns, int rows, const boids_params *p)
+{
+    float r2 = p->radius * p->radius;
+    float s2 = p->separation * p->separation;
+    float sum_x = 0, sum_y = 0, sum_c = 0, sum_s = 0, sep_x = 0, sep_y = 0;
+    int n = 0;
+    int column = b->cell % columns;
+    int row = b->cell / columns;
+    int dr, dc, k;
+    float heading = b->heading;
+
+    for (dr = -1; dr <= 1; ++dr)
+    {
+        int r = row + dr;
+        if (r < 0 || r >= rows)
+        {
+            continue;
+        }
+        for (dc = -1; dc <= 1; ++dc)
+        {
+            int c = column + dc;
+            int cell;
+            if (c < 0 || c >= columns)
+            {
+                continue;
+            }
+            cell = c + r * columns;
+            for (k = cell_start[cell]; k < cell_start[cell + 1]; ++k)
+            {
+                const boid *o = boids + k;
+                float dx = o->x - b->x;
+                float dy = o->y - b->y;
+                float d2 = dx * dx + dy * dy;
+                if (o == b || d2 > r2)
+                {
+                    continue;
+                }
+                ++n;
+                sum_x += o->x;
+                sum_y += o->y;
+                sum_c += o->ct;
+                sum_s += o->st;
+                if (d2 < s2)
+                {
+                    sep_x -= dx;
+                    sep_y -= dy;
+                }
+            }
+        }
+    }
+
+    if (n > 0)
+    {
+        float vx = b->ct
+            + p->alignment_weight * (sum_c / n)
+            + p->cohesion_weight * ((sum_x / n - b->x) / p->radius)
+            + p->separation_weight * (sep_x / p->separation);
+        float vy = b->st
+            + p->alignment_weight * (sum_s / n)
+            + p->cohesion_weight * ((sum_y / n - b->y) / p->radius)
+            + p->separation_weight * (sep_y / p->separation);
+        float desired = atan2f(vy, vx) * 180.0 / M_PI;
+        float turn = fmodf(desired - heading + 540.0, 360.0) - 180.0;
+        if (turn > p->max_turn)
+        {
+            turn = p->max_turn;
+        }
+        else if (turn < -p->max_turn)
+        {
+            turn = -p->max_turn;
+        }
+        heading = fmodf(heading + turn, 360.0);
+    }
+
+    {
+        float *data = b->data;
+        float theta = heading / 180.0 * M_PI;
+        float ct = cosf(theta);
+        float st = sinf(theta);
+        float x = b->x + p->magnitude * ct;
+        float y = b->y + p->magnitude * st;
+        data[0] = wrap(x, p->half_w);
+        data[1] = wrap(y, p->half_h);
+        /* don't draw it interpolated across the world */
+        if (data[0] != x || data[1] != y)
+        {
+            data[PREV_VALID] = 0.0;
+        }
+        data[4] = heading;
+        data[6] = ct;
+        data[7] = st;
+    }
+}
+
+/*
+ * One boids step over all the turtles in several buffers, which flock
+ * together. live is NULL, or has a NULL or per-turtle flags array for each
+ * buffer, to skip turtles waiting for removal. Returns -1 if out of memory.
+ *
+ * Neighbours are found in a grid over the wrapped world, of at most a few
+ * cells per boid, with the boids counting sorted by cell.
+ */
+int boids(
+        float **turtles,
+        const int *counts,
+        const unsigned char **live,
+        int num_buffers,
+        const boids_params *p
+)
+{
+    int total = 0, n = 0, i, j;
+    int columns, rows, cells;
+    float cell_w, cell_h;
+    boid *boids, *sorted;
+    int *cell_start, *next;
+
+    for (i = 0; i < num_buffers; ++i)
+    {
+        total += counts[i];
+    }
+    if (total == 0)
+    {
+        return 0;
+    }
+    boids = malloc(2 * (size_t)total * sizeof(boid));
+    if (boids == NULL)
+    {
+        return -1;
+    }
+    sorted = boids + total;
+
+    /* snapshot the live turtles, so the step doesn't depend on order */
+    for (i = 0; i < num_buffers; ++i)
+    {
+        for (j = 0; j < counts[i]; ++j)
+        {
+            float *data = turtles[i] + j * TURTLE_DATA_SIZE;
+            boid *b;
+            if (live != NULL && live[i] != NULL && !live[i][j])
+            {
+                continue;
+            }
+            b = boids + n;
+            b->x = data[0];
+            b->y = data[1];
+            b->heading = data[4];
+            b->ct = data[6];
+            b->st = data[7];
+            b->data = data;
+            ++n;
+        }
+    }
+    if (n == 0)
+    {
+        free(boids);
+        return 0;
+    }
+
+    /* no more than about four cells per boid, however small the radius */
+    columns = grid_cells(p->half_w, p->radius);
+    rows = grid_cells(p->half_h, p->radius);
+    if ((double)columns * rows > 4.0 * n + 64)
+    {
+        double scale = sqrt((4.0 * n + 64) / ((double)columns * rows));
+        columns = (int)(columns * scale);
+        rows = (int)(rows * scale);
+        if (columns < 1) columns = 1;
+        if (rows < 1) rows = 1;
+    }
+    cells = columns * rows;
+    cell_w = 2 * p->half_w / columns;
+    cell_h = 2 * p->half_h / rows;
+
+    cell_start = calloc(2 * ((size_t)cells + 1), sizeof(int));
+    if (cell_start == NULL)
+    {
+        free(boids);
+        return -1;
+    }
+    next = cell_start + cells + 1;
+    for (i = 0; i < n; ++i)
+    {
+        int column = grid_cell(boids[i].x, p->half_w, cell_w, columns);
+        int row = grid_cell(boids[i].y, p->half_h, cell_h, rows);
+        boids[i].cell = column + row * columns;
+        cell_start[boids[i].cell + 1] += 1;
+    }
+    for (i = 0; i < cells; ++i)
+    {
+        cell_start[i + 1] += cell_start[i];
+    }
+    /* counting sort, each boid straight to the next place in its cell */
+    memcpy(next, cell_start, cells * sizeof(int));
+    for (i = 0; i < n; ++i)
+    {
+        sorted[next[boids[i].cell]++] = boids[i];
+    }
+
+    for (i = 0; i < n; ++i)
+    {
+        steer(sorted + i, sorted, cell_start, columns, rows, p);
+    }
+
+    free(cell_start);
+    free(boids);
+    return 0;
+}
@@ -0,0 +1,260 @@
+"""Flocking simulation kernels.
+
+Every live turtle, of every shape, is a boid in one flock. Each step, a
+turtle looks at the others within radius, as they were at the start of the
+step, and steers towards the sum of:
+
+ * its current heading
+ * alignment: the average heading (as cos/sin) of its neighbours
+ * cohesion: the offset to its neighbours' centre, relative to radius
+ * separation: the offsets away from neighbours closer than separation,
+   relative to separation
+
+each weighted as set in config.py, turning at most max_turn degrees. It then
+moves forward, wrapping around the edges of the world. Heading, cos/sin of
+heading and position are written in place. A turtle that wraps has its
+previous position marked invalid (see scheduler.py), so it isn't drawn
+interpolated across the world.
+
+The python, numpy and C variants give the same results, up to float
+rounding.
+"""
+from __future__ import division, print_function, absolute_import
+
+from math import atan2, cos, degrees, fmod, radians, sin
+
+from turgles.config import (
+    speed,
+    world_width,
+    world_height,
+    boids_radius,
+    boids_separation,
+    boids_separation_weight,
+    boids_alignment_weight,
+    boids_cohesion_weight,
+    boids_max_turn,
+)
+from turgles.kernels import load_library, register
+from turgles.memory import ffi, numpy, TURTLE_MODEL_DATA_SIZE
+from turgles.scheduler import PREV_VALID
+from turgles.spatial import SpatialGrid
+
+half_w = world_width / 2
+half_h = world_height / 2
+
+ffi.cdef("""
+    typedef struct {
+        float magnitude;
+        float half_w;
+        float half_h;
+        float radius;
+        float separation;
+        float separation_weight;
+        float alignment_weight;
+        float cohesion_weight;
+        float max_turn;
+    } boids_params;
+
+    int boids(float**, const int*, const unsigned char**, int,
+              const boids_params*);
+""")
+fast = load_library('libfast.so')
+
+
+def _wrap(v, half):
+    if v > half:
+        return v - 2 * half
+    if v < -half:
+        return v + 2 * half
+    return v
+
+
+def _steer(heading, ct, st, x, y, n, sum_x, sum_y, sum_c, sum_s, sep_x,
+           sep_y):
+    """The new heading of a turtle, given its neighbour sums"""
+    if not n:
+        return heading
+    vx = (ct + boids_alignment_weight * (sum_c / n) +
+          boids_cohesion_weight * ((sum_x / n - x) / boids_radius) +
+          boids_separation_weight * (sep_x / boids_separation))
+    vy = (st + boids_alignment_weight * (sum_s / n) +
+          boids_cohesion_weight * ((sum_y / n - y) / boids_radius) +
+          boids_separation_weight * (sep_y / boids_separation))
+    desired = degrees(atan2(vy, vx))
+    turn = fmod(desired - heading + 540.0, 360.0) - 180.0
+    turn = max(-boids_max_turn, min(boids_max_turn, turn))
+    return fmod(heading + turn, 360.0)
+
+
+def slow_update(dt, buffers, tick=0, seed=None):
+    magnitude = speed * dt
+    grid = SpatialGrid(boids_radius, use_numpy=False)
+    grid.build(buffers)
+    if not grid.count:
+        return
+    # snapshot every live turtle's heading, and where its data is
+    snapshot = []
+    for buffer, offset, live in grid.offsets:
+        data = buffer.model.data
+        if live is None:
+            live = range(buffer.count)
+        for index in live:
+            i = index * TURTLE_MODEL_DATA_SIZE
+            snapshot.append((data, i, data[i + 4], data[i + 6], data[i + 7]))
+
+    xs = grid.x
+    ys = grid.y
+    r2 = boids_radius * boids_radius
+    s2 = boids_separation * boids_separation
+    for k, (data, i, heading, ct, st) in enumerate(snapshot):
+        x = xs[k]
+        y = ys[k]
+        n = 0
+        sum_x = sum_y = sum_c = sum_s = sep_x = sep_y = 0.0
+        candidates = grid.candidates(
+            x - boids_radius, y - boids_radius,
+            x + boids_radius, y + boids_radius)
+        for j in candidates:
+            dx = xs[j] - x
+            dy = ys[j] - y
+            d2 = dx * dx + dy * dy
+            if j == k or d2 > r2:
+                continue
+            n += 1
+            sum_x += xs[j]
+            sum_y += ys[j]
+            sum_c += snapshot[j][3]
+            sum_s += snapshot[j][4]
+            if d2 < s2:
+                sep_x -= dx
+                sep_y -= dy
+        heading = _steer(heading, ct, st, x, y, n, sum_x, sum_y, sum_c,
+                         sum_s, sep_x, sep_y)
+        theta = radians(heading)
+        ct = cos(theta)
+        st = sin(theta)
+        x += magnitude * ct
+        y += magnitude * st
+        wrapped_x = _wrap(x, half_w)
+        wrapped_y = _wrap(y, half_h)
+        data[i] = wrapped_x
+        data[i + 1] = wrapped_y
+        if wrapped_x != x or wrapped_y != y:
+            data[i + PREV_VALID] = 0.0
+        data[i + 4] = heading
+        data[i + 6] = ct
+        data[i + 7] = st
+    for buffer in buffers:
+        buffer.model.mark_dirty()
+
+
+def numpy_update(dt, buffers, tick=0, seed=None):
+    magnitude = speed * dt
+    grid = SpatialGrid(boids_radius)
+    grid.build(buffers)
+    if not grid.count:
+        return
+    # snapshot every live turtle's model data, in grid order
+    models = []
+    for buffer, offset, live in grid.offsets:
+        model = buffer.model.as_array()
+        models.append(model if live is None else model[live])
+    snapshot = numpy.concatenate(models).astype(numpy.float64)
+    x = snapshot[:, 0]
+    y = snapshot[:, 1]
+    heading = snapshot[:, 4]
+    ct = snapshot[:, 6]
+    st = snapshot[:, 7]
+
+    count = grid.count
+    i, j = grid.pairs(boids_radius)
+    n = numpy.bincount(i, minlength=count)
+
+    def total(weights, pairs=i):
+        return numpy.bincount(pairs, weights, minlength=count)
+
+    dx = x[j] - x[i]
+    dy = y[j] - y[i]
+    close = dx * dx + dy * dy < boids_separation * boids_separation
+    has = n > 0
+    m = numpy.maximum(n, 1)
+    vx = (ct + boids_alignment_weight * (total(ct[j]) / m) +
+          boids_cohesion_weight * ((total(x[j]) / m - x) / boids_radius) +
+          boids_separation_weight *
+          (-total(dx[close], i[close]) / boids_separation))
+    vy = (st + boids_alignment_weight * (total(st[j]) / m) +
+          boids_cohesion_weight * ((total(y[j]) / m - y) / boids_radius) +
+          boids_separation_weight *
+          (-total(dy[close], i[close]) / boids_separation))
+    desired = numpy.degrees(numpy.arctan2(vy, vx))
+    turn = numpy.fmod(desired - heading + 540.0, 360.0) - 180.0
+    turn = numpy.clip(turn, -boids_max_turn, boids_max_turn)
+    heading = numpy.where(has, numpy.fmod(heading + turn, 360.0), heading)
+    theta = numpy.radians(heading)
+    ct = numpy.cos(theta)
+    st = numpy.sin(theta)
+    x = x + magnitude * ct
+    y = y + magnitude * st
+    wrapped = (numpy.abs(x) > half_w) | (numpy.abs(y) > half_h)
+    x = numpy.where(x > half_w, x - 2 * half_w,
+                    numpy.where(x < -half_w, x + 2 * half_w, x))
+    y = numpy.where(y > half_h, y - 2 * half_h,
+                    numpy.where(y < -half_h, y + 2 * half_h, y))
+
+    for buffer, offset, live in grid.offsets:
+        model = buffer.model.as_array()
+        rows = slice(offset, offset + (
+            buffer.count if live is None else len(live)))
+        target = slice(None) if live is None else live
+        model[target, 0] = x[rows]
+        model[target, 1] = y[rows]
+        model[target, 4] = heading[rows]
+        model[target, 6] = ct[rows]
+        model[target, 7] = st[rows]
+        if wrapped[rows].any():
+            prev_valid = model[target, PREV_VALID]
+            prev_valid[wrapped[rows]] = 0.0
+            model[target, PREV_VALID] = prev_valid
+        buffer.model.mark_dirty()
+
+
+def fast_update(dt, buffers, tick=0, seed=None):
+    buffers = [b for b in buffers if b.count]
+    if not buffers:
+        return
+    params = ffi.new('boids_params *', dict(
+        magnitude=speed * dt,
+        half_w=half_w,
+        half_h=half_h,
+        radius=boids_radius,
+        separation=boids_separation,
+        separation_weight=boids_separation_weight,
+        alignment_weight=boids_alignment_weight,
+        cohesion_weight=boids_cohesion_weight,
+        max_turn=boids_max_turn,
+    ))
+    turtles = ffi.new('float*[]', [b.model.data for b in buffers])
+    counts = ffi.new('int[]', [b.count for b in buffers])
+    # flags for buffers with turtles waiting for removal
+    flags = []
+    for b in buffers:
+        if b.removed:
+            live = ffi.new('unsigned char[]', [1] * b.count)
+            for index in b.removed:
+                live[index] = 0
+            flags.append(live)
+        else:
+            flags.append(ffi.NULL)
+    live = ffi.new('unsigned char*[]', flags)
+    if fast.boids(turtles, counts, live, len(buffers), params) != 0:
+        raise MemoryError("boids kernel could not allocate memory")
+    for b in buffers:
+        b.model.mark_dirty()
+
+
+# slowest first, see kernels.register()
+register('boids', 'python', slow_update, fallback=True)
+if numpy is not None:
+    register('boids', 'numpy', numpy_update)
+if fast and hasattr(fast, 'boids'):
+    register('boids', 'c', fast_update)
@@ -1,14 +1,40 @@
 from __future__ import division, print_function, absolute_import
+import glob
 import logging
+import mmap
+import os
+import threading
+from array import array
 log = logging.getLogger('turgles')
 
 from turgles.memory import (
     ffi,
+    numpy,
     sizeof,
+    NUMPY_TYPES,
     TURTLE_MODEL_DATA_SIZE,
+    TURTLE_MODEL_DTYPE,
     TURTLE_COLOR_DATA_SIZE,
+    TURTLE_COLOR_DTYPE,
 )
 
+# past this many separate dirty ranges, it's cheaper to upload one range that
+# covers them all than to make a call per range
+MAX_DIRTY_RANGES = 16
+
+
+def coalesce_ranges(ranges):
+    """Sorts and merges overlapping or adjacent (start, stop) ranges"""
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], stop)
+        else:
+            merged.append([start, stop])
+    if len(merged) > MAX_DIRTY_RANGES:
+        merged = [[merged[0][0], merged[-1][1]]]
+    return [tuple(r) for r in merged]
+
 
 class ChunkBuffer(object):
     """A resizable cffi-based buffer that provides data indexed in chunks"""
@@ -27,6 +53,8 @@ class ChunkBuffer(object):
         self.ctype = ctype
         self.data = self._allocate(size)
         self.ctype_size = sizeof(self.data[0:1])
+        # (start, stop) chunk ranges changed since the last upload
+        self.dirty = []
 
     def _allocate(self, size):
         return ffi.new('{}[{}]'.format(self.ctype, size * self.chunk_size))
@@ -35,6 +63,53 @@ class ChunkBuffer(object):
     def byte_size(self):
         return self.count * self.chunk_size * self.ctype_size
 
+    def mark_dirty(self, start=0, stop=None):
+        """Mark chunks [start, stop) as changed. Defaults to all live chunks.
+
+        Only needed for writes made directly to the data, the buffer's own
+        methods mark the chunks they change.
+        """
+        if stop is None:
+            stop = self.count
+        if stop > start:
+            self.dirty.append((start, stop))
+
+    def dirty_ranges(self, end=None):
+        """Sorted, coalesced list of changed (start, stop) chunk ranges,
+        of the live chunks, or only those before end if given"""
+        count = self.count if end is None else min(end, self.count)
+        return coalesce_ranges(
+            (start, min(stop, count))
+            for start, stop in self.dirty
+            if start < count
+        )
+
+    def dirty_byte_ranges(self, end=None):
+        """The changed ranges as (offset, size) in bytes, for uploading"""
+        chunk_bytes = self.chunk_size * self.ctype_size
+        return [
+            (start * chunk_bytes, (stop - start) * chunk_bytes)
+            for start, stop in self.dirty_ranges(end)
+        ]
+
+    def clear_dirty(self):
+        self.dirty = []
+
+    def as_array(self, dtype=None):
+        """Returns a zero-copy numpy view of the live chunks.
+
+        Without a dtype, the view is a 2d array of (count, chunk_size) items.
+        The view refers to the current memory, so fetch a new one after the
+        buffer has been resized or its count has changed.
+        """
+        if numpy is None:
+            raise ImportError("numpy is required for array views")
+        buffer = ffi.buffer(self.data, self.byte_size)
+        if dtype is not None:
+            return numpy.frombuffer(buffer, dtype=dtype)
+        array = numpy.frombuffer(buffer, dtype=NUMPY_TYPES[self.ctype])
+        return array.reshape(self.count, self.chunk_size)
+
     def __iter__(self):
         """Iterates over chunks"""
         chunk_size = self.chunk_size
@@ -42,9 +117,15 @@ class ChunkBuffer(object):
             offset = i * chunk_size
             yield self.data[offset:offset + chunk_size]
 
-    def slice(self, size):
+    def slice(self, size, end=None):
+        """Iterates over the live chunks, or only those before end if given,
+        in slices of up to size chunks.
+
+        Yields (number of chunks, data) pairs.
+        """
         slice = self.chunk_size * size
-        data_size = len(self.data)
+        count = self.count if end is None else min(end, self.count)
+        data_size = count * self.chunk_size
         num_slices, last_slice = divmod(data_size, slice)
         last_slice_index = num_slices * slice
         for i in range(0, last_slice_index, slice):
@@ -73,9 +154,36 @@ class ChunkBuffer(object):
         if init is not None:
             assert len(init) == self.chunk_size
             chunk[0:self.chunk_size] = init
+        self.mark_dirty(self.count, self.count + 1)
         self.count += 1
         return chunk
 
+    def extend(self, n, init=None):
+        """Add n chunks in one go, resizing at most once.
+
+        If init is passed, it must hold the data for all n chunks, either as a
+        list, a cffi array, or anything supporting the buffer protocol (e.g. a
+        numpy array of the right ctype), and is copied in with one memmove.
+        Returns the index of the first new chunk.
+        """
+        start = self.count
+        if start + n > self.size:
+            self.resize(max(self.size * 2, start + n))
+        if init is not None:
+            offset = start * self.chunk_size
+            length = n * self.chunk_size
+            if isinstance(init, (list, tuple)):
+                self.data[offset:offset + length] = init
+            else:
+                if not isinstance(init, ffi.CData):
+                    init = ffi.from_buffer(self.ctype + '[]', init)
+                assert len(init) == length
+                ffi.memmove(
+                    self.data + offset, init, length * self.ctype_size)
+        self.mark_dirty(start, start + n)
+        self.count += n
+        return start
+
     def resize(self, new_size):
         """Create a new larger array, and copy data over"""
         assert new_size > self.size
@@ -85,6 +193,21 @@ class ChunkBuffer(object):
         self.size = new_size
         self.data = new_data
 
+    def swap(self, a, b):
+        """Swap the data of chunks a and b"""
+        if a == b:
+            return
+        chunk_size = self.chunk_size
+        data = self.data
+        a_start = a * chunk_size
+        b_start = b * chunk_size
+        chunk = data[a_start:a_start + chunk_size]
+        a_data = list(chunk)
+        chunk[0:chunk_size] = data[b_start:b_start + chunk_size]
+        data[b_start:b_start + chunk_size] = a_data
+        self.mark_dirty(a, a + 1)
+        self.mark_dirty(b, b + 1)
+
     def remove(self, index):
         """Remove chunk at index.
 
@@ -102,6 +225,7 @@ class ChunkBuffer(object):
             last_data = self.get(last_index)
             # copy the last chunk's data over the data to be deleted
             data[0:self.chunk_size] = last_data
+            self.mark_dirty(index, index + 1)
             moved = last_index
 
         # zero last chunk's data
@@ -111,20 +235,555 @@ class ChunkBuffer(object):
         # provide which index has now moved
         return moved
 
+    def compact(self, indices):
+        """Remove many chunks at once.
+
+        Live chunks from the end of the buffer are copied down into the holes
+        left by the removed chunks, and the freed tail is zeroed in one go.
+        Returns a list of (old_index, new_index) pairs for the moved chunks.
+        """
+        removed = set(indices)
+        if not removed:
+            return []
+        count = self.count
+        assert max(removed) < count
+        new_count = count - len(removed)
+        holes = sorted(i for i in removed if i < new_count)
+        moved = [i for i in range(new_count, count) if i not in removed]
+        assert len(holes) == len(moved)
+
+        chunk_size = self.chunk_size
+        data = self.data
+        for old, new in zip(moved, holes):
+            src = old * chunk_size
+            dst = new * chunk_size
+            data[dst:dst + chunk_size] = data[src:src + chunk_size]
+            self.mark_dirty(new, new + 1)
+
+        # zero the now unused tail
+        start = new_count * chunk_size * self.ctype_size
+        end = count * chunk_size * self.ctype_size
+        ffi.buffer(data)[start:end] = b'\0' * (end - start)
+        self.count = new_count
+
+        return list(zip(moved, holes))
+
+
+class Arena(object):
+    """A single block of memory shared by several ChunkBuffers.
+
+    Each member buffer owns a contiguous range of the block, in the order they
+    were added. When any member grows, the whole block is reallocated and every
+    member's data copied into its new range, so the block can always be
+    uploaded or copied in one go. Slices of the old block are then stale, so
+    generation counts layouts, for holders of slices to notice.
+    """
+
+    def __init__(self, chunk_size, ctype='float'):
+        self.chunk_size = chunk_size
+        self.ctype = ctype
+        self.ctype_size = sizeof(ctype)
+        self.members = []
+        self.size = 0
+        self.data = None
+        self.generation = 0
+
+    def add(self, buffer):
+        self.members.append(buffer)
+        self.layout()
+
+    def layout(self):
+        """Allocate a new block, and move every member into its range"""
+        chunk_size = self.chunk_size
+        size = sum(member.size for member in self.members)
+        data = ffi.new('{}[{}]'.format(self.ctype, size * chunk_size))
+        offset = 0
+        for member in self.members:
+            length = member.size * chunk_size
+            view = ffi.cast(
+                '{}(*)[{}]'.format(self.ctype, length), data + offset)[0]
+            if member.data is not None:
+                used = member.count * chunk_size
+                view[0:used] = member.data[0:used]
+            member.data = view
+            member.base = offset // chunk_size
+            offset += length
+        self.size = size
+        self.data = data
+        self.generation += 1
+
+    def dirty_byte_ranges(self, ends=None):
+        """All the members' changed ranges as (offset, size) in bytes.
+
+        If ends is given, a dict of member to a number of chunks, only
+        ranges before that in each member are included, and none of members
+        not in it, as ChunkBuffer.dirty_byte_ranges() with an end.
+        """
+        ranges = []
+        for member in self.members:
+            end = None
+            if ends is not None:
+                end = ends.get(member, 0)
+            base = member.base
+            ranges.extend(
+                (base + start, base + stop)
+                for start, stop in member.dirty_ranges(end)
+            )
+        chunk_bytes = self.chunk_size * self.ctype_size
+        return [
+            (start * chunk_bytes, (stop - start) * chunk_bytes)
+            for start, stop in coalesce_ranges(ranges)
+        ]
+
+    def clear_dirty(self):
+        for member in self.members:
+            member.clear_dirty()
+
+
+class ArenaChunkBuffer(ChunkBuffer):
+    """A ChunkBuffer whose memory is a range of an Arena"""
+
+    def __init__(self, arena, size, chunk_size, ctype='float'):
+        assert arena.chunk_size == chunk_size
+        assert arena.ctype == ctype
+        self.arena = arena
+        self.base = 0  # index of our first chunk in the arena
+        self.data = None
+        super(ArenaChunkBuffer, self).__init__(size, chunk_size, ctype)
+
+    def _allocate(self, size):
+        self.arena.add(self)
+        return self.data
+
+    def resize(self, new_size):
+        """Grow our range of the arena, which moves all its members"""
+        assert new_size > self.size
+        self.size = new_size
+        self.arena.layout()
+
+
+# SharedChunkBuffer files start with a header of unsigned ints
+SHARED_MAGIC = 0x54555254  # 'TURT'
+HEADER_MAGIC = 0
+HEADER_GENERATION = 1  # incremented every time the file is resized
+HEADER_SIZE = 2
+HEADER_COUNT = 3
+HEADER_CHUNK_SIZE = 4
+HEADER_CTYPE_SIZE = 5
+HEADER_BYTES = 32
+
+
+class SharedChunkBuffer(ChunkBuffer):
+    """A ChunkBuffer whose memory is a shared mmap'd file.
+
+    One process owns the buffer, and creates, resizes and compacts it. Any
+    number of other processes can attach() to the same file, and read and
+    write chunk data in place, e.g. to run a simulation out of process.
+
+    The file's header holds the size and count, so attached buffers should
+    call refresh() before each use, to pick up the owner's new turtles and
+    remap the file if the owner has resized it.
+    """
+
+    header = None
+
+    def __init__(self, path, size, chunk_size, ctype='float'):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC)
+        self.map = None
+        self.buffer = None
+        # old mappings of the file stay open until close(), as slices of them
+        # may still be held, and still see the file's data
+        self.old_maps = []
+        self._count = 0
+        self.generation = 0
+        super(SharedChunkBuffer, self).__init__(size, chunk_size, ctype)
+
+    @classmethod
+    def attach(cls, path, ctype='float'):
+        """Open a buffer another process has created"""
+        buffer = cls.__new__(cls)
+        buffer.path = path
+        buffer.fd = os.open(path, os.O_RDWR)
+        buffer.map = None
+        buffer.buffer = None
+        buffer.old_maps = []
+        buffer.ctype = ctype
+        buffer.ctype_size = sizeof(ctype)
+        buffer.dirty = []
+        buffer.generation = None
+        with open(path, 'rb') as f:
+            header = array('I', f.read(HEADER_BYTES))
+        if header[HEADER_MAGIC] != SHARED_MAGIC:
+            raise ValueError("{} is not a turgles buffer".format(path))
+        if header[HEADER_CTYPE_SIZE] != buffer.ctype_size:
+            raise ValueError("{} does not hold {}s".format(path, ctype))
+        buffer.chunk_size = header[HEADER_CHUNK_SIZE]
+        buffer.refresh()
+        return buffer
+
+    @property
+    def count(self):
+        if self.header is None:
+            return self._count
+        # an attached buffer may not have remapped to the owner's size yet
+        return min(self.header[HEADER_COUNT], self.size)
+
+    @count.setter
+    def count(self, value):
+        self._count = value
+        if self.header is not None:
+            self.header[HEADER_COUNT] = value
+
+    def _map(self, size):
+        """Map the file for size chunks, keeping any old mapping open"""
+        length = HEADER_BYTES + size * self.chunk_size * sizeof(self.ctype)
+        if self.map is not None:
+            self.old_maps.append((self.map, self.buffer))
+        self.map = mmap.mmap(self.fd, length)
+        self.buffer = ffi.from_buffer(self.map)
+        self.header = ffi.cast('unsigned int *', self.buffer)
+        self.size = size
+        self.data = ffi.cast(
+            '{}(*)[{}]'.format(self.ctype, size * self.chunk_size),
+            self.buffer + HEADER_BYTES)[0]
+        return self.data
+
+    def _allocate(self, size):
+        length = HEADER_BYTES + size * self.chunk_size * sizeof(self.ctype)
+        os.ftruncate(self.fd, length)
+        data = self._map(size)
+        self.generation += 1
+        header = self.header
+        header[HEADER_MAGIC] = SHARED_MAGIC
+        header[HEADER_SIZE] = size
+        header[HEADER_COUNT] = self._count
+        header[HEADER_CHUNK_SIZE] = self.chunk_size
+        header[HEADER_CTYPE_SIZE] = sizeof(self.ctype)
+        header[HEADER_GENERATION] = self.generation
+        return data
+
+    def resize(self, new_size):
+        """Grow the file and remap it, the data stays in place"""
+        assert new_size > self.size
+        self._allocate(new_size)
+
+    def refresh(self):
+        """Remap the file if it has been resized by its owner"""
+        if self.header is not None:
+            generation = self.header[HEADER_GENERATION]
+            if generation == self.generation:
+                return
+        with open(self.path, 'rb') as f:
+            header = array('I', f.read(HEADER_BYTES))
+        self._map(header[HEADER_SIZE])
+        self.generation = header[HEADER_GENERATION]
+
+    def close(self, unlink=False):
+        """Unmap the file, and delete it if unlink is True.
+
+        Any slices of the data must no longer be used.
+        """
+        maps = self.old_maps
+        if self.map is not None:
+            maps.append((self.map, self.buffer))
+        self._count = self.count
+        self.header = self.data = self.map = self.buffer = None
+        self.old_maps = []
+        for map, buffer in maps:
+            ffi.release(buffer)
+            map.close()
+        os.close(self.fd)
+        if unlink:
+            os.unlink(self.path)
+
+
+def _grow(items, size):
+    """Grow a typed array to at least size, filling with -1"""
+    missing = max(size, len(items) * 2) - len(items)
+    items.extend(array(items.typecode, [-1]) * missing)
+
+
+class IdMap(object):
+    """Maps integer turtle ids to the shape they're in and their index in
+    its buffer, for every shape at once.
+
+    Stored in typed arrays indexed by id, so ids are expected to be small
+    non-negative integers, as NinjaTurtle's are. That is 10 bytes per id up
+    to the highest id in use, shrinking as the highest ids are removed.
+    Shapes are small integer keys, -1 for unused ids.
+
+    Each id is given a serial when added, never reused, so holders of an id
+    can tell if its turtle has been removed and the id reused since, see
+    serial().
+    """
+
+    def __init__(self, size=0):
+        self.shape_of = array('h', [-1]) * size
+        self.index_of = array('i', [-1]) * size
+        self.serial_of = array('I', [0]) * size
+        self.next_serial = 1
+        self.count = 0  # number of ids mapped
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, id):
+        return 0 <= id < len(self.shape_of) and self.shape_of[id] >= 0
+
+    def serial(self, id):
+        """The id's serial, 0 if not present"""
+        if id not in self:
+            return 0
+        return self.serial_of[id]
+
+    def _reserve(self, size):
+        if size > len(self.shape_of):
+            _grow(self.shape_of, size)
+            _grow(self.index_of, size)
+            grown = len(self.shape_of) - len(self.serial_of)
+            self.serial_of.extend(array('I', [0]) * grown)
+
+    def add(self, id, key, index):
+        assert id >= 0
+        assert id not in self
+        self._reserve(id + 1)
+        self.shape_of[id] = key
+        self.index_of[id] = index
+        self.serial_of[id] = self.next_serial
+        self.next_serial = (self.next_serial + 1) & 0xffffffff or 1
+        self.count += 1
+
+    def add_range(self, ids, key, start):
+        """Map ids to key and consecutive indices, starting at start"""
+        assert not any(id in self for id in ids)
+        self._reserve(max(ids) + 1)
+        shape_of = self.shape_of
+        index_of = self.index_of
+        serial_of = self.serial_of
+        serial = self.next_serial
+        for index, id in enumerate(ids, start):
+            shape_of[id] = key
+            index_of[id] = index
+            serial_of[id] = serial
+            serial = (serial + 1) & 0xffffffff or 1
+        self.next_serial = serial
+        self.count += len(ids)
+
+    def discard(self, id):
+        self.shape_of[id] = -1
+        self.index_of[id] = -1
+        self.serial_of[id] = 0
+        self.count -= 1
+        if self.count < len(self.shape_of) // 4:
+            self._trim()
+
+    def _trim(self):
+        """Drop the unused entries after the highest id in use"""
+        shape_of = self.shape_of
+        end = len(shape_of)
+        while end and shape_of[end - 1] < 0:
+            end -= 1
+        del shape_of[end:]
+        del self.index_of[end:]
+        del self.serial_of[end:]
+
+
+class SlotMap(object):
+    """Maps integer turtle ids to dense buffer indices, and back, for one
+    shape.
+
+    id_of is indexed by buffer index, in a typed array, with -1 for unused
+    indices. The other direction is kept in ids, an IdMap shared by every
+    shape's SlotMap, under this shape's key, so costs nothing per shape.
+    """
+
+    def __init__(self, size, ids=None, key=0):
+        self.ids = IdMap() if ids is None else ids
+        self.key = key
+        self.id_of = array('i', [-1]) * size
+        self.count = 0  # number of ids mapped
+
+    @property
+    def index_of(self):
+        """Every shape's indices, by id, see IdMap"""
+        return self.ids.index_of
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, id):
+        shape_of = self.ids.shape_of
+        return 0 <= id < len(shape_of) and shape_of[id] == self.key
+
+    def index(self, id):
+        """O(1) lookup of an id's index, raises KeyError if not present"""
+        if id not in self:
+            raise KeyError(id)
+        return self.ids.index_of[id]
+
+    def id(self, index):
+        return self.id_of[index]
+
+    def is_at(self, id, index):
+        """Whether id is mapped, and to index"""
+        return id in self and self.ids.index_of[id] == index
+
+    def indices(self, ids):
+        """A numpy array of the indices of numpy array ids, -1 for ids not
+        in this map"""
+        shape_of = numpy.frombuffer(self.ids.shape_of, numpy.int16)
+        index_of = numpy.frombuffer(self.ids.index_of, numpy.int32)
+        index = numpy.full(len(ids), -1, numpy.int32)
+        known = numpy.flatnonzero((ids >= 0) & (ids < len(shape_of)))
+        mine = known[shape_of[ids[known]] == self.key]
+        index[mine] = index_of[ids[mine]]
+        return index
+
+    def add(self, id, index):
+        self.ids.add(id, self.key, index)
+        if index >= len(self.id_of):
+            _grow(self.id_of, index + 1)
+        self.id_of[index] = id
+        self.count += 1
+
+    def add_range(self, ids, start):
+        """Map ids to consecutive indices, starting at start"""
+        if not ids:
+            return
+        assert min(ids) >= 0
+        end = start + len(ids)
+        if end > len(self.id_of):
+            _grow(self.id_of, end)
+        self.ids.add_range(ids, self.key, start)
+        self.id_of[start:end] = array('i', ids)
+        self.count += len(ids)
+
+    def discard(self, id):
+        """Unmap an id, returning the index it had.
+
+        The index still refers to the id until clear() or move() reuse it, so
+        removal can be deferred.
+        """
+        index = self.index(id)
+        self.ids.discard(id)
+        self.count -= 1
+        return index
+
+    def clear(self, index):
+        self.id_of[index] = -1
+
+    def move(self, old, new):
+        """Map the id at index old to index new"""
+        id = self.id_of[old]
+        self.id_of[new] = id
+        self.id_of[old] = -1
+        self.ids.index_of[id] = new
+
+    def swap(self, a, b):
+        """Swap the ids at indices a and b. Ids that have been discarded
+        still move, but stay unmapped."""
+        id_of = self.id_of
+        a_id = id_of[a]
+        b_id = id_of[b]
+        id_of[a] = b_id
+        id_of[b] = a_id
+        a_moves = self.is_at(a_id, a)
+        if self.is_at(b_id, b):
+            self.ids.index_of[b_id] = a
+        if a_moves:
+            self.ids.index_of[a_id] = b
+
 
 class ShapeBuffer(object):
     """A pair of chunked buffers of data.
 
     One is the model buffer, layed out like NinjaTurtle. The other is the color
     buffer, which is just used in Turgles
+
+    The buffers are partitioned into visible turtles, the first visible_count,
+    and hidden turtles after them, so only the visible ones are drawn. Hiding,
+    showing, adding and removing turtles swap turtles' places to keep the
+    partition, so the ids of any turtles moved are added to moved, for holders
+    of their data to fetch it again.
     """
 
-    def __init__(self, shape, size):
+    def __init__(
+            self, shape, size, model_arena=None, color_arena=None,
+            shared=None, double=False, ids=None, key=0):
+        """If shared is given, the data is kept in shared files named
+        shared + '.model' and shared + '.color'.
+
+        ids is an IdMap shared with other shapes' buffers, which know this
+        shape by key, see SlotMap.
+
+        If double is True, model and color are back buffers, which the
+        simulation writes, and the renderer reads front_model and front_color,
+        which are only updated by swap(). Otherwise front and back are the
+        same buffers.
+
+        The back buffers stay put, as turtles hold slices of them, so swap()
+        copies them to a spare pair of front buffers, then swaps the spare
+        and front pairs by reference. Only the reference swap needs to
+        exclude the renderer, see BufferManager.front_lock.
+        """
         self.shape = shape
-        self.model = ChunkBuffer(size, TURTLE_MODEL_DATA_SIZE)
-        self.color = ChunkBuffer(size, TURTLE_COLOR_DATA_SIZE)
-        self.id_to_index = {}
-        self.index_to_id = {}
+        if shared is not None:
+            assert model_arena is None and color_arena is None
+            self.model = SharedChunkBuffer(
+                shared + '.model', size, TURTLE_MODEL_DATA_SIZE)
+        elif model_arena is None:
+            self.model = ChunkBuffer(size, TURTLE_MODEL_DATA_SIZE)
+        else:
+            self.model = ArenaChunkBuffer(
+                model_arena, size, TURTLE_MODEL_DATA_SIZE)
+        if shared is not None:
+            self.color = SharedChunkBuffer(
+                shared + '.color', size, TURTLE_COLOR_DATA_SIZE)
+        elif color_arena is None:
+            self.color = ChunkBuffer(size, TURTLE_COLOR_DATA_SIZE)
+        else:
+            self.color = ArenaChunkBuffer(
+                color_arena, size, TURTLE_COLOR_DATA_SIZE)
+        if double:
+            assert model_arena is None and color_arena is None
+            self.front_model = ChunkBuffer(size, TURTLE_MODEL_DATA_SIZE)
+            self.front_color = ChunkBuffer(size, TURTLE_COLOR_DATA_SIZE)
+            self.spare_model = ChunkBuffer(size, TURTLE_MODEL_DATA_SIZE)
+            self.spare_color = ChunkBuffer(size, TURTLE_COLOR_DATA_SIZE)
+        else:
+            self.front_model = self.spare_model = self.model
+            self.front_color = self.spare_color = self.color
+        self.slots = SlotMap(size, ids, key)
+        # indices of removed turtles, waiting for compact()
+        self.removed = set()
+        self.visible_count = 0
+        self._front_visible_count = self._spare_visible_count = 0
+        self.moved = set()
+
+    @classmethod
+    def attach(cls, shape, shared):
+        """Open a shape's shared buffers, created by another process.
+
+        Only the turtle data is shared, not the ids, so the attached buffer
+        has no slots.
+        """
+        buffer = cls.__new__(cls)
+        buffer.shape = shape
+        buffer.model = SharedChunkBuffer.attach(shared + '.model')
+        buffer.color = SharedChunkBuffer.attach(shared + '.color')
+        buffer.front_model = buffer.spare_model = buffer.model
+        buffer.front_color = buffer.spare_color = buffer.color
+        buffer.slots = SlotMap(0)
+        buffer.removed = set()
+        buffer.visible_count = buffer._front_visible_count = buffer.count
+        buffer.moved = set()
+        return buffer
+
+    def refresh(self):
+        """Pick up another process's changes to shared buffers"""
+        self.model.refresh()
+        self.color.refresh()
 
     @property
     def count(self):
@@ -138,82 +797,336 @@ class ShapeBuffer(object):
         assert size == self.color.size
         return size
 
+    @property
+    def model_view(self):
+        """Structured numpy view of the live model data, see memory.py"""
+        return self.model.as_array(TURTLE_MODEL_DTYPE)
+
+    @property
+    def color_view(self):
+        """Structured numpy view of the live color data, see memory.py"""
+        return self.color.as_array(TURTLE_COLOR_DTYPE)
+
     def __iter__(self):
         for model, color in zip(self.model, self.color):
             yield model, color
 
     def slice(self, size):
-        model_iter = self.model.slice(size)
-        color_iter = self.color.slice(size)
-        while 1:
-            msize, model = next(model_iter)
-            csize, color = next(color_iter)
+        slices = zip(self.model.slice(size), self.color.slice(size))
+        for (msize, model), (csize, color) in slices:
             assert msize == csize
             yield msize, model, color
 
-    def _update_id_map(self, id, index):
-        self.id_to_index[id] = index
-        self.index_to_id[index] = id
-
     def get_model(self, id):
-        return self.model.get(self.id_to_index[id])
+        return self.model.get(self.slots.index(id))
 
     def get_color(self, id):
-        return self.color.get(self.id_to_index[id])
+        return self.color.get(self.slots.index(id))
 
     def get(self, id):
-        index = self.id_to_index[id]
+        index = self.slots.index(id)
         return self.model.get(index), self.color.get(index)
 
+    def mark_dirty(self, id, model=True, color=True):
+        """Mark a turtle's data as changed, after writing to it directly"""
+        index = self.slots.index(id)
+        if model:
+            self.model.mark_dirty(index, index + 1)
+        if color:
+            self.color.mark_dirty(index, index + 1)
+
+    @property
+    def front_visible_count(self):
+        """The number of visible turtles in the front buffers"""
+        if self.double:
+            return self._front_visible_count
+        return self.visible_count
+
+    def _swap(self, a, b):
+        """Swap the turtles at indices a and b, including removed ones"""
+        if a == b:
+            return
+        self.model.swap(a, b)
+        self.color.swap(a, b)
+        self.slots.swap(a, b)
+        removed = self.removed
+        if (a in removed) != (b in removed):
+            removed.symmetric_difference_update((a, b))
+        for index in (a, b):
+            id = self.slots.id_of[index]
+            if self.slots.is_at(id, index):
+                self.moved.add(id)
+
+    def is_visible(self, id):
+        return self.slots.index(id) < self.visible_count
+
+    def hide(self, id):
+        """Move a turtle to the end of the visible turtles, and shrink them
+        by one"""
+        index = self.slots.index(id)
+        last = self.visible_count - 1
+        if index > last:
+            return
+        self._swap(index, last)
+        self.visible_count = last
+
+    def show(self, id):
+        """Move a turtle to the start of the hidden turtles, and grow the
+        visible turtles by one"""
+        index = self.slots.index(id)
+        first = self.visible_count
+        if index < first:
+            return
+        self._swap(index, first)
+        # its data may have changed while it was hidden and not drawn
+        self.model.mark_dirty(first, first + 1)
+        self.color.mark_dirty(first, first + 1)
+        self.visible_count = first + 1
+
     def new(self, id, model_init=None, color_init=None):
-        assert id not in self.id_to_index
+        assert id not in self.slots
 
         # cache the current count
         count = self.model.count
-        model_data = self.model.new(model_init)
-        color_data = self.color.new(color_init)
-        self._update_id_map(id, count)
+        self.model.new(model_init)
+        self.color.new(color_init)
+        self.slots.add(id, count)
 
-        return model_data, color_data
+        # new turtles are visible
+        index = self.visible_count
+        self._swap(index, count)
+        self.visible_count += 1
+
+        return self.model.get(index), self.color.get(index)
+
+    def extend(self, ids, model_init=None, color_init=None):
+        """Add many turtles at once, returning the index of the first.
+
+        If there are hidden turtles, the new turtles are moved in front of
+        them, not necessarily in order, so look them up by id.
+        """
+        ids = list(ids)
+        assert len(set(ids)) == len(ids)
+        assert not any(id in self.slots for id in ids)
+
+        start = self.model.extend(len(ids), model_init)
+        color_start = self.color.extend(len(ids), color_init)
+        assert start == color_start
+
+        self.slots.add_range(ids, start)
+
+        # swap as many hidden turtles as needed from in front of the new ones
+        # to the end
+        first = self.visible_count
+        end = start + len(ids)
+        for i in range(min(start - first, len(ids))):
+            self._swap(first + i, end - 1 - i)
+        self.visible_count += len(ids)
+        return first
 
     def remove(self, id):
-        index = self.id_to_index[id]
-
-        moved_model_index = self.model.remove(index)
-        moved_color_index = self.color.remove(index)
-        assert moved_model_index == moved_color_index
-        if moved_model_index:
-            # update id map for the last turtle to new location
-            moved_id = self.index_to_id[moved_model_index]
-            self._update_id_map(moved_id, index)
-            del self.index_to_id[moved_model_index]
+        """Queue a turtle for removal.
+
+        The turtle's data stays in place until the next compact(), so that
+        many removals in a frame can be done in a single pass.
+        """
+        index = self.slots.discard(id)
+        self.removed.add(index)
+
+    def compact(self):
+        """Apply all pending removals, and rebuild the id maps"""
+        removed = self.removed
+        if not removed:
+            return
+
+        # first close up the visible turtles, moving removed ones to the end
+        # of them, so that compacting only moves hidden turtles after them
+        visible = self.visible_count
+        removed_visible = [i for i in removed if i < visible]
+        if removed_visible:
+            new_visible = visible - len(removed_visible)
+            holes = sorted(i for i in removed_visible if i < new_visible)
+            live = [i for i in range(new_visible, visible) if i not in removed]
+            for hole, index in zip(holes, live):
+                self._swap(hole, index)
+            self.visible_count = new_visible
+        removed = self.removed
+
+        moved = self.model.compact(removed)
+        moved_color = self.color.compact(removed)
+        assert moved == moved_color
+
+        slots = self.slots
+        for index in removed:
+            slots.clear(index)
+        for old, new in moved:
+            slots.move(old, new)
+            self.moved.add(slots.id_of[new])
+        self.removed = set()
+
+    @property
+    def double(self):
+        return self.front_model is not self.model
+
+    def swap(self):
+        """Make the back buffers' data the front buffers', for rendering.
+
+        The back buffers' changes since the last swap become the front
+        buffers' dirty ranges. Does nothing unless double buffered.
+        """
+        self.fill_spare()
+        self.flip()
+
+    def fill_spare(self):
+        """Copy the back buffers to the spare front buffers, which the
+        renderer doesn't read"""
+        if not self.double:
+            return
+        pairs = (
+            (self.model, self.spare_model),
+            (self.color, self.spare_color),
+        )
+        for back, spare in pairs:
+            if back.size > spare.size:
+                spare.resize(back.size)
+            length = back.count * back.chunk_size * back.ctype_size
+            ffi.memmove(spare.data, back.data, length)
+            spare.count = back.count
+            spare.dirty = back.dirty
+            back.clear_dirty()
+        self._spare_visible_count = self.visible_count
+
+    def flip(self):
+        """Swap the spare and front buffers, after fill_spare().
+
+        The front buffers' ranges not yet uploaded stay dirty, as the
+        renderer's copy is of the old front.
+        """
+        if not self.double:
+            return
+        self.spare_model.dirty[0:0] = self.front_model.dirty
+        self.spare_color.dirty[0:0] = self.front_color.dirty
+        self.front_model, self.spare_model = self.spare_model, self.front_model
+        self.front_color, self.spare_color = self.spare_color, self.front_color
+        self.spare_model.clear_dirty()
+        self.spare_color.clear_dirty()
+        self._front_visible_count = self._spare_visible_count
+
+    def copy(self, count=None):
+        """A standalone copy of this buffer's turtles, or its first count
+        turtles, e.g. for trial runs"""
+        if count is None or count > self.count:
+            count = self.count
+        buffer = ShapeBuffer(self.shape, max(count, 1))
+        if count:
+            buffer.model.extend(
+                count, self.model.data[0:count * self.model.chunk_size])
+            buffer.color.extend(
+                count, self.color.data[0:count * self.color.chunk_size])
+        id_of = self.slots.id_of
+        if self.removed:
+            for index in range(count):
+                if index in self.removed:
+                    buffer.removed.add(index)
+                else:
+                    buffer.slots.add(id_of[index], index)
         else:
-            del self.index_to_id[index]
-        del self.id_to_index[id]
+            buffer.slots.add_range(list(id_of[0:count]), 0)
+        buffer.visible_count = min(self.visible_count, count)
+        return buffer
 
 
 class BufferManager(object):
 
-    def __init__(self, size):
+    def __init__(self, size, arena=False, shared=None, double=False):
+        """If arena is True, all shapes' buffers share a single model and a
+        single color Arena. If shared is a directory, each shape's buffers are
+        shared files in it, see attach_buffers(). If double is True, shapes'
+        buffers are double buffered, see ShapeBuffer.
+
+        To simulate in another thread while rendering, hold lock while
+        stepping the simulation. The manager holds it while creating,
+        removing and swapping turtles. The renderer only reads the front
+        buffers, holding front_lock, which swap() holds just long enough to
+        swap the front buffers by reference.
+
+        If another copy of the model data may be newer, e.g. on the GPU,
+        set pull to a callable that brings a ShapeBuffer's model data up to
+        date. It is called before turtles' data is reordered, see sync().
+        """
         self.size = size
         self.buffers = {}
         self.id_to_shape = {}
+        self.shared = shared
+        self.double = double
+        # every shape's turtle ids
+        self.ids = IdMap()
+        self.lock = threading.RLock()
+        self.front_lock = threading.Lock()
+        self.pull = None
+        if arena:
+            assert shared is None and not double
+            self.model_arena = Arena(TURTLE_MODEL_DATA_SIZE)
+            self.color_arena = Arena(TURTLE_COLOR_DATA_SIZE)
+        else:
+            self.model_arena = self.color_arena = None
 
     def get_buffer(self, shape):
         if shape in self.buffers:
             return self.buffers[shape]
 
-        buffer = ShapeBuffer(shape, self.size)
+        shared = None
+        if self.shared is not None:
+            shared = os.path.join(self.shared, shape)
+        buffer = ShapeBuffer(
+            shape, self.size, self.model_arena, self.color_arena, shared,
+            self.double, self.ids, len(self.buffers))
         self.buffers[shape] = buffer
         return buffer
 
+    def sync(self, shape=None, hidden=False):
+        """Pull a shape's model data up to date, or every shape's, before
+        reading or reordering it. If hidden is True, only if the shape has
+        hidden turtles, which adding turtles reorders."""
+        if self.pull is None:
+            return
+        if shape is None:
+            buffers = list(self.buffers.values())
+        else:
+            buffers = [self.buffers[shape]] if shape in self.buffers else []
+        with self.lock:
+            for buffer in buffers:
+                if not hidden or buffer.visible_count < buffer.count:
+                    self.pull(buffer)
+
     def create_turtle(self, id, shape, model_init, color_init):
         """Create a slice of memory for turtle data storage"""
         assert id not in self.id_to_shape
-        data = self._create_turtle(id, shape, model_init, color_init)
+        with self.lock:
+            self.sync(shape, hidden=True)
+            generation = self._arena_generation()
+            data = self._create_turtle(id, shape, model_init, color_init)
+            self._relocated(generation)
         self.id_to_shape[id] = shape
         return data
 
+    def create_turtles(self, ids, shape, model_init=None, color_init=None):
+        """Create memory for many turtles of the same shape at once.
+
+        Returns the shape's buffer and the index of the first new turtle in it.
+        """
+        ids = list(ids)
+        id_to_shape = self.id_to_shape
+        assert not any(id in id_to_shape for id in ids)
+        with self.lock:
+            self.sync(shape, hidden=True)
+            generation = self._arena_generation()
+            buffer = self.get_buffer(shape)
+            start = buffer.extend(ids, model_init, color_init)
+            self._relocated(generation)
+        id_to_shape.update(dict.fromkeys(ids, shape))
+        return buffer, start
+
     def _create_turtle(self, id, shape, model_init, color_init):
         buffer = self.get_buffer(shape)
         data = buffer.new(id, model_init, color_init)
@@ -222,15 +1135,96 @@ class BufferManager(object):
     def set_shape(self, id, new_shape):
         """Copies the turtle data from the old shape buffer to the new"""
         old_shape = self.id_to_shape[id]
-        old_buffer = self.get_buffer(old_shape)
-        model, color = old_buffer.get(id)
-        new_data = self._create_turtle(id, new_shape, model, color)
-        old_buffer.remove(id)
+        with self.lock:
+            self.sync(old_shape)
+            self.sync(new_shape, hidden=True)
+            generation = self._arena_generation()
+            old_buffer = self.get_buffer(old_shape)
+            model, color = [list(data) for data in old_buffer.get(id)]
+            visible = old_buffer.is_visible(id)
+            # ids are mapped in one shape at a time
+            serial = self.ids.serial(id)
+            old_buffer.remove(id)
+            new_data = self._create_turtle(id, new_shape, model, color)
+            # it's the same turtle
+            self.ids.serial_of[id] = serial
+            if not visible:
+                # it is the last visible turtle, so this doesn't move it
+                self.get_buffer(new_shape).hide(id)
+            self._relocated(generation)
         self.id_to_shape[id] = new_shape
         return new_data
 
+    def _arena_generation(self):
+        if self.model_arena is None:
+            return None
+        return self.model_arena.generation, self.color_arena.generation
+
+    def _relocated(self, generation):
+        """If the arenas have been laid out since generation, every turtle's
+        data has moved, so add them all to their buffer's moved ids"""
+        if generation is None or generation == self._arena_generation():
+            return
+        for buffer in self.buffers.values():
+            slots = buffer.slots
+            buffer.moved.update(
+                id for id in slots.id_of[0:buffer.count] if id in slots)
+
+    def mark_dirty(self, id, model=True, color=True):
+        self.get_buffer(self.id_to_shape[id]).mark_dirty(id, model, color)
+
+    def is_visible(self, id):
+        return self.get_buffer(self.id_to_shape[id]).is_visible(id)
+
+    def hide(self, id):
+        """Stop drawing a turtle, see ShapeBuffer"""
+        shape = self.id_to_shape[id]
+        with self.lock:
+            self.sync(shape)
+            self.get_buffer(shape).hide(id)
+
+    def show(self, id):
+        shape = self.id_to_shape[id]
+        with self.lock:
+            self.sync(shape)
+            self.get_buffer(shape).show(id)
+
     def destroy_turtle(self, id):
+        """Queues the turtle's data for removal on the next compact()"""
         shape = self.id_to_shape[id]
-        buffer = self.get_buffer(shape)
-        buffer.remove(id)
+        with self.lock:
+            self.get_buffer(shape).remove(id)
         del self.id_to_shape[id]
+
+    def compact(self):
+        """Apply pending removals to all buffers"""
+        with self.lock:
+            for buffer in self.buffers.values():
+                buffer.compact()
+
+    def swap(self):
+        """Apply pending removals, and make the latest data available to
+        render, at a frame boundary"""
+        with self.lock:
+            buffers = list(self.buffers.values())
+            for buffer in buffers:
+                buffer.compact()
+                buffer.fill_spare()
+            # every shape's front changes at once
+            with self.front_lock:
+                for buffer in buffers:
+                    buffer.flip()
+
+
+def attach_buffers(directory):
+    """Attach to every shape's shared buffers in a BufferManager's shared
+    directory, returning a list of ShapeBuffers.
+
+    Shapes added later are not included, so call again to pick them up.
+    """
+    buffers = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.model'))):
+        shared = path[:-len('.model')]
+        shape = os.path.basename(shared)
+        buffers.append(ShapeBuffer.attach(shape, shared))
+    return buffers
@@ -0,0 +1,120 @@
+"""Broad phase collision detection between turtles.
+
+Each turtle is treated as a circle, centred on its position, with the radius
+of its shape's polygon scaled by the larger of its x and y scale. Overlapping
+pairs are found by sort and sweep: turtles are sorted by their left edge,
+and each is only tested against those whose left edge is before its right
+edge.
+"""
+from __future__ import division, print_function, absolute_import
+
+from math import hypot
+
+from turgles.geometry import STANDARD_SHAPE_POLYGONS
+from turgles.memory import numpy, TURTLE_MODEL_DATA_SIZE
+from turgles.spatial import expand_ranges, live_indices
+
+
+def bounding_radius(polygon):
+    """Radius of the circle around the origin that contains the polygon"""
+    vertex = polygon['vertex']
+    return polygon['scale'] * max(
+        hypot(vertex[i], vertex[i + 1]) for i in range(0, len(vertex), 2))
+
+
+SHAPE_RADII = dict(
+    (name, bounding_radius(polygon))
+    for name, polygon in STANDARD_SHAPE_POLYGONS.items()
+)
+
+
+def collisions(buffers, callback=None, batch_size=1024, radii=SHAPE_RADII,
+               use_numpy=True):
+    """Find all pairs of overlapping turtles in buffers.
+
+    Returns the pairs of ids, each pair once, as an (n, 2) numpy array with
+    numpy, else a list of tuples. If callback is given, it is also called with
+    the pairs in batches of up to batch_size. radii maps shape names to their
+    radius at a scale of 1.
+    """
+    buffers = [b for b in buffers if b.count]
+    if use_numpy and numpy is not None:
+        pairs = _numpy_collisions(buffers, radii)
+    else:
+        pairs = _python_collisions(buffers, radii)
+    if callback is not None:
+        for start in range(0, len(pairs), batch_size):
+            callback(pairs[start:start + batch_size])
+    return pairs
+
+
+def _numpy_collisions(buffers, radii):
+    ids = []
+    xs = []
+    ys = []
+    rs = []
+    for buffer in buffers:
+        model = buffer.model.as_array()
+        buffer_ids = numpy.frombuffer(
+            buffer.slots.id_of, numpy.int32, buffer.count)
+        live = live_indices(buffer)
+        if live is not None:
+            model = model[live]
+            buffer_ids = buffer_ids[live]
+        scale = numpy.maximum(numpy.abs(model[:, 2]), numpy.abs(model[:, 3]))
+        ids.append(buffer_ids)
+        xs.append(model[:, 0])
+        ys.append(model[:, 1])
+        rs.append(scale * radii[buffer.shape])
+    if not ids:
+        return numpy.empty((0, 2), dtype=numpy.int32)
+    ids = numpy.concatenate(ids)
+    x = numpy.concatenate(xs)
+    y = numpy.concatenate(ys)
+    r = numpy.concatenate(rs)
+
+    order = numpy.argsort(x - r, kind='mergesort')
+    ids, x, y, r = ids[order], x[order], y[order], r[order]
+    left = x - r
+    # turtles after i, up to stop, start before i's right edge
+    starts = numpy.arange(1, len(ids) + 1)
+    stops = numpy.searchsorted(left, x + r, 'right')
+    stops = numpy.maximum(stops, starts)
+    i = numpy.repeat(numpy.arange(len(ids)), stops - starts)
+    j = expand_ranges(starts, stops)
+    dx = x[j] - x[i]
+    dy = y[j] - y[i]
+    reach = r[i] + r[j]
+    hit = dx * dx + dy * dy <= reach * reach
+    return numpy.column_stack((ids[i[hit]], ids[j[hit]]))
+
+
+def _python_collisions(buffers, radii):
+    turtles = []
+    for buffer in buffers:
+        data = buffer.model.data
+        id_of = buffer.slots.id_of
+        radius = radii[buffer.shape]
+        removed = buffer.removed
+        for index in range(buffer.count):
+            if index in removed:
+                continue
+            offset = index * TURTLE_MODEL_DATA_SIZE
+            x = data[offset]
+            y = data[offset + 1]
+            scale = max(abs(data[offset + 2]), abs(data[offset + 3]))
+            r = scale * radius
+            turtles.append((x - r, x + r, x, y, r, id_of[index]))
+    turtles.sort()
+
+    pairs = []
+    active = []
+    for turtle in turtles:
+        left, right, x, y, r, id = turtle
+        active = [other for other in active if other[1] >= left]
+        for _, _, ox, oy, orad, oid in active:
+            reach = r + orad
+            if (x - ox) ** 2 + (y - oy) ** 2 <= reach * reach:
+                pairs.append((oid, id))
+        active.append(turtle)
+    return pairs
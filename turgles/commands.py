@@ -0,0 +1,501 @@
+"""Batched turtle movement commands.
+
+Moving a turtle by writing to its model data costs several cffi writes per
+call. Instead, a CommandQueue records each movement as a compact record of
+(turtle id, opcode, two float args) in typed arrays, and execute() applies
+all of them in one pass per tick, recomputing the cos/sin of heading and
+orientation (model slots 6-9) once per turtle.
+
+A turtle's commands are applied in the order they were queued. Turning
+turns both heading and orientation, keeping any tilt between them. Commands
+for turtles destroyed before execute() are dropped, even if their id has
+been reused since, see IdMap.serial(). If the queue has trails,
+each move of a turtle with its pen down adds a segment, see trails.py, and
+if it has fills, each move of a filling turtle adds to its path, see
+fills.py.
+
+Putting the pen down or up, beginning and ending a fill, clearing a
+turtle's trails and fills, and placing a stamp are queued too, so they
+happen in order with the turtle's moves, without applying anyone's queued
+commands early. Ending a fill keeps a copy of the turtle's color data, to
+fill with the color it had when queued. Stamps are made hidden when
+queued, see stamps.py, and placed when their command runs, or cleared if
+their turtle is destroyed first.
+"""
+from __future__ import division, print_function, absolute_import
+
+from array import array
+from math import cos, radians, sin
+
+from turgles.memory import (
+    numpy, TURTLE_COLOR_DATA_SIZE, TURTLE_MODEL_DATA_SIZE)
+from turgles.trails import numpy_segments, segment
+
+FORWARD = 0      # args: distance
+LEFT = 1         # args: degrees
+GOTO = 2         # args: x, y
+SETHEADING = 3   # args: degrees
+PENDOWN = 4
+PENUP = 5
+BEGIN_FILL = 6
+END_FILL = 7     # args: offset of its color data in colors
+CLEAR = 8
+STAMP = 9        # args: stamp id
+
+# commands that move turtles, so can draw
+MOVES = (FORWARD, GOTO)
+PEN = (PENDOWN, PENUP)
+FILL = (BEGIN_FILL, END_FILL, CLEAR)
+
+
+class CommandQueue(object):
+    """Queued movement commands for a BufferManager's turtles"""
+
+    def __init__(self, manager, use_numpy=True, trails=None, fills=None,
+                 stamps=None):
+        self.manager = manager
+        self.use_numpy = use_numpy and numpy is not None
+        self.trails = trails
+        self.fills = fills
+        self.stamps = stamps
+        # whether a scheduler executes the queue each step, see scheduler.py,
+        # rather than the renderer each frame
+        self.on_tick = False
+        self._clear()
+
+    def _clear(self):
+        # replaced rather than emptied, as numpy may still view the old ones
+        self.ids = array('i')
+        # each turtle's serial when queued, 0 if it didn't exist
+        self.serials = array('I')
+        self.ops = array('B')
+        self.args = array('d')  # two per command
+        # color data copied for END_FILL commands
+        self.colors = array('f')
+        # turtle id -> whether its pen is down, or it's filling, once its
+        # commands have run
+        self.pen = {}
+        self.filling = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def push(self, id, op, a, b=0.0):
+        self.ids.append(id)
+        self.serials.append(self.manager.ids.serial(id))
+        self.ops.append(op)
+        self.args.append(a)
+        self.args.append(b)
+
+    def forward(self, id, distance):
+        self.push(id, FORWARD, distance)
+
+    def back(self, id, distance):
+        self.push(id, FORWARD, -distance)
+
+    def left(self, id, angle):
+        self.push(id, LEFT, angle)
+
+    def right(self, id, angle):
+        self.push(id, LEFT, -angle)
+
+    def goto(self, id, x, y):
+        self.push(id, GOTO, x, y)
+
+    def setheading(self, id, angle):
+        self.push(id, SETHEADING, angle)
+
+    def pendown(self, id):
+        self.push(id, PENDOWN, 0.0)
+        self.pen[id] = True
+
+    def penup(self, id):
+        self.push(id, PENUP, 0.0)
+        self.pen[id] = False
+
+    def begin_fill(self, id):
+        self.push(id, BEGIN_FILL, 0.0)
+        self.filling[id] = True
+
+    def end_fill(self, id, color):
+        """Queue filling a turtle's path, with color, its color data"""
+        self.push(id, END_FILL, len(self.colors))
+        self.colors.extend(list(color[0:TURTLE_COLOR_DATA_SIZE]))
+        self.filling[id] = False
+
+    def clear(self, id):
+        """Queue clearing a turtle's trails and fills"""
+        self.push(id, CLEAR, 0.0)
+
+    def stamp(self, id, stamp):
+        """Queue placing a hidden stamp where a turtle is"""
+        self.push(id, STAMP, stamp)
+
+    def isdown(self, id):
+        """Whether a turtle's pen is down, after its queued commands"""
+        down = self.pen.get(id)
+        if down is None:
+            return self.trails is not None and self.trails.isdown(id)
+        return down
+
+    def isfilling(self, id):
+        """Whether a turtle is filling, after its queued commands"""
+        filling = self.filling.get(id)
+        if filling is None:
+            return self.fills is not None and self.fills.isfilling(id)
+        return filling
+
+    def forget(self, id):
+        """Drop a destroyed turtle's queued pen and fill state, its commands
+        are dropped when executed"""
+        self.pen.pop(id, None)
+        self.filling.pop(id, None)
+
+    def execute(self):
+        """Apply and clear all queued commands, returning how many there
+        were"""
+        count = len(self.ids)
+        if not count:
+            return 0
+        with self.manager.lock:
+            # move turtles from where they are, if simulated elsewhere
+            self.manager.sync()
+            if self.use_numpy:
+                self._execute_numpy()
+            else:
+                self._execute_python()
+        self._clear()
+        return count
+
+    def _execute_python(self):
+        manager = self.manager
+        trails = self.trails
+        fills = self.fills
+        args = self.args
+        serials = self.serials
+        serial = manager.ids.serial
+        segments = []
+        for i, (id, op) in enumerate(zip(self.ids, self.ops)):
+            shape = manager.id_to_shape.get(id)
+            if shape is None or serials[i] and serial(id) != serials[i]:
+                if op == STAMP and self.stamps is not None:
+                    self.stamps.clear(int(args[2 * i]))
+                continue
+            buffer = manager.buffers[shape]
+            index = buffer.slots.index(id)
+            data = buffer.model.get(index)
+            if op == CLEAR and segments:
+                # the segments so far may be cleared
+                trails.add(segments)
+                segments = []
+            if op in PEN or op in FILL:
+                self._pen(id, op, data[0], data[1])
+                self._fill(id, op, args[2 * i], data[0], data[1])
+                continue
+            if op == STAMP:
+                if self.stamps is not None:
+                    self.stamps.place(int(args[2 * i]),
+                                      list(data[0:TURTLE_MODEL_DATA_SIZE]))
+                continue
+            x, y = data[0], data[1]
+            apply_command(data, op, args[2 * i], args[2 * i + 1])
+            buffer.model.mark_dirty(index, index + 1)
+            if op in MOVES and trails is not None and trails.isdown(id):
+                segments.extend(segment(
+                    id, x, y, data[0], data[1], buffer.color.get(index)))
+                trails.moved_to(id, data[0], data[1])
+            if op in MOVES and fills is not None and fills.isfilling(id):
+                fills.moved_to(id, data[0], data[1])
+        if segments:
+            trails.add(segments)
+
+    def _pen(self, id, op, x, y):
+        """Apply a command's changes to trails, for a turtle at x, y"""
+        trails = self.trails
+        if trails is None:
+            return
+        if op == PENDOWN:
+            trails.pendown(id, x, y)
+        elif op == PENUP:
+            trails.penup(id)
+        elif op == CLEAR:
+            trails.clear_owned(id)
+
+    def _fill(self, id, op, a, x, y):
+        """Apply a command's changes to fills, for a turtle at x, y"""
+        fills = self.fills
+        if fills is None:
+            return
+        if op == BEGIN_FILL:
+            fills.begin(id, x, y)
+        elif op == END_FILL:
+            offset = int(a)
+            fills.end(id, self.colors[offset:offset + TURTLE_COLOR_DATA_SIZE])
+        elif op == CLEAR:
+            fills.clear_owned(id)
+
+    def _execute_numpy(self):
+        ids = numpy.frombuffer(self.ids, numpy.int32)
+        serials = numpy.frombuffer(self.serials, numpy.uint32)
+        # drop commands for turtles since destroyed, by queueing them for -1
+        serial_of = numpy.frombuffer(self.manager.ids.serial_of, numpy.uint32)
+        known = numpy.flatnonzero((ids >= 0) & (ids < len(serial_of)))
+        current = numpy.zeros(len(ids), numpy.uint32)
+        current[known] = serial_of[ids[known]]
+        stale = (serials != 0) & (current != serials)
+        if stale.any():
+            ids = numpy.where(stale, -1, ids).astype(numpy.int32)
+        ops = numpy.frombuffer(self.ops, numpy.uint8)
+        args = numpy.frombuffer(self.args, numpy.float64).reshape(-1, 2)
+        stamping = self.stamps is not None
+        dropped = (ops == STAMP) & stamping
+        for buffer in self.manager.buffers.values():
+            if not buffer.count:
+                continue
+            # an id only has an index in the buffer its turtle is in
+            index = buffer.slots.indices(ids)
+            mine = numpy.flatnonzero(index >= 0)
+            if not len(mine):
+                continue
+            index = index[mine]
+            buffer_ops = ops[mine]
+            drawing = (stamping or self.trails is not None
+                       or self.fills is not None)
+            path = numpy.empty((len(mine), 6)) if drawing else None
+            touched = numpy_apply_commands(
+                buffer.model.as_array(), index, buffer_ops, args[mine], path)
+            buffer.model.mark_dirty(touched[0], touched[-1] + 1)
+            if self.trails is not None:
+                self._add_segments(buffer, index, buffer_ops, path, touched)
+            if self.fills is not None:
+                self._add_fill_vertices(
+                    buffer, index, buffer_ops, args[mine], path)
+            stamp = numpy.flatnonzero(buffer_ops == STAMP)
+            if stamping and len(stamp):
+                self._place_stamps(
+                    buffer, index[stamp], args[mine[stamp], 0], path[stamp])
+                dropped[mine[stamp]] = False
+        # the stamps of turtles since destroyed
+        for stamp in args[dropped, 0].tolist():
+            self.stamps.clear(int(stamp))
+
+    def _place_stamps(self, buffer, index, stamps, path):
+        """Place stamps with their turtles' model data, where they were"""
+        model = buffer.model.as_array()[index]
+        model[:, 0:2] = path[:, 2:4]
+        model[:, 4:6] = path[:, 4:6]
+        theta = numpy.radians(path[:, 4])
+        phi = numpy.radians(path[:, 5])
+        model[:, 6] = numpy.cos(theta)
+        model[:, 7] = numpy.sin(theta)
+        model[:, 8] = numpy.cos(phi)
+        model[:, 9] = numpy.sin(phi)
+        for stamp, data in zip(stamps.tolist(), model.tolist()):
+            self.stamps.place(int(stamp), data)
+
+    def _add_segments(self, buffer, index, ops, path, touched):
+        """Add segments for the moves of turtles with their pens down, and
+        put pens down and up, and clear trails, as queued"""
+        trails = self.trails
+        id_of = numpy.frombuffer(buffer.slots.id_of, numpy.int32)
+        ids = id_of[index]
+        down = trails.down_mask(ids)
+        pen = numpy.isin(ops, PEN)
+        if pen.any():
+            down = pen_states(ids, ops, pen, down)
+            for i in numpy.flatnonzero(pen).tolist():
+                self._pen(int(ids[i]), ops[i], path[i, 0], path[i, 1])
+        down &= numpy.isin(ops, MOVES)
+        clear = ops == CLEAR
+        if clear.any():
+            for id in numpy.unique(ids[clear]).tolist():
+                trails.clear_owned(id)
+            down &= ~cleared_later(ids, clear)
+        if down.any():
+            colors = buffer.color.as_array()
+            drawn = path[down]
+            trails.add(numpy_segments(
+                ids[down], drawn[:, 0], drawn[:, 1], drawn[:, 2],
+                drawn[:, 3], colors[index[down]]))
+        # trails reach where their turtles end up
+        ids = id_of[touched]
+        down = trails.down_mask(ids)
+        if down.any():
+            model = buffer.model.as_array()
+            trails.numpy_moved_to(
+                ids[down], model[touched[down], 0], model[touched[down], 1])
+
+    def _add_fill_vertices(self, buffer, index, ops, args, path):
+        """Add the moves of filling turtles to their paths, and begin, end
+        and clear fills, in order"""
+        fills = self.fills
+        fill = numpy.isin(ops, FILL)
+        if not fills.paths and not fill.any():
+            return
+        ids = numpy.frombuffer(buffer.slots.id_of, numpy.int32)[index]
+        filling = numpy.concatenate((
+            numpy.fromiter(fills.paths, numpy.int32, len(fills.paths)),
+            ids[ops == BEGIN_FILL]))
+        fill |= numpy.isin(ops, MOVES) & numpy.isin(ids, filling)
+        for i in numpy.flatnonzero(fill).tolist():
+            id = int(ids[i])
+            if ops[i] in FILL:
+                self._fill(id, ops[i], args[i, 0], path[i, 0], path[i, 1])
+            elif fills.isfilling(id):
+                fills.moved_to(id, path[i, 2], path[i, 3])
+
+
+def pen_states(ids, ops, pen, down):
+    """Whether each command's turtle's pen is down when it runs, from its
+    turtle's last pen command before it, if any, else from down.
+
+    ids and ops are arrays of each command's turtle id and opcode, in the
+    order queued, pen a bool array of which are pen commands, and down of
+    whether each command's turtle's pen was down before them all.
+    """
+    order = numpy.argsort(ids, kind='stable')
+    grouped = ids[order]
+    positions = numpy.arange(len(ids))
+    first = numpy.concatenate(([True], grouped[1:] != grouped[:-1]))
+    start = numpy.maximum.accumulate(numpy.where(first, positions, 0))
+    last = numpy.maximum.accumulate(numpy.where(pen[order], positions, -1))
+    changed = last >= start
+    states = down[order]
+    states[changed] = ops[order][last[changed]] == PENDOWN
+    down = numpy.empty(len(ids), bool)
+    down[order] = states
+    return down
+
+
+def cleared_later(ids, clear):
+    """Whether each command's turtle clears after it, for arrays of each
+    command's turtle id, and whether it's a CLEAR, in the order queued"""
+    order = numpy.argsort(ids, kind='stable')
+    grouped = ids[order]
+    positions = numpy.arange(len(ids))
+    first = numpy.concatenate(([True], grouped[1:] != grouped[:-1]))
+    slot = numpy.cumsum(first) - 1
+    last = numpy.maximum.reduceat(
+        numpy.where(clear[order], positions, -1), numpy.flatnonzero(first))
+    cleared = numpy.empty(len(ids), bool)
+    cleared[order] = positions < last[slot]
+    return cleared
+
+
+def apply_command(data, op, a, b):
+    """Apply one command to a turtle's model data"""
+    if op == FORWARD:
+        theta = radians(data[4])
+        data[0] += a * cos(theta)
+        data[1] += a * sin(theta)
+        return
+    if op == LEFT:
+        turn = a
+    elif op == SETHEADING:
+        turn = a - data[4]
+    elif op == GOTO:
+        data[0] = a
+        data[1] = b
+        return
+    else:
+        raise ValueError("unknown command {}".format(op))
+    heading = (data[4] + turn) % 360
+    orientation = (data[5] + turn) % 360
+    data[4] = heading
+    data[5] = orientation
+    theta = radians(heading)
+    data[6] = cos(theta)
+    data[7] = sin(theta)
+    theta = radians(orientation)
+    data[8] = cos(theta)
+    data[9] = sin(theta)
+
+
+def _restarting_cumsum(values, restart, base):
+    """Running sums of values, each run starting again from base where
+    restart is True, as restart[0] must be"""
+    total = numpy.cumsum(values)
+    last = numpy.maximum.accumulate(
+        numpy.where(restart, numpy.arange(len(values)), 0))
+    return base[last] + (total - total[last] + values[last])
+
+
+def _previous(values, starts, initial):
+    """Each of values' predecessor in its run, or initial at run starts"""
+    previous = numpy.empty(len(values))
+    previous[1:] = values[:-1]
+    previous[starts] = initial
+    return previous
+
+
+def numpy_apply_commands(model, index, ops, args, path=None):
+    """Apply commands to model, a (count, 16) array view of model data.
+
+    index is the buffer index of each command's turtle, and args a (n, 2)
+    array, both in the order queued. Returns the sorted indices of the
+    turtles changed. If path is an (n, 6) array, it's filled with where
+    each command's turtle was, x, y, before it, and x, y, heading and
+    orientation after it, in the order queued.
+
+    Each turtle's commands are applied in order without a loop over them,
+    as running sums of turns and moves, restarting at each setheading and
+    goto, so the cost doesn't depend on how they're spread over turtles.
+    """
+    # group each turtle's commands, keeping their order
+    order = numpy.argsort(index, kind='stable')
+    grouped = index[order]
+    n = len(grouped)
+    first = numpy.concatenate(([True], grouped[1:] != grouped[:-1]))
+    starts = numpy.flatnonzero(first)
+    ends = numpy.append(starts[1:], n) - 1
+    slot = numpy.cumsum(first) - 1
+    turtles = grouped[starts]
+    op = ops[order]
+    a = args[order, 0]
+    b = args[order, 1]
+
+    x0 = model[turtles, 0].astype(numpy.float64)
+    y0 = model[turtles, 1].astype(numpy.float64)
+    heading0 = model[turtles, 4].astype(numpy.float64)
+    # turning turns both, so orientation stays this far from heading
+    tilt = model[turtles, 5] - heading0
+
+    left = op == LEFT
+    setheading = op == SETHEADING
+    heading = _restarting_cumsum(
+        numpy.where(left, a, 0.0), first | setheading,
+        numpy.where(setheading, a, heading0[slot]))
+    theta = numpy.radians(_previous(heading, starts, heading0))
+
+    forward = op == FORWARD
+    goto = op == GOTO
+    restart = first | goto
+    distance = numpy.where(forward, a, 0.0)
+    x = _restarting_cumsum(
+        distance * numpy.cos(theta), restart, numpy.where(goto, a, x0[slot]))
+    y = _restarting_cumsum(
+        distance * numpy.sin(theta), restart, numpy.where(goto, b, y0[slot]))
+
+    model[turtles, 0] = x[ends]
+    model[turtles, 1] = y[ends]
+    turned = numpy.logical_or.reduceat(left | setheading, starts)
+    if turned.any():
+        turtles_turned = turtles[turned]
+        final = heading[ends[turned]]
+        theta = numpy.radians(final)
+        phi = numpy.radians(final + tilt[turned])
+        model[turtles_turned, 4] = numpy.mod(final, 360.0)
+        model[turtles_turned, 5] = numpy.mod(final + tilt[turned], 360.0)
+        model[turtles_turned, 6] = numpy.cos(theta)
+        model[turtles_turned, 7] = numpy.sin(theta)
+        model[turtles_turned, 8] = numpy.cos(phi)
+        model[turtles_turned, 9] = numpy.sin(phi)
+
+    if path is not None:
+        path[order, 0] = _previous(x, starts, x0)
+        path[order, 1] = _previous(y, starts, y0)
+        path[order, 2] = x
+        path[order, 3] = y
+        path[order, 4] = numpy.mod(heading, 360.0)
+        path[order, 5] = numpy.mod(heading + tilt[slot], 360.0)
+    return turtles
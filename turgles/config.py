@@ -3,8 +3,29 @@ world_height = 800.0
 turtle_size = 1
 num_turtles = 1000
 
+# simulation the demo runs, 'random_walk' or 'boids'
+simulation = 'random_walk'
+
+# seconds per simulation step, see scheduler.py
+timestep = 1 / 30.0
+
 # for random walk
 speed = 30.0
 degrees = 4.0
 lambd = 1.0 / degrees
 half_degrees = degrees / 2
+
+# set to an int for random walks that replay exactly
+seed = None
+
+# simulation name -> kernel variant, to use instead of the fastest, e.g.
+# {'random_walk': 'numpy'}. See kernels.py
+kernels = {}
+
+# for boids, see boids.py
+boids_radius = 25.0
+boids_separation = 8.0
+boids_separation_weight = 1.5
+boids_alignment_weight = 1.0
+boids_cohesion_weight = 1.0
+boids_max_turn = 10.0
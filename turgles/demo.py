@@ -21,8 +21,14 @@ from turgles.config import (
     world_height,
     num_turtles,
     turtle_size,
+    seed,
+    simulation,
+    timestep,
 )
-from turgles.random_walk import update as _update
+from turgles.kernels import select
+from turgles.scheduler import FixedStepScheduler
+# register the simulation kernels
+from turgles import random_walk, boids
 
 if len(sys.argv) > 1:
     num_turtles = int(sys.argv[1])
@@ -85,19 +91,29 @@ class Model(object):
     pass
 
 ID = 0
-for shape in shapes:
-    for i in range(n):
+
+
+def create_turtles(shape, count):
+    global ID
+    models = []
+    init = []
+    for i in range(count):
         model = Model()
         model.id = ID
-        renderer.create_turtle(model, gen_turtle(), shape)
+        models.append(model)
+        init.extend(gen_turtle())
         ID += 1
+    renderer.create_turtles(models, init, shape)
+
+for shape in shapes:
+    create_turtles(shape, n)
+
+create_turtles(choice(shapes), m)
 
-extra_shapes = choice(shapes)
-for i in range(m):
-    model = Model()
-    model.id = ID
-    renderer.create_turtle(model, gen_turtle(), shape)
-    ID += 1
+# pick the fastest kernel for this many turtles
+_update = select(simulation, renderer.manager.buffers.values())
+scheduler = FixedStepScheduler(
+    renderer.manager, _update, timestep, seed, commands=renderer.commands)
 
 
 @renderer.window.event
@@ -108,7 +124,8 @@ def on_draw():
 
 def update(dt):
     with measure("update"):
-        _update(dt, renderer.manager.buffers.values())
+        alpha = scheduler.advance(dt)
+    renderer.set_interpolation(alpha)
 
 
 _flip = renderer.window.flip
@@ -120,5 +137,6 @@ def flip():
 
 renderer.window.flip = flip
 
-pyglet.clock.schedule_interval(update, 1/30)
+# simulate at a fixed rate, but interpolate every frame
+pyglet.clock.schedule(update)
 pyglet.app.run()
@@ -5,18 +5,46 @@ import pkg_resources
 
 from turgles.geometry import SHAPES
 from turgles.gl.api import (
+    GL_MAX_VERTEX_UNIFORM_COMPONENTS,
     GL_STATIC_DRAW,
     GL_TRIANGLES,
     GLfloat,
+    GLint,
     glGetAttribLocation,
+    glGetIntegerv,
     glDrawArrays,
 )
 from turgles.renderer import Renderer
 from turgles.gl.buffer import VertexBuffer
+from turgles.gl.program import Program, ShaderError
 from turgles.util import measure
 from turgles import memory
 
-BATCH_SIZE = 35  # see shader
+# vertex uniform components used by the shader, see turtles_es.vert
+STATIC_UNIFORM_COMPONENTS = 16 + 16 + 1 + 1
+TURTLE_UNIFORM_COMPONENTS = 16 + 12
+# ES2 guarantees at least 1024 components, which gives the default size
+MIN_VERTEX_UNIFORM_COMPONENTS = 1024
+
+
+def calculate_batch_size(max_components):
+    """How many turtles' data fit in the vertex shader's uniforms"""
+    available = max_components - STATIC_UNIFORM_COMPONENTS
+    return max(1, available // TURTLE_UNIFORM_COMPONENTS)
+
+
+BATCH_SIZE = calculate_batch_size(MIN_VERTEX_UNIFORM_COMPONENTS)
+
+
+def set_array_size(source, size):
+    """Defines the shader's ARRAY_SIZE, just after any #version line"""
+    lines = source.split('\n')
+    define = '#define ARRAY_SIZE {}'.format(size)
+    if lines[0].startswith('#version'):
+        lines.insert(1, define)
+    else:
+        lines.insert(0, define)
+    return '\n'.join(lines)
 
 
 class ESTurtleShapeRenderer(object):
@@ -25,12 +53,12 @@ class ESTurtleShapeRenderer(object):
     Creates vertex/index/model arrays, and can render them given turtle
     data."""
 
-    def __init__(self, name, program, geometry):
+    def __init__(self, name, program, geometry, batch_size=BATCH_SIZE):
         self.name = name
         self.program = program
         self.geometry = geometry
-        # size of batched draw calls
-        self.batch = BATCH_SIZE
+        # size of batched draw calls, must match the shader's ARRAY_SIZE
+        self.batch = batch_size
 
         self.vertex_attr = glGetAttribLocation(self.program.id, b"vertex")
         self.edge_attr = glGetAttribLocation(self.program.id, b"edge")
@@ -65,8 +93,9 @@ class ESTurtleShapeRenderer(object):
         model_uniform = self.program.uniforms['turtle_model_array[0]']
         color_uniform = self.program.uniforms['turtle_color_array[0]']
 
-        model_iter = model.slice(self.batch)
-        color_iter = color.slice(self.batch)
+        # slices only cover visible turtles, and the last batch may be partial
+        model_iter = model.slice(self.batch, num_turtles)
+        color_iter = color.slice(self.batch, num_turtles)
         slices = zip(model_iter, color_iter)
 
         with measure("loop"):
@@ -84,6 +113,10 @@ class ESTurtleShapeRenderer(object):
                         len(self.geometry.edges) // 7 * msize,
                     )
 
+        # uniforms are set in full each frame, so nothing to track
+        model.clear_dirty()
+        color.clear_dirty()
+
         self.vertex_buffer.unbind()
         self.program.unbind()
 
@@ -95,8 +128,38 @@ class ES2Renderer(Renderer):
     fragment_shader = pkg_resources.resource_string(
         'turgles', 'shaders/turtles.frag').decode('utf8')
 
+    def compile_program(self):
+        """Size the uniform arrays to as many turtles as the card allows"""
+        max_components = GLint()
+        glGetIntegerv(GL_MAX_VERTEX_UNIFORM_COMPONENTS, max_components)
+        self.batch_size = calculate_batch_size(max_components.value)
+        try:
+            self.program = Program(
+                set_array_size(self.vertex_shader, self.batch_size),
+                self.fragment_shader,
+            )
+        except ShaderError:
+            if self.batch_size <= BATCH_SIZE:
+                raise
+            # some drivers overstate how many components are usable
+            self.batch_size = BATCH_SIZE
+            self.program = Program(
+                set_array_size(self.vertex_shader, self.batch_size),
+                self.fragment_shader,
+            )
+
     def setup_vaos(self):
         self.program.bind()
         self.vao = {}
         for shape, geom in SHAPES.items():
-            self.vao[shape] = ESTurtleShapeRenderer(shape, self.program, geom)
+            self.vao[shape] = ESTurtleShapeRenderer(
+                shape, self.program, geom, self.batch_size)
+
+    def get_stamp_vao(self, shape):
+        # turtle data is set as uniforms each draw, so stamps can share
+        return self.vao[shape]
+
+    def enable_gpu_simulation(self, shader=None, uniforms=None):
+        raise NotImplementedError(
+            "GPU simulation needs transform feedback and instancing, "
+            "use Renderer")
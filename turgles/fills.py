@@ -0,0 +1,259 @@
+"""Filled polygons, from turtles' paths between begin_fill and end_fill.
+
+While a turtle is filling, each of its queued moves adds a vertex to its
+path (see commands.py). At end_fill, the path is triangulated once, by ear
+clipping, and the fill's vertices and triangles are added to two
+ChunkBuffers, uploaded as they are and drawn in one glDrawElements call.
+Vertices are:
+
+    0:   x position
+    1:   y position
+    2-5: fill r, g, b, alpha
+
+the same layout as the start of a trail vertex, see trails.py.
+
+Fill ids count up from 0, like stamps' ids. Clearing a fill only marks it,
+the buffers are compacted, in id order, before the next draw.
+"""
+from __future__ import division, print_function, absolute_import
+
+from array import array
+
+from turgles.buffer import ChunkBuffer
+from turgles.memory import ffi
+
+VERTEX_SIZE = 6
+
+# color data slots copied into each vertex, see memory.py
+FILL_COLOR = slice(4, 8)
+
+
+def _cross(xs, ys, a, b, c):
+    """Twice the signed area of triangle abc, positive if anticlockwise"""
+    return ((xs[b] - xs[a]) * (ys[c] - ys[a]) -
+            (ys[b] - ys[a]) * (xs[c] - xs[a]))
+
+
+def _inside(xs, ys, a, b, c, p):
+    """Whether p is in anticlockwise triangle abc, or on its edges"""
+    return (_cross(xs, ys, a, b, p) >= 0 and
+            _cross(xs, ys, b, c, p) >= 0 and
+            _cross(xs, ys, c, a, p) >= 0)
+
+
+def triangulate(points):
+    """Triangulate a simple polygon, convex or not, by ear clipping.
+
+    points is a flat list of x, y pairs, in either winding. Returns a flat
+    list of indices of points, three per triangle. Repeated points and
+    collinear vertices are skipped. Self intersecting paths get triangles
+    covering them, but not necessarily as turtle would fill them.
+
+    Ears are only checked against reflex vertices, so convex paths, like
+    circle()'s, are quick however many points they have.
+    """
+    xs = points[0::2]
+    ys = points[1::2]
+    remaining = []
+    for i in range(len(xs)):
+        if remaining and (xs[i], ys[i]) == (xs[remaining[-1]],
+                                            ys[remaining[-1]]):
+            continue
+        remaining.append(i)
+    # paths often return to where they started
+    while len(remaining) > 1 and (xs[remaining[0]], ys[remaining[0]]) == (
+            xs[remaining[-1]], ys[remaining[-1]]):
+        remaining.pop()
+    if len(remaining) < 3:
+        return []
+
+    area = 0.0
+    for i, a in enumerate(remaining):
+        b = remaining[i - 1]
+        area += xs[b] * ys[a] - xs[a] * ys[b]
+    if area == 0:
+        return []
+    if area < 0:
+        remaining.reverse()
+
+    # only reflex (or flat) vertices can be inside an ear, so only they are
+    # tested, kept up to date as their neighbours are clipped
+    reflex = set()
+
+    def update(j):
+        n = len(remaining)
+        j %= n
+        v = remaining[j]
+        if _cross(xs, ys, remaining[j - 1], v, remaining[(j + 1) % n]) > 0:
+            reflex.discard(v)
+        else:
+            reflex.add(v)
+
+    for j in range(len(remaining)):
+        update(j)
+
+    triangles = []
+    i = 0
+    misses = 0
+    while len(remaining) > 3:
+        n = len(remaining)
+        i %= n
+        a, b, c = remaining[i - 1], remaining[i], remaining[(i + 1) % n]
+        cross = _cross(xs, ys, a, b, c)
+        if cross == 0:
+            # no area, just drop it
+            del remaining[i]
+            reflex.discard(b)
+            update(i - 1)
+            update(i)
+            misses = 0
+            continue
+        ear = cross > 0 and not any(
+            _inside(xs, ys, a, b, c, p)
+            for p in reflex
+            if (xs[p], ys[p]) not in
+            ((xs[a], ys[a]), (xs[b], ys[b]), (xs[c], ys[c])))
+        if ear or misses > n:
+            # with no ears left, the path crosses itself, so clip anyway
+            triangles.extend((a, b, c))
+            del remaining[i]
+            reflex.discard(b)
+            update(i - 1)
+            update(i)
+            misses = 0
+        else:
+            i += 1
+            misses += 1
+    a, b, c = remaining
+    if _cross(xs, ys, a, b, c) != 0:
+        triangles.extend((a, b, c))
+    return triangles
+
+
+class Fills(object):
+
+    def __init__(self, size=64):
+        self.vertices = ChunkBuffer(size, VERTEX_SIZE)
+        # three vertex indices per triangle
+        self.triangles = ChunkBuffer(size, 3, 'unsigned int')
+        # by fill id, where its vertices and triangles are, and how many,
+        # with a vertex_count of -1 once cleared
+        self.vertex_start = array('i')
+        self.vertex_count = array('i')
+        self.triangle_start = array('i')
+        self.triangle_count = array('i')
+        # owner's turtle id -> its fill ids, oldest first
+        self.owned = {}
+        # turtle id -> flat x, y path, of turtles filling
+        self.paths = {}
+        # whether fills have been cleared since the last compact()
+        self.cleared = False
+
+    def __len__(self):
+        return sum(1 for count in self.vertex_count if count >= 0)
+
+    def __contains__(self, id):
+        return 0 <= id < len(self.vertex_count) and self.vertex_count[id] >= 0
+
+    def begin(self, owner, x, y):
+        """Start recording a turtle's path, from where it is"""
+        self.paths[owner] = array('f', [x, y])
+
+    def forget(self, owner):
+        """Drop a destroyed turtle's unfinished path, so a turtle reusing
+        its id isn't filling"""
+        self.paths.pop(owner, None)
+
+    def isfilling(self, owner):
+        return owner in self.paths
+
+    def moved_to(self, owner, x, y):
+        """Add a vertex to a filling turtle's path"""
+        self.paths[owner].extend((x, y))
+
+    def end(self, owner, color):
+        """Fill the turtle's path with its fill color, returning the new
+        fill's id, or None if the path encloses nothing"""
+        path = self.paths.pop(owner, None)
+        if path is None:
+            return None
+        triangles = triangulate(path)
+        if not triangles:
+            return None
+        return self.add(owner, path, triangles, color)
+
+    def add(self, owner, points, triangles, color):
+        """Add a triangulated fill, returning its id"""
+        id = len(self.vertex_count)
+        n = len(points) // 2
+        rgba = list(color[FILL_COLOR])
+        vertices = []
+        for i in range(n):
+            vertices.extend((points[2 * i], points[2 * i + 1]))
+            vertices.extend(rgba)
+        base = self.vertices.extend(n, vertices)
+        first = self.triangles.extend(
+            len(triangles) // 3, [base + i for i in triangles])
+        self.vertex_start.append(base)
+        self.vertex_count.append(n)
+        self.triangle_start.append(first)
+        self.triangle_count.append(len(triangles) // 3)
+        if owner not in self.owned:
+            self.owned[owner] = array('i')
+        self.owned[owner].append(id)
+        return id
+
+    def clear(self, id):
+        """Remove a fill, returning False if there is no such fill"""
+        if id not in self:
+            return False
+        self.vertex_count[id] = -1
+        self.cleared = True
+        return True
+
+    def clear_owned(self, owner):
+        """Remove all of an owner's fills, returning the number removed"""
+        return sum(self.clear(id) for id in self.owned.pop(owner, ()))
+
+    def compact(self):
+        """Close the gaps left by cleared fills, before drawing"""
+        if not self.cleared:
+            return
+        self.cleared = False
+        vertices = self.vertices
+        triangles = self.triangles
+        vertex_bytes = VERTEX_SIZE * vertices.ctype_size
+        triangle_bytes = 3 * triangles.ctype_size
+        next_vertex = next_triangle = 0
+        moved_from = None
+        for id, count in enumerate(self.vertex_count):
+            if count < 0:
+                continue
+            start = self.vertex_start[id]
+            first = self.triangle_start[id]
+            n = self.triangle_count[id]
+            if start != next_vertex:
+                if moved_from is None:
+                    moved_from = (next_vertex, next_triangle)
+                ffi.memmove(
+                    vertices.data + next_vertex * VERTEX_SIZE,
+                    vertices.data + start * VERTEX_SIZE,
+                    count * vertex_bytes)
+                ffi.memmove(
+                    triangles.data + next_triangle * 3,
+                    triangles.data + first * 3,
+                    n * triangle_bytes)
+                shift = start - next_vertex
+                data = triangles.data
+                offset = next_triangle * 3
+                data[offset:offset + 3 * n] = [
+                    i - shift for i in data[offset:offset + 3 * n]]
+                self.vertex_start[id] = next_vertex
+                self.triangle_start[id] = next_triangle
+            next_vertex += count
+            next_triangle += n
+        vertices.count = next_vertex
+        triangles.count = next_triangle
+        if moved_from is not None:
+            vertices.mark_dirty(moved_from[0])
+            triangles.mark_dirty(moved_from[1])
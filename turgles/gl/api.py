@@ -106,6 +106,7 @@ from pyglet.gl import (
     glStencilOpSeparate,
     glTexImage2D,
     glTexParameterfv,
+    glTexParameteri,
     glTexParameteriv,
     glTexSubImage2D,
     glUniform1f, glUniform1fv,
@@ -1,9 +1,11 @@
 from turgles.gl.api import (
     GL_ARRAY_BUFFER,
+    GL_ELEMENT_ARRAY_BUFFER,
     glBindBuffer,
     glBufferData,
     glBufferSubData,
     glEnableVertexAttribArray,
+    glGetBufferSubData,
     GL_FALSE,
     glGenBuffers,
     GLuint,
@@ -40,22 +42,34 @@ class Buffer(object):
         """Same for all buffer types"""
         glBindBuffer(self.array_type, 0)
 
-    def load(self, data, size=None):
-        """Data is cffi array"""
-        self.bind()
+    def load(self, data, size=None, ranges=None):
+        """Data is cffi array.
+
+        If ranges of (offset, size) in bytes are given, only those parts of
+        the data are copied, unless the GPU buffer needs reallocating.
+        """
         if size is None:
             # ffi's sizeof understands arrays
             size = sizeof(data)
         if size == self.buffer_size:
+            if ranges is None:
+                ranges = [(0, size)]
+            elif not ranges:
+                # nothing has changed
+                return
             # same size - no need to allocate new buffer, just copy
-            glBufferSubData(
-                self.array_type,
-                0,
-                size,
-                to_raw_pointer(data)
-            )
+            self.bind()
+            pointer = to_raw_pointer(data)
+            for offset, length in ranges:
+                glBufferSubData(
+                    self.array_type,
+                    offset,
+                    length,
+                    pointer + offset
+                )
         else:
             # buffer size has changed - need to allocate new buffer in the GPU
+            self.bind()
             glBufferData(
                 self.array_type,
                 size,
@@ -65,6 +79,18 @@ class Buffer(object):
             self.buffer_size = size
         self.unbind()
 
+    def read(self, data, size, offset=0):
+        """Copy size bytes from offset in the GPU buffer into the same offset
+        of data, a cffi array"""
+        self.bind()
+        glGetBufferSubData(
+            self.array_type,
+            offset,
+            size,
+            to_raw_pointer(data) + offset
+        )
+        self.unbind()
+
 
 class VertexBuffer(Buffer):
     """A VBO object to store vertex/model data.
@@ -97,9 +123,16 @@ class VertexBuffer(Buffer):
         if divisor is not None:
             glVertexAttribDivisor(index, divisor)
 
-    def partition(self, args, **kwargs):
+    def partition(self, args, offset=0, **kwargs):
         kwargs['stride'] = sum(a[1] for a in args) * self.element_size
-        offset = 0
         for attr, size in args:
             self.set(attr, size, offset=offset, **kwargs)
             offset += size * self.element_size
+
+
+class ElementBuffer(Buffer):
+    """An index buffer, for glDrawElements"""
+
+    def __init__(self, element_type, draw_type):
+        super(ElementBuffer, self).__init__(
+            GL_ELEMENT_ARRAY_BUFFER, element_type, draw_type)
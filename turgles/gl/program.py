@@ -11,6 +11,7 @@ from ctypes import (
 
 from turgles.gl.api import (
     GL_ACTIVE_UNIFORMS,
+    GL_INTERLEAVED_ATTRIBS,
     glAttachShader,
     glCompileShader,
     glCreateProgram,
@@ -26,6 +27,7 @@ from turgles.gl.api import (
     GL_LINK_STATUS,
     GL_OBJECT_COMPILE_STATUS_ARB,
     glShaderSource,
+    glTransformFeedbackVaryings,
     GL_VERTEX_SHADER,
 )
 
@@ -73,10 +75,16 @@ class Program:
     Loads/compiles/links the shaders, and handles any errors.
     """
 
-    def __init__(self, vertex, fragment):
+    def __init__(self, vertex, fragment, feedback_varyings=None):
+        """If feedback_varyings are given, the vertex shader's outputs of
+        those names are captured, interleaved, by transform feedback. Such
+        programs don't need a fragment shader."""
         self.id = glCreateProgram()
         self.create_shader(vertex, GL_VERTEX_SHADER)
-        self.create_shader(fragment, GL_FRAGMENT_SHADER)
+        if fragment is not None:
+            self.create_shader(fragment, GL_FRAGMENT_SHADER)
+        if feedback_varyings:
+            self.set_feedback_varyings(feedback_varyings)
         self.compile()
         self.bind()
 
@@ -111,6 +119,13 @@ class Program:
         else:
             glAttachShader(self.id, shader_id)
 
+    def set_feedback_varyings(self, names):
+        """Must be called before linking"""
+        cnames = [convert_to_cstring(name) for name in names]
+        array = (POINTER(c_char) * len(cnames))(*cnames)
+        glTransformFeedbackVaryings(
+            self.id, len(cnames), array, GL_INTERLEAVED_ATTRIBS)
+
     def compile(self):
         glLinkProgram(self.id)
         status = c_int(0)
@@ -16,6 +16,7 @@ from turgles.gl.api import (
     GL_FLOAT_MAT2,
     GL_FLOAT_MAT3,
     GL_FLOAT_MAT4,
+    GL_SAMPLER_2D,
     GLint,
     GLsizei,
     GLenum,
@@ -83,6 +84,8 @@ class Uniform(object):
         GL_FLOAT_MAT2: (GLfloat, 4),
         GL_FLOAT_MAT3: (GLfloat, 9),
         GL_FLOAT_MAT4: (GLfloat, 16),
+        # texture unit
+        GL_SAMPLER_2D: (GLint, 1),
     }
 
     SETTERS = {
@@ -95,6 +98,7 @@ class Uniform(object):
         GL_INT_VEC2: glUniform2i,
         GL_INT_VEC3: glUniform3i,
         GL_INT_VEC4: glUniform4i,
+        GL_SAMPLER_2D: glUniform1i,
     }
 
     VSETTERS = {
@@ -0,0 +1,135 @@
+"""A registry of simulation kernels.
+
+A simulation (e.g. 'random_walk') can have several implementations, or
+variants, of its per-tick update function - pure Python, numpy, C. They all
+take the same arguments:
+
+    update(dt, buffers, tick=0, seed=None)
+
+Variants register themselves, and select() picks one, either as set in
+config.kernels, or by timing a short run of each on copies of up to
+SAMPLE_SIZE of the turtles to be simulated. Fallback variants, e.g. pure
+Python, are only timed if there is nothing else.
+"""
+from __future__ import division, print_function, absolute_import
+
+import logging
+import os
+from collections import OrderedDict
+from timeit import default_timer
+
+from turgles import config
+from turgles.memory import ffi
+
+log = logging.getLogger(__name__)
+
+# simulation name -> OrderedDict of variant name -> update function
+KERNELS = {}
+
+# simulation name -> (variant name, update function) chosen by select()
+SELECTED = {}
+
+# simulation name -> set of its fallback variants' names
+FALLBACKS = {}
+
+# most turtles copied to calibrate on
+SAMPLE_SIZE = 10000
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_library(name):
+    """Load a compiled kernel library from the package directory.
+
+    Returns None if it is not there, or can't be loaded.
+    """
+    path = os.path.join(PACKAGE_DIR, name)
+    try:
+        return ffi.dlopen(path)
+    except OSError as e:
+        log.debug("could not load %s: %s", path, e)
+        return None
+
+
+def register(name, variant, update=None, fallback=False):
+    """Register an update function as a variant of a simulation.
+
+    Variants should be registered slowest first, as the last one registered
+    is used when select() is not given any buffers to calibrate with. A
+    fallback variant is known to be slower than any other, so is only
+    calibrated if it's the only one. Can be used as a decorator.
+    """
+    if update is None:
+        return lambda update: register(name, variant, update, fallback)
+    KERNELS.setdefault(name, OrderedDict())[variant] = update
+    if fallback:
+        FALLBACKS.setdefault(name, set()).add(variant)
+    return update
+
+
+def available(name):
+    """The variants of a simulation, as an OrderedDict"""
+    try:
+        return KERNELS[name]
+    except KeyError:
+        raise KeyError("no kernels registered for '{}'".format(name))
+
+
+def sample(buffers, size=SAMPLE_SIZE):
+    """Copies of the buffers, with at most size turtles between them, in
+    proportion to how many each has"""
+    total = sum(b.count for b in buffers)
+    if total <= size:
+        return [b.copy() for b in buffers]
+    return [b.copy(max(1, b.count * size // total)) for b in buffers]
+
+
+def calibrate(name, buffers, ticks=3, dt=1 / 30, size=SAMPLE_SIZE):
+    """Time each variant over a few ticks, on copies of up to size of the
+    buffers' turtles, skipping fallbacks unless there's nothing else.
+
+    Returns a list of (seconds per tick, variant name), fastest first.
+    """
+    variants = available(name)
+    fallbacks = FALLBACKS.get(name, ())
+    if any(v not in fallbacks for v in variants):
+        variants = OrderedDict(
+            (v, update) for v, update in variants.items()
+            if v not in fallbacks)
+    timings = []
+    for variant, update in variants.items():
+        scratch = sample(buffers, size)
+        best = None
+        for tick in range(ticks):
+            start = default_timer()
+            update(dt, scratch, tick, 0)
+            elapsed = default_timer() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append((best, variant))
+    timings.sort()
+    return timings
+
+
+def select(name, buffers=None, variant=None):
+    """Choose an update function for a simulation.
+
+    The variant is, in order of preference, the one passed in, the one set
+    for this simulation in config.kernels, the fastest when calibrated on
+    buffers, or the last one registered.
+    """
+    variants = available(name)
+    if variant is None:
+        variant = config.kernels.get(name)
+    if variant is None and buffers:
+        timings = calibrate(name, buffers)
+        for seconds, v in timings:
+            log.info("%s kernel '%s': %.3f ms", name, v, seconds * 1000)
+        variant = timings[0][1]
+    if variant is None:
+        variant = next(reversed(variants))
+    try:
+        update = variants[variant]
+    except KeyError:
+        raise KeyError("no '{}' kernel for '{}'".format(variant, name))
+    SELECTED[name] = (variant, update)
+    return update
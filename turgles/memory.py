@@ -2,6 +2,11 @@ import ctypes
 from cffi import FFI
 ffi = FFI()
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 # Turgles uses 2 types of rendering - pseudo-instancing for ES2, and hardware
 # instancing for everything else. We want to use tightly packed contiguous
@@ -30,7 +35,7 @@ ffi = FFI()
 # currently unused space, which will be copied up to the GPU each frame. But at
 # least there's some spare space if we need to add new things.
 
-# We need 11 floats currently, so use mat4
+# We need 16 floats currently, so use mat4
 TURTLE_MODEL_DATA_SIZE = 16
 
 # 0:  x position
@@ -44,11 +49,33 @@ TURTLE_MODEL_DATA_SIZE = 16
 # 8:  cos of orientation angle
 # 9:  sin of orientation angle
 # 10: speed
-# 11: unused
-# 12: unused
-# 13: unused
-# 14: unused
-# 15: unused
+# 11: previous x position
+# 12: previous y position
+# 13: previous cos of heading angle
+# 14: previous sin of heading angle
+# 15: 1.0 if 11-14 are set, else 0.0
+#
+# 11-15 are used to interpolate between simulation steps, see scheduler.py
+
+# field names for the above, in order
+TURTLE_MODEL_FIELDS = (
+    'x',
+    'y',
+    'scale_x',
+    'scale_y',
+    'heading',
+    'orientation',
+    'cos_heading',
+    'sin_heading',
+    'cos_orientation',
+    'sin_orientation',
+    'speed',
+    'prev_x',
+    'prev_y',
+    'prev_cos_heading',
+    'prev_sin_heading',
+    'prev_valid',
+)
 
 
 # We need 9, so use mat3
@@ -56,13 +83,57 @@ TURTLE_COLOR_DATA_SIZE = 9
 # 0: pen r
 # 1: pen g
 # 2: pen b
-# 6: pen alpha
-# 3: fill r
-# 4: fill g
-# 5: fill b
+# 3: pen alpha
+# 4: fill r
+# 5: fill g
+# 6: fill b
 # 7: fill alpha
 # 8: pen thickness
 
+TURTLE_COLOR_FIELDS = (
+    'pen_r',
+    'pen_g',
+    'pen_b',
+    'pen_alpha',
+    'fill_r',
+    'fill_g',
+    'fill_b',
+    'fill_alpha',
+    'pen_width',
+)
+
+# turtle init data is model data followed by color data
+TURTLE_INIT_DATA_SIZE = TURTLE_MODEL_DATA_SIZE + TURTLE_COLOR_DATA_SIZE
+
+
+# numpy equivalents of the ctypes we use in buffers
+NUMPY_TYPES = {
+    'float': 'f4',
+    'int': 'i4',
+    'unsigned short': 'u2',
+}
+
+
+def create_struct_dtype(fields, size, ctype='float'):
+    """A numpy dtype for chunks of size ctypes, with the given field names
+    mapping to the first len(fields) items of each chunk"""
+    item = numpy.dtype(NUMPY_TYPES[ctype])
+    return numpy.dtype({
+        'names': list(fields),
+        'formats': [item] * len(fields),
+        'offsets': [i * item.itemsize for i in range(len(fields))],
+        'itemsize': size * item.itemsize,
+    })
+
+
+if numpy is not None:
+    TURTLE_MODEL_DTYPE = create_struct_dtype(
+        TURTLE_MODEL_FIELDS, TURTLE_MODEL_DATA_SIZE)
+    TURTLE_COLOR_DTYPE = create_struct_dtype(
+        TURTLE_COLOR_FIELDS, TURTLE_COLOR_DATA_SIZE)
+else:
+    TURTLE_MODEL_DTYPE = TURTLE_COLOR_DTYPE = None
+
 
 def create_turtle_position_buffer(size):
     return ffi.new('float[%s]' % (size * TURTLE_MODEL_DATA_SIZE))
@@ -72,6 +143,27 @@ def create_turtle_color_buffer(size):
     return ffi.new('float[%s]' % (size * TURTLE_COLOR_DATA_SIZE))
 
 
+def split_init_data(init, num_turtles):
+    """Splits a flat block of init data for many turtles into model and color
+    blocks, suitable for ChunkBuffer.extend()"""
+    if numpy is not None:
+        block = numpy.asarray(init, dtype=numpy.float32).reshape(
+            num_turtles, TURTLE_INIT_DATA_SIZE)
+        model = numpy.ascontiguousarray(block[:, :TURTLE_MODEL_DATA_SIZE])
+        color = numpy.ascontiguousarray(block[:, TURTLE_MODEL_DATA_SIZE:])
+        return model, color
+
+    assert len(init) == num_turtles * TURTLE_INIT_DATA_SIZE
+    model = []
+    color = []
+    end = num_turtles * TURTLE_INIT_DATA_SIZE
+    for offset in range(0, end, TURTLE_INIT_DATA_SIZE):
+        split = offset + TURTLE_MODEL_DATA_SIZE
+        model.extend(init[offset:split])
+        color.extend(init[split:offset + TURTLE_INIT_DATA_SIZE])
+    return model, color
+
+
 def create_index_buffer(init):
     """indexes of vertex triangles"""
     return ffi.new('unsigned short[]', init)
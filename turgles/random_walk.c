@@ -1,11 +1,12 @@
 #include <math.h>
+#include <stdint.h>
 #include <stdlib.h>
 #include <time.h>
 
 #define TURTLE_DATA_SIZE 16
 
-void random_walk(float *x, float magnitude, float half_w, float half_h, float degrees)
-
+/* Moves one turtle, r is a random number in [0, 1] */
+static void walk(float *x, float magnitude, float half_w, float half_h, float degrees, float r)
 {
     float *y = x + 1;
     float *angle = x + 4;
@@ -15,7 +16,6 @@ void random_walk(float *x, float magnitude, float half_w, float half_h, float de
     {
         *angle = fmod(*angle + 180.0, 360.0);
     }
-    float r = rand() / (float)(RAND_MAX);
     float rd = (r * 2 * degrees) - degrees;
     *angle = fmod(*angle + rd, 360.0);
     float theta = *angle / 180.0 * M_PI;
@@ -25,6 +25,97 @@ void random_walk(float *x, float magnitude, float half_w, float half_h, float de
     *y += magnitude * *st;
 }
 
+void random_walk(float *x, float magnitude, float half_w, float half_h, float degrees)
+{
+    walk(x, magnitude, half_w, half_h, degrees, rand() / (float)(RAND_MAX));
+}
+
+/* xorshift32, state must not be 0 */
+static float xorshift_random(unsigned int *state)
+{
+    unsigned int x = *state;
+    x ^= x << 13;
+    x ^= x >> 17;
+    x ^= x << 5;
+    *state = x;
+    return x / 4294967295.0f;
+}
+
+/*
+ * Same as random_walk_all, but uses its own random state seeded from seed
+ * rather than the global rand(), so it is safe to call from many threads at
+ * once on separate ranges of turtles.
+ */
+void random_walk_seeded(
+        float *turtles,
+        int num_turtles,
+        float magnitude,
+        float half_w,
+        float half_h,
+        float degrees,
+        unsigned int seed
+)
+{
+    int i;
+    unsigned int state = seed ? seed : 1;
+    for (i = 0; i < num_turtles; ++i)
+    {
+        walk(turtles + (i * TURTLE_DATA_SIZE), magnitude, half_w, half_h, degrees,
+             xorshift_random(&state));
+    }
+}
+
+/*
+ * Counter based random numbers, the same as hash_random in rng.py. Each
+ * number is a hash of (seed, turtle id, tick), so does not depend on the
+ * order turtles are processed in.
+ */
+static uint32_t mix32(uint32_t x)
+{
+    x ^= x >> 16;
+    x *= 0x85ebca6bu;
+    x ^= x >> 13;
+    x *= 0xc2b2ae35u;
+    x ^= x >> 16;
+    return x;
+}
+
+static uint32_t hash_key(uint32_t seed, uint32_t tick)
+{
+    return mix32(mix32(seed + 0x9e3779b9u) ^ tick);
+}
+
+float hash_random(unsigned int seed, unsigned int id, unsigned int tick)
+{
+    return (mix32(hash_key(seed, tick) ^ id) >> 8) * (1.0f / 16777216.0f);
+}
+
+/*
+ * Walks turtles using random numbers keyed by their ids, which are given in
+ * the same order as the turtles. Replays exactly for the same seed and tick,
+ * however the turtles are ordered or split between threads.
+ */
+void random_walk_hashed(
+        float *turtles,
+        const int *ids,
+        int num_turtles,
+        float magnitude,
+        float half_w,
+        float half_h,
+        float degrees,
+        unsigned int seed,
+        unsigned int tick
+)
+{
+    int i;
+    uint32_t key = hash_key(seed, tick);
+    for (i = 0; i < num_turtles; ++i)
+    {
+        float r = (mix32(key ^ (uint32_t)ids[i]) >> 8) * (1.0f / 16777216.0f);
+        walk(turtles + (i * TURTLE_DATA_SIZE), magnitude, half_w, half_h, degrees, r);
+    }
+}
+
 void random_walk_all(
         float *turtles, 
         int num_turtles, 
@@ -1,48 +1,169 @@
 from __future__ import division, print_function, absolute_import
 
-from random import random
+import atexit
+from random import random, getrandbits
 from math import radians, sin, cos
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 from turgles.config import speed, degrees, world_width, world_height
-from turgles.memory import ffi, TURTLE_MODEL_DATA_SIZE
+from turgles.kernels import load_library, register, select
+from turgles.memory import ffi, numpy, TURTLE_MODEL_DATA_SIZE
+from turgles.rng import hash_random, numpy_hash_random
 
 half_w = world_width // 2
 half_h = world_height // 2
 
-ffi.cdef(
-    "void random_walk_all(float*, int, float, float, float, float);"
-)
-try:
-    fast = ffi.dlopen('./libfast.so')
-except:
-    fast = None
+ffi.cdef("""
+    void random_walk_all(float*, int, float, float, float, float);
+    void random_walk_seeded(
+        float*, int, float, float, float, float, unsigned int);
+    void random_walk_hashed(
+        float*, const int*, int, float, float, float, float,
+        unsigned int, unsigned int);
+    float hash_random(unsigned int, unsigned int, unsigned int);
+""")
+fast = load_library('libfast.so')
 
+# turtles per thread job, below which threading costs more than it saves
+MIN_JOB_SIZE = 4096
+_pool = None
+_pool_size = None
 
-def slow_update(dt, buffers):
+# All update functions take the tick number and an optional seed. With a
+# seed, random numbers are keyed on (seed, turtle id, tick) rather than drawn
+# from a global generator, so a run replays exactly.
+
+
+def slow_update(dt, buffers, tick=0, seed=None):
     magnitude = speed * dt
     for b in buffers:
-        walk(b.model.data, b.count, magnitude, half_w, degrees)
+        if seed is None:
+            walk(b.model.data, b.count, magnitude, half_w, half_h, degrees)
+        else:
+            walk(b.model.data, b.count, magnitude, half_w, half_h, degrees,
+                 b.slots.id_of, tick, seed)
+        b.model.mark_dirty()
 
-if fast:
-    def fast_update(dt, buffers):
-        magnitude = speed * dt
-        for b in buffers:
+
+def numpy_update(dt, buffers, tick=0, seed=None):
+    magnitude = speed * dt
+    for b in buffers:
+        if b.count:
+            randoms = None
+            if seed is not None:
+                randoms = numpy_hash_random(seed, _ids(b), tick)
+            numpy_walk(
+                b.model_view, magnitude, half_w, half_h, degrees, randoms)
+            b.model.mark_dirty()
+
+
+def fast_update(dt, buffers, tick=0, seed=None):
+    magnitude = speed * dt
+    for b in buffers:
+        if seed is None:
             fast.random_walk_all(
                 b.model.data, b.count, magnitude, half_w, half_h, degrees)
-    update = fast_update
-else:
-    update = slow_update
+        else:
+            fast.random_walk_hashed(
+                b.model.data, _id_pointer(b), b.count,
+                magnitude, half_w, half_h, degrees, seed, tick)
+        b.model.mark_dirty()
+
+
+def parallel_update(dt, buffers, tick=0, seed=None, workers=None):
+    """Walk all buffers' turtles in ranges across a pool of threads.
+
+    cffi releases the GIL while calling into C, so the ranges are walked
+    concurrently, each with its own random state. With a seed, the result
+    is the same however the ranges are split.
+    """
+    global _pool, _pool_size
+    if workers is None:
+        workers = cpu_count()
+    if _pool_size != workers:
+        shutdown_pool()
+        _pool = ThreadPool(workers)
+        _pool_size = workers
+
+    buffers = [b for b in buffers if b.count]
+    total = sum(b.count for b in buffers)
+    job_size = max(MIN_JOB_SIZE, -(-total // workers))
+    jobs = []
+    for b in buffers:
+        ids = _id_pointer(b) if seed is not None else None
+        for start in range(0, b.count, job_size):
+            data = b.model.data + start * TURTLE_MODEL_DATA_SIZE
+            size = min(job_size, b.count - start)
+            if ids is None:
+                jobs.append((data, None, size, getrandbits(32)))
+            else:
+                jobs.append((data, ids + start, size, seed))
+
+    magnitude = speed * dt
 
+    def walk_range(job):
+        data, ids, size, job_seed = job
+        if ids is None:
+            fast.random_walk_seeded(
+                data, size, magnitude, half_w, half_h, degrees, job_seed)
+        else:
+            fast.random_walk_hashed(
+                data, ids, size, magnitude, half_w, half_h, degrees,
+                job_seed, tick)
 
-def walk(data, size, magnitude, scale, degress):
-    for x in range(0, size * TURTLE_MODEL_DATA_SIZE, TURTLE_MODEL_DATA_SIZE):
+    _pool.map(walk_range, jobs)
+    for b in buffers:
+        b.model.mark_dirty()
+
+
+def shutdown_pool():
+    """Stop parallel_update's worker threads, if it has started any"""
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = _pool_size = None
+
+
+atexit.register(shutdown_pool)
+
+# slowest first, see kernels.register()
+register('random_walk', 'python', slow_update, fallback=True)
+if numpy is not None:
+    register('random_walk', 'numpy', numpy_update)
+if fast:
+    register('random_walk', 'c', fast_update)
+    if hasattr(fast, 'random_walk_seeded') and cpu_count() > 1:
+        register('random_walk', 'c_parallel', parallel_update)
+
+# the default, before any calibration with select('random_walk', buffers)
+update = select('random_walk')
+
+
+def _ids(buffer):
+    """The ids of a buffer's turtles, in buffer order"""
+    return numpy.frombuffer(buffer.slots.id_of, numpy.int32, buffer.count)
+
+
+def _id_pointer(buffer):
+    """An int* to a buffer's turtle ids, valid until its slots next grow"""
+    return ffi.cast('int *', ffi.from_buffer(buffer.slots.id_of))
+
+
+def walk(data, size, magnitude, half_w, half_h, degrees, ids=None, tick=0,
+         seed=None):
+    """Same as random_walk_all in random_walk.c, one turtle at a time"""
+    for i in range(size):
+        x = i * TURTLE_MODEL_DATA_SIZE
         y = x + 1
         a = x + 4
         angle = data[a]
         absx, absy = abs(data[x]), abs(data[y])
-        if absx > half_h or absy > half_w:
+        if absx > half_w or absy > half_h:
             angle = (angle + 180) % 360
-        angle += (random() * 2 * degrees) - degrees
+        r = random() if seed is None else hash_random(seed, ids[i], tick)
+        angle += (r * 2 * degrees) - degrees
         theta = radians(angle)
         ct = cos(theta)
         st = sin(theta)
@@ -53,3 +174,28 @@ def walk(data, size, magnitude, scale, degress):
         data[a] = angle
         data[x + 6] = ct
         data[x + 7] = st
+
+
+def numpy_walk(turtles, magnitude, half_w, half_h, degrees, randoms=None):
+    """Same as random_walk_all in random_walk.c, over all turtles at once.
+
+    turtles is a structured view of model data, as ShapeBuffer.model_view.
+    randoms is an optional array of a random number in [0, 1) per turtle.
+    """
+    x = turtles['x']
+    y = turtles['y']
+    angle = turtles['heading'].astype(numpy.float64)
+    bounce = (numpy.abs(x) > half_w) | (numpy.abs(y) > half_h)
+    angle[bounce] = numpy.fmod(angle[bounce] + 180.0, 360.0)
+    if randoms is None:
+        randoms = numpy.random.random_sample(len(angle))
+    angle += randoms * 2 * degrees - degrees
+    angle = numpy.fmod(angle, 360.0)
+    theta = numpy.radians(angle)
+    ct = numpy.cos(theta)
+    st = numpy.sin(theta)
+    turtles['heading'] = angle
+    turtles['cos_heading'] = ct
+    turtles['sin_heading'] = st
+    x += magnitude * ct
+    y += magnitude * st
@@ -0,0 +1,176 @@
+"""Accumulating pen trails in a texture, so they aren't redrawn every frame.
+
+Drawing every segment each frame costs more the longer turtles draw. A
+TrailAccumulator instead draws each new segment once, into a texture the
+size of the window, and each frame just draws that texture under the
+turtles, at a fixed cost however many segments there are.
+
+The texture holds the trails as seen by the camera when they were drawn, so
+when the window is resized, or the camera moves, it is cleared and redrawn
+from the segment log, the Trails' buffer, which stays on the GPU. It is also
+redrawn when segments are removed. In ring mode, segments overwritten in the
+log stay in the texture until it is next redrawn.
+"""
+from __future__ import division, print_function, absolute_import
+
+import pkg_resources
+
+from turgles.gl.api import (
+    GL_CLAMP_TO_EDGE,
+    GL_COLOR_ATTACHMENT0,
+    GL_COLOR_BUFFER_BIT,
+    GL_COLOR_CLEAR_VALUE,
+    GL_FRAMEBUFFER,
+    GL_FRAMEBUFFER_COMPLETE,
+    GL_NEAREST,
+    GL_RGBA,
+    GL_RGBA8,
+    GL_STATIC_DRAW,
+    GL_TEXTURE0,
+    GL_TEXTURE_2D,
+    GL_TEXTURE_MAG_FILTER,
+    GL_TEXTURE_MIN_FILTER,
+    GL_TEXTURE_WRAP_S,
+    GL_TEXTURE_WRAP_T,
+    GL_TRIANGLE_STRIP,
+    GL_UNSIGNED_BYTE,
+    GLfloat,
+    GLuint,
+    glActiveTexture,
+    glBindFramebuffer,
+    glBindTexture,
+    glCheckFramebufferStatus,
+    glClear,
+    glClearColor,
+    glDisableVertexAttribArray,
+    glDrawArrays,
+    glFramebufferTexture2D,
+    glGenFramebuffers,
+    glGenTextures,
+    glGetAttribLocation,
+    glGetFloatv,
+    glTexImage2D,
+    glTexParameteri,
+)
+from turgles.gl.buffer import VertexBuffer
+from turgles.gl.program import Program
+from turgles.memory import create_vertex_buffer
+
+# two triangles covering the screen, in clip space
+QUAD = [-1.0, -1.0, 1.0, -1.0, -1.0, 1.0, 1.0, 1.0]
+
+
+class FramebufferError(Exception):
+    pass
+
+
+class TrailAccumulator(object):
+    """Keeps a TrailRenderer's output in a texture, adding new segments as
+    they are added to the Trails."""
+
+    vertex_shader = pkg_resources.resource_string(
+        'turgles', 'shaders/accumulation.vert').decode('utf8')
+    fragment_shader = pkg_resources.resource_string(
+        'turgles', 'shaders/accumulation.frag').decode('utf8')
+
+    def __init__(self, lines, width, height):
+        self.lines = lines
+        self.program = Program(self.vertex_shader, self.fragment_shader)
+        self.position_attr = glGetAttribLocation(
+            self.program.id, b"position")
+        self.program.bind()
+        self.program.uniforms['trails'].set(0)
+        self.program.unbind()
+        self.quad = VertexBuffer(GLfloat, GL_STATIC_DRAW)
+        self.quad.load(create_vertex_buffer(QUAD))
+
+        self.texture = GLuint()
+        glGenTextures(1, self.texture)
+        self.framebuffer = GLuint()
+        glGenFramebuffers(1, self.framebuffer)
+        self.width = self.height = None
+        # the camera the texture was drawn with
+        self.camera = None
+        self.resize(width, height)
+
+    def resize(self, width, height):
+        width, height = int(width), int(height)
+        if (width, height) == (self.width, self.height):
+            return
+        self.width = width
+        self.height = height
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexImage2D(
+            GL_TEXTURE_2D, 0, GL_RGBA8, width, height, 0,
+            GL_RGBA, GL_UNSIGNED_BYTE, None)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glFramebufferTexture2D(
+            GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D,
+            self.texture, 0)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            raise FramebufferError(
+                "trail framebuffer incomplete: {0:#x}".format(status))
+        self.invalidate()
+
+    def set_camera(self, projection, view):
+        """Redraw if the camera has changed since the texture was drawn"""
+        camera = tuple(projection) + tuple(view)
+        if camera != self.camera:
+            self.camera = camera
+            self.invalidate()
+
+    def invalidate(self):
+        """Redraw every segment next update"""
+        self.generation = None
+        self.drawn = 0
+
+    def update(self, trails):
+        """Draw trails' segments added since the last update into the
+        texture, or all of them if it needs redrawing"""
+        new = trails.added - self.drawn
+        redraw = (
+            trails.generation != self.generation or
+            new < 0 or
+            # some were overwritten before being drawn
+            new > len(trails)
+        )
+        if not redraw and not new:
+            return
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        if redraw:
+            self.clear()
+            self.lines.render(trails)
+        else:
+            self.lines.render(trails, trails.newest(new))
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        self.generation = trails.generation
+        self.drawn = trails.added
+
+    def clear(self):
+        """Clear the bound framebuffer to transparent, keeping the window's
+        clear color"""
+        background = (GLfloat * 4)()
+        glGetFloatv(GL_COLOR_CLEAR_VALUE, background)
+        glClearColor(0.0, 0.0, 0.0, 0.0)
+        glClear(GL_COLOR_BUFFER_BIT)
+        glClearColor(*background)
+
+    def render(self):
+        """Draw the texture over the whole window"""
+        self.program.bind()
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        self.quad.set(self.position_attr, 2)
+        glDrawArrays(GL_TRIANGLE_STRIP, 0, 4)
+        glDisableVertexAttribArray(self.position_attr)
+        self.quad.unbind()
+        glBindTexture(GL_TEXTURE_2D, 0)
+        self.program.unbind()
@@ -0,0 +1,202 @@
+"""Simulating turtles on the GPU, with transform feedback.
+
+A FeedbackSimulation keeps a shape's model data in two GPU buffers. Each
+step runs an update shader over every turtle in one buffer, capturing its
+output in the other, and then they swap, so the CPU never touches the data.
+The renderer draws straight from the latest buffer.
+
+The CPU copy of the model data is only brought up to date when asked, with
+read(), or when it must be, before turtles are removed. Changes made on the
+CPU to turtles' model data, and marked dirty, are merged into the GPU's, so
+only the slots the CPU changed are overwritten, see sync.py.
+"""
+from __future__ import division, print_function, absolute_import
+
+import pkg_resources
+
+from turgles.config import speed, degrees, world_width, world_height
+from turgles.gl.api import (
+    GL_DYNAMIC_COPY,
+    GL_POINTS,
+    GL_RASTERIZER_DISCARD,
+    GL_TRANSFORM_FEEDBACK_BUFFER,
+    GLfloat,
+    GLuint,
+    glBeginTransformFeedback,
+    glBindBufferBase,
+    glBindVertexArray,
+    glDisable,
+    glDrawArrays,
+    glEnable,
+    glEndTransformFeedback,
+    glGenVertexArrays,
+    glGetAttribLocation,
+)
+from turgles.gl.buffer import VertexBuffer
+from turgles.gl.program import Program
+from turgles.memory import ffi
+from turgles.render.sync import ModelSync
+
+WALK_SHADER = pkg_resources.resource_string(
+    'turgles', 'shaders/walk_feedback.vert').decode('utf8')
+
+# uniforms for WALK_SHADER, the same as the CPU random walk
+WALK_UNIFORMS = {
+    'speed': speed,
+    'half_w': world_width // 2,
+    'half_h': world_height // 2,
+    'degrees': degrees,
+}
+
+FEEDBACK_VARYINGS = ['out_model0', 'out_model1', 'out_model2', 'out_model3']
+
+
+def _as_int(value):
+    """A 32bit unsigned value as a signed int, for an int uniform"""
+    value &= 0xffffffff
+    return value - (1 << 32) if value >= (1 << 31) else value
+
+
+class FeedbackSimulation(object):
+    """Steps one shape's turtles with an update shader, see
+    shaders/walk_feedback.vert for what the shader must provide."""
+
+    def __init__(self, shader=WALK_SHADER, uniforms=None):
+        if uniforms is None and shader is WALK_SHADER:
+            uniforms = WALK_UNIFORMS
+        self.program = Program(shader, None, FEEDBACK_VARYINGS)
+        self.buffers = [
+            VertexBuffer(GLfloat, GL_DYNAMIC_COPY),
+            VertexBuffer(GLfloat, GL_DYNAMIC_COPY),
+        ]
+        # one VAO per buffer, reading the model data from it
+        self.vaos = []
+        layout = [
+            (glGetAttribLocation(self.program.id, name), 4)
+            for name in (b'model0', b'model1', b'model2', b'model3')
+        ]
+        for buffer in self.buffers:
+            vao = GLuint()
+            glGenVertexArrays(1, vao)
+            glBindVertexArray(vao)
+            buffer.partition(layout)
+            glBindVertexArray(0)
+            self.vaos.append(vao)
+        self.current = 0  # index of the buffer with the latest data
+        self.sync = ModelSync()
+        # the GPU's data for dirty chunks, read back to merge with the CPU's
+        self.scratch = None
+        self.set_uniforms(uniforms or {})
+
+    @property
+    def count(self):
+        """The number of turtles on the GPU"""
+        return self.sync.count
+
+    @property
+    def output(self):
+        """The buffer holding the latest model data"""
+        return self.buffers[self.current]
+
+    def set_uniforms(self, uniforms):
+        """Set the update shader's own uniforms, ignoring any it doesn't
+        use"""
+        self.program.bind()
+        for name, value in uniforms.items():
+            if name in self.program.uniforms:
+                self.program.uniforms[name].set(value)
+        self.program.unbind()
+
+    def step(self, dt, tick=0, seed=0):
+        """Run the update shader over every turtle"""
+        if not self.count:
+            return
+        source = self.current
+        target = 1 - source
+        self.program.bind()
+        uniforms = self.program.uniforms
+        if 'dt' in uniforms:
+            uniforms['dt'].set(dt)
+        if 'tick' in uniforms:
+            uniforms['tick'].set(_as_int(tick))
+        if 'seed' in uniforms:
+            uniforms['seed'].set(_as_int(seed))
+
+        glEnable(GL_RASTERIZER_DISCARD)
+        glBindVertexArray(self.vaos[source])
+        glBindBufferBase(
+            GL_TRANSFORM_FEEDBACK_BUFFER, 0, self.buffers[target].id)
+        glBeginTransformFeedback(GL_POINTS)
+        glDrawArrays(GL_POINTS, 0, self.count)
+        glEndTransformFeedback()
+        glBindBufferBase(GL_TRANSFORM_FEEDBACK_BUFFER, 0, 0)
+        glBindVertexArray(0)
+        glDisable(GL_RASTERIZER_DISCARD)
+        self.program.unbind()
+        self.current = target
+
+    def _upload_dirty(self, model, stop):
+        """Upload the CPU's changes to turtles before stop, merged with the
+        GPU's data for turtles it already has"""
+        merge, new = self.sync.changes(model, stop)
+        if not merge and not new:
+            return
+        chunk_bytes = model.chunk_size * model.ctype_size
+        if merge:
+            if self.scratch is None or len(self.scratch) < len(model.data):
+                self.scratch = ffi.new(
+                    '{}[{}]'.format(model.ctype, len(model.data)))
+            for start, end in merge:
+                self.output.read(
+                    self.scratch, (end - start) * chunk_bytes,
+                    start * chunk_bytes)
+                self.sync.merge(model, self.scratch, start, end)
+        # sized to the GPU buffer, so it is never reallocated here
+        self.output.load(
+            model.data, size=self.output.buffer_size, ranges=[
+                (start * chunk_bytes, (end - start) * chunk_bytes)
+                for start, end in merge + new
+            ])
+        for start, end in new:
+            self.sync.uploaded(model, start, end)
+
+    def read(self, model):
+        """Bring the CPU copy of the model data up to date.
+
+        The CPU's dirty changes are uploaded first, so they aren't lost.
+        """
+        if not self.count:
+            return
+        self._upload_dirty(model, self.count)
+        length = self.count * model.chunk_size * model.ctype_size
+        self.output.read(model.data, length)
+        self.sync.synced_all(model, self.count)
+
+    def pull(self, buffer):
+        """Called before a ShapeBuffer is compacted.
+
+        Compacting moves turtles' data on the CPU, and growing the GPU
+        buffers reloads them from the CPU, so either needs the CPU copy to be
+        up to date.
+        """
+        resized = self._byte_size(buffer) != self.output.buffer_size
+        if buffer.removed or resized:
+            self.read(buffer.model)
+
+    def push(self, buffer):
+        """Called after compacting, to upload new and changed turtles"""
+        model = buffer.model
+        size = self._byte_size(buffer)
+        if self.output.buffer_size != size:
+            # reallocate both, with the CPU's data
+            for gpu_buffer in self.buffers:
+                gpu_buffer.load(model.data)
+            self.sync.synced_all(model, model.count)
+        else:
+            self._upload_dirty(model, model.count)
+            self.sync.count = model.count
+        model.clear_dirty()
+
+    def _byte_size(self, buffer):
+        model = buffer.model
+        return model.size * model.chunk_size * model.ctype_size
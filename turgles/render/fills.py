@@ -0,0 +1,75 @@
+from __future__ import division, print_function, absolute_import
+
+from turgles.gl.api import (
+    GL_STREAM_DRAW,
+    GL_TRIANGLES,
+    GLfloat,
+    GLuint,
+    glDisableVertexAttribArray,
+    glDrawElements,
+    glGetAttribLocation,
+)
+from turgles.gl.buffer import ElementBuffer, VertexBuffer
+from turgles.gl.program import Program
+from turgles.fills import VERTEX_SIZE
+from turgles.render.trails import TrailRenderer
+
+
+class FillRenderer(object):
+    """Draws every fill's triangles in one glDrawElements call.
+
+    Fill vertices start like trail vertices, so share the trails' shaders.
+    Only changed vertices and triangles are uploaded, see Fills.compact().
+    """
+
+    vertex_shader = TrailRenderer.vertex_shader
+    fragment_shader = TrailRenderer.fragment_shader
+
+    def __init__(self):
+        self.program = Program(self.vertex_shader, self.fragment_shader)
+        self.position_attr = glGetAttribLocation(
+            self.program.id, b"position")
+        self.color_attr = glGetAttribLocation(self.program.id, b"color")
+        self.vertex_buffer = VertexBuffer(GLfloat, GL_STREAM_DRAW)
+        self.index_buffer = ElementBuffer(GLuint, GL_STREAM_DRAW)
+
+    def set_projection(self, projection, world_scale):
+        self.program.bind()
+        self.program.uniforms['projection'].set(projection)
+        self.program.uniforms['world_scale'].set(world_scale)
+        self.program.unbind()
+
+    def set_view(self, view):
+        self.program.bind()
+        self.program.uniforms['view'].set(view)
+        self.program.unbind()
+
+    def render(self, fills):
+        fills.compact()
+        vertices = fills.vertices
+        triangles = fills.triangles
+        if not triangles.count:
+            return
+        self.program.bind()
+        self.vertex_buffer.load(
+            vertices.data, ranges=vertices.dirty_byte_ranges())
+        vertices.clear_dirty()
+        self.index_buffer.load(
+            triangles.data, ranges=triangles.dirty_byte_ranges())
+        triangles.clear_dirty()
+
+        stride = VERTEX_SIZE * self.vertex_buffer.element_size
+        self.vertex_buffer.set(self.position_attr, 2, stride=stride)
+        self.vertex_buffer.set(
+            self.color_attr, 4, stride=stride,
+            offset=2 * self.vertex_buffer.element_size)
+        self.index_buffer.bind()
+        glDrawElements(
+            GL_TRIANGLES, triangles.count * 3,
+            self.index_buffer.element_flag, 0)
+        self.index_buffer.unbind()
+        glDisableVertexAttribArray(self.position_attr)
+        glDisableVertexAttribArray(self.color_attr)
+
+        self.vertex_buffer.unbind()
+        self.program.unbind()
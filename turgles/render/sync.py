@@ -0,0 +1,85 @@
+"""Keeping a CPU copy of model data in step with a copy on the GPU.
+
+When the GPU simulates turtles (see feedback.py), the CPU's copy of their
+model data goes stale, but the CPU can still change some of it, e.g. a
+turtle's size. Uploading a changed chunk as it is would put back the stale
+position and heading too. So a ModelSync keeps a copy of the data as it was
+when the CPU and GPU last agreed, and only the slots the CPU has changed
+since then are written over the GPU's data.
+
+Doesn't use GL, the caller reads from and uploads to the GPU.
+"""
+from __future__ import division, print_function, absolute_import
+
+from turgles.memory import ffi, numpy
+
+
+class ModelSync(object):
+
+    def __init__(self, use_numpy=True):
+        self.use_numpy = use_numpy and numpy is not None
+        self.count = 0       # number of turtles on the GPU
+        self.synced = None   # model data as last agreed with the GPU
+
+    def synced_all(self, model, count):
+        """Called once the GPU and model agree on the data of the first
+        count turtles, after uploading or reading all of them"""
+        length = model.size * model.chunk_size
+        if self.synced is None or len(self.synced) != length:
+            self.synced = ffi.new('{}[{}]'.format(model.ctype, length))
+        ffi.memmove(
+            self.synced, model.data,
+            count * model.chunk_size * model.ctype_size)
+        self.count = count
+
+    def changes(self, model, stop):
+        """model's dirty (start, stop) chunk ranges before stop, as two
+        lists: those the GPU has, to merge(), and new turtles', to upload as
+        they are"""
+        merge = []
+        new = []
+        count = self.count
+        for start, end in model.dirty_ranges(stop):
+            if start < count:
+                merge.append((start, min(end, count)))
+            if end > count:
+                new.append((max(start, count), end))
+        return merge, new
+
+    def merge(self, model, gpu, start, stop):
+        """Merge the CPU's changes to chunks [start, stop) into gpu, a cffi
+        array holding the GPU's data for them at the same offsets as model.
+
+        Slots the CPU has changed since the last sync take the CPU's value,
+        the rest keep the GPU's. Afterwards, model and gpu hold the merged
+        data, and agree.
+        """
+        size = model.chunk_size
+        begin, end = start * size, stop * size
+        if self.use_numpy:
+            # model data is floats
+            dtype = numpy.float32
+            nbytes = (end - begin) * model.ctype_size
+            cpu = numpy.frombuffer(
+                ffi.buffer(model.data + begin, nbytes), dtype)
+            synced = numpy.frombuffer(
+                ffi.buffer(self.synced + begin, nbytes), dtype)
+            latest = numpy.frombuffer(ffi.buffer(gpu + begin, nbytes), dtype)
+            changed = cpu != synced
+            latest[changed] = cpu[changed]
+            cpu[:] = latest
+            synced[:] = latest
+        else:
+            data = model.data
+            synced = self.synced
+            for i in range(begin, end):
+                if data[i] != synced[i]:
+                    gpu[i] = data[i]
+                data[i] = synced[i] = gpu[i]
+
+    def uploaded(self, model, start, stop):
+        """Called after uploading chunks [start, stop) as they are"""
+        size = model.chunk_size
+        ffi.memmove(
+            self.synced + start * size, model.data + start * size,
+            (stop - start) * size * model.ctype_size)
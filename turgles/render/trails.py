@@ -0,0 +1,74 @@
+from __future__ import division, print_function, absolute_import
+
+import pkg_resources
+
+from turgles.gl.api import (
+    GL_LINES,
+    GL_STREAM_DRAW,
+    GLfloat,
+    glDisableVertexAttribArray,
+    glDrawArrays,
+    glGetAttribLocation,
+)
+from turgles.gl.buffer import VertexBuffer
+from turgles.gl.program import Program
+from turgles.trails import VERTEX_SIZE
+
+
+class TrailRenderer(object):
+    """Draws Trails' segments as GL_LINES, in one call, or two once a ring
+    of segments has wrapped around.
+
+    Doesn't use a VAO, so works with both renderers. The GPU buffer matches
+    the capacity of the segment buffer, so only new segments are uploaded.
+    Pen widths are stored, but lines are drawn 1 pixel wide, as wide lines
+    are not widely supported.
+    """
+
+    vertex_shader = pkg_resources.resource_string(
+        'turgles', 'shaders/trails.vert').decode('utf8')
+    fragment_shader = pkg_resources.resource_string(
+        'turgles', 'shaders/trails.frag').decode('utf8')
+
+    def __init__(self):
+        self.program = Program(self.vertex_shader, self.fragment_shader)
+        self.position_attr = glGetAttribLocation(
+            self.program.id, b"position")
+        self.color_attr = glGetAttribLocation(self.program.id, b"color")
+        self.vertex_buffer = VertexBuffer(GLfloat, GL_STREAM_DRAW)
+
+    def set_projection(self, projection, world_scale):
+        self.program.bind()
+        self.program.uniforms['projection'].set(projection)
+        self.program.uniforms['world_scale'].set(world_scale)
+        self.program.unbind()
+
+    def set_view(self, view):
+        self.program.bind()
+        self.program.uniforms['view'].set(view)
+        self.program.unbind()
+
+    def render(self, trails, ranges=None):
+        """Draw trails' segments, or just the (start, count) ranges given"""
+        segments = trails.segments
+        if not segments.count:
+            return
+        if ranges is None:
+            ranges = trails.ranges()
+        self.program.bind()
+        self.vertex_buffer.load(
+            segments.data, ranges=segments.dirty_byte_ranges())
+        segments.clear_dirty()
+
+        stride = VERTEX_SIZE * self.vertex_buffer.element_size
+        self.vertex_buffer.set(self.position_attr, 2, stride=stride)
+        self.vertex_buffer.set(
+            self.color_attr, 4, stride=stride,
+            offset=2 * self.vertex_buffer.element_size)
+        for start, count in ranges:
+            glDrawArrays(GL_LINES, start * 2, count * 2)
+        glDisableVertexAttribArray(self.position_attr)
+        glDisableVertexAttribArray(self.color_attr)
+
+        self.vertex_buffer.unbind()
+        self.program.unbind()
@@ -22,7 +22,15 @@ class TurtleShapeVAO(object):
     Creates VAO/vertex/index/model arrays, and can render them given turtle
     data."""
 
-    def __init__(self, name, program, geometry):
+    def __init__(
+            self,
+            name,
+            program,
+            geometry,
+            model_buffer=None,
+            color_buffer=None):
+        """If model/color buffers are passed, they are shared with other VAOs,
+        and turtles are drawn from a range of them with render_range()."""
         self.name = name
         self.program = program
         self.geometry = geometry
@@ -49,42 +57,106 @@ class TurtleShapeVAO(object):
 
         # allocate/configure instanced buffers
         # turtle model buffer
-        self.model_buffer = VertexBuffer(GLfloat, GL_STREAM_DRAW)
+        if model_buffer is None:
+            model_buffer = VertexBuffer(GLfloat, GL_STREAM_DRAW)
+        self.model_buffer = model_buffer
         # mat4 is 4 sequential locations
-        array = [
+        self.model_layout = [
             (self.model_attr,     4),
             (self.model_attr + 1, 4),
             (self.model_attr + 2, 4),
             (self.model_attr + 3, 4),
         ]
-        self.model_buffer.partition(array, divisor=1)
+        self.model_buffer.partition(self.model_layout, divisor=1)
         # turtle color buffer
-        self.color_buffer = VertexBuffer(GLfloat, GL_STREAM_DRAW)
+        if color_buffer is None:
+            color_buffer = VertexBuffer(GLfloat, GL_STREAM_DRAW)
+        self.color_buffer = color_buffer
         # mat3 is 3 sequential locations
-        array = [
+        self.color_layout = [
             (self.color_attr,     3),
             (self.color_attr + 1, 3),
             (self.color_attr + 2, 3),
         ]
-        self.color_buffer.partition(array, divisor=1)
+        self.color_buffer.partition(self.color_layout, divisor=1)
+        # first instance in the buffers that we draw from
+        self.base = 0
 
         # VAO now configured, so unbind
         glBindVertexArray(0)
 
     def render(self, model, color, num_turtles):
-        """Renders all turtles of a given shape"""
+        """Renders the first num_turtles turtles of a given shape"""
         self.program.bind()
         glBindVertexArray(self.vao)
 
-        self.model_buffer.load(model.data, model.byte_size)
-        self.color_buffer.load(color.data, color.byte_size)
+        # the GPU buffers match the capacity of the turtle buffers, so that
+        # only changed turtles need uploading, and colors rarely do. Changes
+        # to turtles not drawn are dropped, as showing a turtle marks it.
+        self.model_buffer.load(
+            model.data, ranges=model.dirty_byte_ranges(num_turtles))
+        model.clear_dirty()
+        self.color_buffer.load(
+            color.data, ranges=color.dirty_byte_ranges(num_turtles))
+        color.clear_dirty()
 
+        self._draw(num_turtles)
+
+        glBindVertexArray(0)
+        self.program.unbind()
+
+    def render_model_buffer(self, model_buffer, color, num_turtles):
+        """Renders turtles whose model data is already on the GPU, in
+        model_buffer, e.g. from a FeedbackSimulation"""
+        self.program.bind()
+        glBindVertexArray(self.vao)
+
+        if model_buffer is not self.model_buffer:
+            self.model_buffer = model_buffer
+            self.model_buffer.partition(self.model_layout, divisor=1)
+        self.color_buffer.load(
+            color.data, ranges=color.dirty_byte_ranges(num_turtles))
+        color.clear_dirty()
+
+        self._draw(num_turtles)
+
+        glBindVertexArray(0)
+        self.program.unbind()
+
+    def render_range(self, base, num_turtles):
+        """Renders turtles from shared buffers, starting at instance base.
+
+        The caller is responsible for uploading the shared buffers.
+        """
+        self.program.bind()
+        glBindVertexArray(self.vao)
+
+        if base != self.base:
+            # point the instanced attributes at our range, the VAO will
+            # remember it until it moves again
+            self.model_buffer.partition(
+                self.model_layout,
+                offset=(base * TURTLE_MODEL_DATA_SIZE *
+                        self.model_buffer.element_size),
+                divisor=1,
+            )
+            self.color_buffer.partition(
+                self.color_layout,
+                offset=(base * TURTLE_COLOR_DATA_SIZE *
+                        self.color_buffer.element_size),
+                divisor=1,
+            )
+            self.base = base
+
+        self._draw(num_turtles)
+
+        glBindVertexArray(0)
+        self.program.unbind()
+
+    def _draw(self, num_turtles):
         glDrawArraysInstanced(
             GL_TRIANGLES,
             0,
             len(self.geometry.edges) // 7,  # 7 = 4 for vertex, 3 for edge
             num_turtles
         )
-
-        glBindVertexArray(0)
-        self.program.unbind()
@@ -7,21 +7,39 @@ import pyglet
 from pyglet.window import key
 
 from turgles.buffer import BufferManager
-from turgles.memory import TURTLE_MODEL_DATA_SIZE, TURTLE_COLOR_DATA_SIZE
+from turgles.commands import CommandQueue
+from turgles.fills import Fills
+from turgles.memory import (
+    TURTLE_MODEL_DATA_SIZE,
+    TURTLE_COLOR_DATA_SIZE,
+    split_init_data,
+)
 from turgles.geometry import SHAPES
 from turgles.turgle import Turgle
 from turgles.gl.api import (
+    GL_STREAM_DRAW,
+    GLfloat,
     glClearColor,
     glGetIntegerv,
     GLsizei,
     GL_DEPTH_TEST,
+    GL_FALSE,
+    GL_TRUE,
+    glDepthMask,
     glEnable,
     glViewport,
     GLint,
     GL_MAX_SAMPLES,
 )
+from turgles.gl.buffer import VertexBuffer
 from turgles.gl.program import Program
+from turgles.render.accumulation import TrailAccumulator
+from turgles.render.feedback import FeedbackSimulation, WALK_SHADER
+from turgles.render.fills import FillRenderer
+from turgles.render.trails import TrailRenderer
 from turgles.render.turtles import TurtleShapeVAO
+from turgles.stamps import Stamps
+from turgles.trails import Trails
 
 
 def identity():
@@ -33,6 +51,13 @@ def identity():
 
 class Renderer(object):
 
+    # shared instanced buffers, when using an arena
+    model_buffer = None
+    color_buffer = None
+
+    # FeedbackSimulations by shape, when simulating on the GPU
+    feedback = None
+
     vertex_shader = pkg_resources.resource_string(
         'turgles', 'shaders/turtles.vert').decode('utf8')
     fragment_shader = pkg_resources.resource_string(
@@ -43,27 +68,68 @@ class Renderer(object):
             width,
             height,
             samples=None,
-            buffer_size=16):
+            buffer_size=16,
+            track_model_changes=False,
+            arena=False,
+            shared=None,
+            double=False,
+            trail_capacity=None,
+            accumulate_trails=False):
 
         self.width = width
         self.half_width = width // 2
         self.height = height
         self.half_height = height // 2
 
+        # If arena is True, all shapes share one model and one color buffer,
+        # uploaded once per frame
+        # If shared is a directory, turtle data is kept in shared files there,
+        # for other processes to simulate, see buffer.attach_buffers()
+        # If double is True, the simulation can run in another thread while
+        # rendering, holding manager.lock while it steps, and rendering only
+        # waits for it to swap the front buffers
+        self.manager = BufferManager(
+            buffer_size, arena=arena, shared=shared, double=double)
+        # If trail_capacity is set, only that many of the latest pen trail
+        # segments are kept
+        self.trails = Trails(buffer_size, trail_capacity)
+        self.fills = Fills(buffer_size)
+        self.stamps = Stamps(buffer_size)
+        # turtles' queued movements, applied once per frame, or each step if
+        # given to a FixedStepScheduler, or whenever the engine calls
+        # commands.execute()
+        self.commands = CommandQueue(
+            self.manager, trails=self.trails, fills=self.fills,
+            stamps=self.stamps)
+        # NinjaTurtle models by id, to update their data when it moves
+        self.models = {}
+
         self.create_window(width, height, samples)
         self.set_background_color()
         self.compile_program()
         self.setup_vaos()
+        self.trail_renderer = TrailRenderer()
+        self.fill_renderer = FillRenderer()
+        # If accumulate_trails is True, new trail segments are drawn once,
+        # into a texture drawn each frame, rather than all every frame
+        self.trail_accumulator = None
+        if accumulate_trails:
+            self.trail_accumulator = TrailAccumulator(
+                self.trail_renderer, width, height)
 
-        self.manager = BufferManager(buffer_size)
+        # If False, all model data is uploaded each frame. If True, the engine
+        # promises to call manager.mark_dirty() or model.mark_dirty() after
+        # writing to model data, and only the changes are uploaded.
+        self.track_model_changes = track_model_changes
 
         self.perspective_matrix = identity()
-        self.set_perspective()
         self.view_matrix = identity()
         self.view_matrix[12] = 0.0
         self.view_matrix[13] = 0.0
         self.view_matrix[14] = 0.0
+        self.set_perspective()
         self.set_view()
+        self.set_interpolation(1.0)
 
     def create_window(self, width, height, samples):
         kwargs = dict(double_buffer=True)
@@ -132,17 +198,35 @@ class Renderer(object):
         scale = min(self.width, self.height) // 2
         self.program.uniforms['world_scale'].set(scale)
         self.program.unbind()
+        self.trail_renderer.set_projection(self.perspective_matrix, scale)
+        self.fill_renderer.set_projection(self.perspective_matrix, scale)
         glViewport(
             0, 0,
             (GLsizei)(int(self.width)),
             (GLsizei)(int(self.height))
         )
+        if self.trail_accumulator is not None:
+            self.trail_accumulator.resize(self.width, self.height)
+            self.trail_accumulator.set_camera(
+                self.perspective_matrix, self.view_matrix)
 
     def set_view(self):
         self.program.bind()
         self.program.uniforms['view'].set(
             self.view_matrix)
         self.program.unbind()
+        self.trail_renderer.set_view(self.view_matrix)
+        self.fill_renderer.set_view(self.view_matrix)
+        if self.trail_accumulator is not None:
+            self.trail_accumulator.set_camera(
+                self.perspective_matrix, self.view_matrix)
+
+    def set_interpolation(self, alpha):
+        """Draw turtles alpha of the way from their previous simulation step
+        to their current one, see scheduler.py"""
+        self.program.bind()
+        self.program.uniforms['alpha'].set(alpha)
+        self.program.unbind()
 
     def set_background_color(self, color=None):
         if color is None:
@@ -156,19 +240,178 @@ class Renderer(object):
     def setup_vaos(self):
         self.program.bind()
         self.vao = {}
+        if self.manager.model_arena is not None:
+            self.model_buffer = VertexBuffer(GLfloat, GL_STREAM_DRAW)
+            self.color_buffer = VertexBuffer(GLfloat, GL_STREAM_DRAW)
         for shape, geom in SHAPES.items():
-            self.vao[shape] = TurtleShapeVAO(shape, self.program, geom)
+            self.vao[shape] = TurtleShapeVAO(
+                shape, self.program, geom,
+                self.model_buffer, self.color_buffer)
+        self.stamp_vao = {}
+
+    def get_stamp_vao(self, shape):
+        """Stamps have their own instanced buffers, so their own VAOs"""
+        if shape not in self.stamp_vao:
+            self.stamp_vao[shape] = TurtleShapeVAO(
+                shape, self.program, SHAPES[shape])
+        return self.stamp_vao[shape]
+
+    def enable_gpu_simulation(self, shader=WALK_SHADER, uniforms=None):
+        """Simulate turtles on the GPU with transform feedback, with an
+        update shader, by default the random walk. See render/feedback.py.
+
+        Turtles' model data then stays on the GPU, so changes to it on the
+        CPU must be marked dirty to be uploaded, and only the slots changed
+        are. Use step_gpu() to simulate, and read_gpu_models() to bring the
+        CPU copy up to date. The manager reads a shape's data back itself
+        before reordering it, e.g. to hide or show turtles, and queued
+        commands read it back before moving turtles.
+        """
+        assert self.model_buffer is None, "not supported with an arena"
+        assert not self.manager.double, "not supported when double buffered"
+        self.feedback = {}
+        self.feedback_shader = shader
+        self.feedback_uniforms = uniforms
+        self.manager.pull = self.read_gpu_model
+
+    def gpu_simulation(self, shape):
+        if shape not in self.feedback:
+            self.feedback[shape] = FeedbackSimulation(
+                self.feedback_shader, self.feedback_uniforms)
+        return self.feedback[shape]
+
+    def step_gpu(self, dt, tick=0, seed=0):
+        """Run one step of the GPU simulation for every turtle"""
+        for simulation in self.feedback.values():
+            simulation.step(dt, tick, seed)
+
+    def read_gpu_models(self):
+        """Copy every turtle's model data from the GPU simulation"""
+        for buffer in self.manager.buffers.values():
+            self.read_gpu_model(buffer)
+
+    def read_gpu_model(self, buffer):
+        """Copy a ShapeBuffer's model data from the GPU simulation"""
+        simulation = self.feedback.get(buffer.shape)
+        if simulation is not None:
+            simulation.read(buffer.model)
 
     # ninjaturtle engine interface
     def render(self, flip=True):
+        manager = self.manager
+        # double buffered, a simulation step in another thread may hold the
+        # lock, so rather than wait, draw the front buffers as they are
+        if manager.lock.acquire(not manager.double):
+            try:
+                self.update_buffers()
+            finally:
+                manager.lock.release()
         self.window.clear()
-        for buffer in self.manager.buffers.values():
-            if buffer.count > 0:
-                vao = self.vao[buffer.shape]
-                vao.render(buffer.model, buffer.color, buffer.count)
+        self.render_fills()
+        self.render_trails()
+        self.render_stamps()
+        with manager.front_lock:
+            self.render_turtles()
         if flip:
             self.window.flip()
 
+    def update_buffers(self):
+        """Apply queued changes and swap, holding the manager's lock"""
+        if not self.commands.on_tick:
+            self.commands.execute()
+        # trails of turtles moved other than by commands
+        self.trails.record(self.manager)
+        feedback = self.feedback
+        if feedback is not None:
+            # the GPU has the latest model data, which compacting needs
+            for buffer in self.manager.buffers.values():
+                self.gpu_simulation(buffer.shape).pull(buffer)
+        self.manager.swap()
+        self.relink_moved()
+        if feedback is not None:
+            for buffer in self.manager.buffers.values():
+                feedback[buffer.shape].push(buffer)
+
+    def render_turtles(self):
+        """Draw every shape's visible turtles, holding the manager's
+        front_lock"""
+        feedback = self.feedback
+        # only visible turtles are uploaded and drawn
+        buffers = [
+            b for b in self.manager.buffers.values()
+            if b.front_visible_count > 0
+        ]
+        if not self.track_model_changes and feedback is None:
+            for buffer in buffers:
+                buffer.front_model.mark_dirty(0, buffer.front_visible_count)
+        if self.model_buffer is not None:
+            self.render_arena(buffers)
+        elif feedback is not None:
+            for buffer in buffers:
+                vao = self.vao[buffer.shape]
+                vao.render_model_buffer(
+                    feedback[buffer.shape].output,
+                    buffer.color,
+                    buffer.visible_count,
+                )
+        else:
+            for buffer in buffers:
+                vao = self.vao[buffer.shape]
+                vao.render(
+                    buffer.front_model,
+                    buffer.front_color,
+                    buffer.front_visible_count,
+                )
+
+    def render_fills(self):
+        """Draw every fill in one call, under trails and turtles"""
+        glDepthMask(GL_FALSE)
+        self.fill_renderer.render(self.fills)
+        glDepthMask(GL_TRUE)
+
+    def render_trails(self):
+        glDepthMask(GL_FALSE)
+        if self.trail_accumulator is not None:
+            self.trail_accumulator.update(self.trails)
+            self.trail_accumulator.render()
+        else:
+            self.trail_renderer.render(self.trails)
+        glDepthMask(GL_TRUE)
+
+    def render_stamps(self):
+        """Draw each shape's stamps in one call, under the turtles"""
+        self.stamps.compact()
+        # turtles are at the same depth, so must not fail the depth test
+        glDepthMask(GL_FALSE)
+        for buffer in self.stamps.buffers.values():
+            # stamps still waiting for their turtles' queued moves are hidden
+            if buffer.visible_count:
+                vao = self.get_stamp_vao(buffer.shape)
+                vao.render(buffer.model, buffer.color, buffer.visible_count)
+        glDepthMask(GL_TRUE)
+
+    def render_arena(self, buffers):
+        """Upload all shapes at once, then draw each from its range"""
+        model_arena = self.manager.model_arena
+        color_arena = self.manager.color_arena
+        if model_arena.data is None:
+            return
+        # as in VAO.render(), changes to turtles not drawn are dropped
+        model_ends = dict((b.model, b.visible_count) for b in buffers)
+        color_ends = dict((b.color, b.visible_count) for b in buffers)
+        self.model_buffer.load(
+            model_arena.data,
+            ranges=model_arena.dirty_byte_ranges(model_ends))
+        model_arena.clear_dirty()
+        self.color_buffer.load(
+            color_arena.data,
+            ranges=color_arena.dirty_byte_ranges(color_ends))
+        color_arena.clear_dirty()
+        for buffer in buffers:
+            assert buffer.model.base == buffer.color.base
+            vao = self.vao[buffer.shape]
+            vao.render_range(buffer.model.base, buffer.visible_count)
+
     # ninjaturtle engine interface
     def create_turtle(self, model, init, shape='classic'):
         model_init = init[:TURTLE_MODEL_DATA_SIZE]
@@ -178,7 +421,43 @@ class Renderer(object):
             model.id, shape, model_init, color_init)
         model.data = data
         model.backend = Turgle(self, model, color, shape)
+        self.models[model.id] = model
+        self.relink_moved()
+
+    # ninjaturtle engine interface
+    def create_turtles(self, models, init, shape='classic'):
+        """Create many turtles of one shape at once.
+
+        init is a flat block of every turtle's init data, in the same order as
+        models, either as a sequence of floats or a numpy array.
+        """
+        model_init, color_init = split_init_data(init, len(models))
+        buffer, start = self.manager.create_turtles(
+            [model.id for model in models], shape, model_init, color_init)
+        for model in models:
+            model.data, color = buffer.get(model.id)
+            model.backend = Turgle(self, model, color, shape)
+            self.models[model.id] = model
+        self.relink_moved()
 
     # ninjaturtle engine interface
     def destroy_turtle_data(self, id):
         self.manager.destroy_turtle(id)
+        self.commands.forget(id)
+        self.trails.forget(id)
+        self.fills.forget(id)
+        del self.models[id]
+
+    def relink_moved(self):
+        """Point turtles whose data has moved, from hiding, showing, adding
+        or removing turtles, at its new place"""
+        models = self.models
+        with self.manager.lock:
+            for buffer in self.manager.buffers.values():
+                if not buffer.moved:
+                    continue
+                for id in buffer.moved:
+                    model = models.get(id)
+                    if model is not None and id in buffer.slots:
+                        model.data, model.backend.color = buffer.get(id)
+                buffer.moved.clear()
@@ -0,0 +1,50 @@
+"""Counter based random numbers for simulation kernels.
+
+Rather than drawing from a single global generator, each number is a hash of
+(seed, turtle id, tick). A turtle's numbers don't depend on where it is in a
+buffer, or on the order turtles are processed in, so runs can be replayed
+exactly, and split across threads in any way.
+
+The same hash is implemented in random_walk.c, and gives identical results.
+"""
+from __future__ import division, print_function, absolute_import
+
+from turgles.memory import numpy
+
+MASK = 0xffffffff
+GOLDEN = 0x9e3779b9
+
+# 24 bits of the hash are used, so results are exact as 32bit floats
+SCALE = 1.0 / (1 << 24)
+
+
+def mix32(x):
+    """murmur3's 32bit finalizer"""
+    x ^= x >> 16
+    x = (x * 0x85ebca6b) & MASK
+    x ^= x >> 13
+    x = (x * 0xc2b2ae35) & MASK
+    x ^= x >> 16
+    return x
+
+
+def hash_key(seed, tick):
+    """The part of the hash shared by all turtles for a given tick"""
+    return mix32(mix32((seed + GOLDEN) & MASK) ^ (tick & MASK))
+
+
+def hash_random(seed, id, tick):
+    """A random float in [0, 1) for a turtle id at a tick"""
+    return (mix32(hash_key(seed, tick) ^ (id & MASK)) >> 8) * SCALE
+
+
+def numpy_hash_random(seed, ids, tick):
+    """hash_random for an array of ids, as float32s"""
+    x = numpy.asarray(ids).astype(numpy.uint32)
+    x ^= numpy.uint32(hash_key(seed, tick))
+    x ^= x >> 16
+    x *= numpy.uint32(0x85ebca6b)
+    x ^= x >> 13
+    x *= numpy.uint32(0xc2b2ae35)
+    x ^= x >> 16
+    return (x >> 8).astype(numpy.float32) * numpy.float32(SCALE)
@@ -0,0 +1,98 @@
+"""Fixed timestep simulation, decoupled from the frame rate.
+
+The simulation is stepped at a fixed rate, as many times as needed to catch
+up with real time, and turtles are drawn interpolated between their previous
+and current positions. So a slow simulation can still be drawn smoothly, and
+a slow frame doesn't change the simulation.
+
+Before each step, every turtle's position and heading is saved in the spare
+model slots 11-15 (see memory.py), and after stepping, alpha is how far
+through the next step real time has got, for the vertex shader to use.
+"""
+from __future__ import division, print_function, absolute_import
+
+from turgles.memory import numpy, TURTLE_MODEL_DATA_SIZE
+
+PREV_X = 11
+PREV_VALID = 15
+
+
+def save_previous(buffer):
+    """Save each turtle's position and heading in its previous slots"""
+    count = buffer.count
+    if not count:
+        return
+    if numpy is not None:
+        data = buffer.model.as_array()
+        data[:, PREV_X:PREV_X + 4] = data[:, [0, 1, 6, 7]]
+        data[:, PREV_VALID] = 1.0
+    else:
+        data = buffer.model.data
+        for x in range(0, count * TURTLE_MODEL_DATA_SIZE,
+                       TURTLE_MODEL_DATA_SIZE):
+            prev = x + PREV_X
+            data[prev] = data[x]
+            data[prev + 1] = data[x + 1]
+            data[prev + 2] = data[x + 6]
+            data[prev + 3] = data[x + 7]
+            data[x + PREV_VALID] = 1.0
+    buffer.model.mark_dirty()
+
+
+class FixedStepScheduler(object):
+    """Runs a simulation update at a fixed timestep.
+
+    update has the signature of the kernels in kernels.py. Call advance()
+    with the real time passed each frame, and pass the alpha it returns to
+    the renderer's set_interpolation(). If the manager is double buffered,
+    each step is swapped to the front buffers as it finishes, so advance()
+    can be called from another thread. If given commands, a CommandQueue,
+    it is executed each step rather than each frame.
+    """
+
+    def __init__(
+            self, manager, update, step, seed=None, max_steps=5,
+            commands=None):
+        self.manager = manager
+        self.update = update
+        # queued commands are applied at the start of each step, before the
+        # previous positions are saved, so are never half interpolated
+        self.commands = commands
+        if commands is not None:
+            commands.on_tick = True
+        self.step = step
+        self.seed = seed
+        # most steps run per frame, any more are dropped so that a slow
+        # simulation doesn't fall further and further behind
+        self.max_steps = max_steps
+        self.tick = 0
+        self.accumulator = 0.0
+        self.alpha = 1.0
+        self.dropped = 0
+
+    def run_step(self):
+        manager = self.manager
+        with manager.lock:
+            if self.commands is not None:
+                self.commands.execute()
+            buffers = [b for b in manager.buffers.values() if b.count]
+            for buffer in buffers:
+                save_previous(buffer)
+            self.update(self.step, buffers, self.tick, self.seed)
+            if manager.double:
+                # so the renderer never needs to wait for the lock
+                manager.swap()
+        self.tick += 1
+
+    def advance(self, dt):
+        """Run as many steps as dt covers, returning the alpha to draw at"""
+        self.accumulator += dt
+        steps, self.accumulator = divmod(self.accumulator, self.step)
+        steps = int(steps)
+        if steps > self.max_steps:
+            self.dropped += steps - self.max_steps
+            steps = self.max_steps
+        for _ in range(steps):
+            self.run_step()
+        self.alpha = self.accumulator / self.step
+        return self.alpha
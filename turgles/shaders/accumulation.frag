@@ -0,0 +1,15 @@
+#version 120
+uniform sampler2D trails;
+
+varying vec2 uv;
+
+void main()
+{
+    vec4 color = texture2D(trails, uv);
+    // nothing drawn here, so show what's underneath
+    if (color.a == 0.0) {
+        discard;
+    }
+    // opaque, like lines drawn directly
+    gl_FragColor = vec4(color.rgb, 1.0);
+}
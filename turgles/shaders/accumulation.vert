@@ -0,0 +1,11 @@
+#version 120
+// a quad covering the screen, see render/accumulation.py
+attribute vec2 position;
+
+varying vec2 uv;
+
+void main()
+{
+    gl_Position = vec4(position, 0.0, 1.0);
+    uv = position * 0.5 + 0.5;
+}
@@ -0,0 +1,16 @@
+#version 120
+uniform float world_scale;
+uniform mat4 projection;
+uniform mat4 view;
+
+// pen trail segment vertices, see trails.py
+attribute vec2 position;
+attribute vec4 color;
+
+varying vec4 out_color;
+
+void main()
+{
+    gl_Position = projection * view * vec4(position / world_scale, 0.0, 1.0);
+    out_color = color;
+}
@@ -2,6 +2,8 @@
 uniform float world_scale;
 uniform mat4 projection;
 uniform mat4 view;
+// how far between the previous and current simulation step to draw turtles
+uniform float alpha;
 
 // instanced turtle data
 attribute mat4 turtle_model;
@@ -24,6 +26,19 @@ void main()
     float ct = turtle_model[1][2];
     float st = turtle_model[1][3];
 
+    // interpolate from the previous simulation step, if it was stored
+    if (turtle_model[3][3] > 0.0) {
+        x = mix(turtle_model[2][3], x, alpha);
+        y = mix(turtle_model[3][0], y, alpha);
+        vec2 rotation = mix(
+            vec2(turtle_model[3][1], turtle_model[3][2]), vec2(ct, st), alpha);
+        float len = length(rotation);
+        if (len > 0.001) {
+            ct = rotation.x / len;
+            st = rotation.y / len;
+        }
+    }
+
     // hand-rolled 2d scale/transform/rotate in row-major format
     mat4 model = transpose(mat4(
         ct * scale_x, -st * scale_y,  0.0, x / world_scale,
@@ -1,9 +1,10 @@
 #version 120
-// default array size assumes 4096 uniform locations
+// default array size assumes 1024 uniform components, the ES2 minimum. The
+// ES2 renderer defines ARRAY_SIZE at runtime from the card's actual limit.
 //
 // Calculated as follows
 // ARRAY_SIZE = (GL_MAX_VERTEX_UNIFORM_COMPONENTS_ARB - STATIC_UNIFORMS) // ARRAY_UNIFORMS
-// where STATIC_UNIFORMS is the memory cost of normal uniforms, currentlt 16 + 16 + 1
+// where STATIC_UNIFORMS is the memory cost of normal uniforms, currently 16 + 16 + 1 + 1
 // and ARRAY_UNIFORMS is memory costs of all array members, currently 16 + 12
 // and GL_MAX_VERTEX_UNIFORM_COMPONENTS_ARB is variable, but is guaranteed to
 // be at least 1024 on ES2 hardware[1]
@@ -15,6 +16,7 @@
 uniform float world_scale;  // cost 16
 uniform mat4 projection;    // cost 16
 uniform mat4 view;          // cost 1
+uniform float alpha;        // cost 1, see turtles.vert
 
 uniform mat4 turtle_model_array[ARRAY_SIZE];  // cost 16 * ARRAY_SIZE
 uniform mat3 turtle_color_array[ARRAY_SIZE];  // cost 12 * ARRAY_SIZE (as have to allocate in 4s)
@@ -40,6 +42,19 @@ void main()
     float ct = turtle_model[1][2];
     float st = turtle_model[1][3];
 
+    // interpolate from the previous simulation step, if it was stored
+    if (turtle_model[3][3] > 0.0) {
+        x = mix(turtle_model[2][3], x, alpha);
+        y = mix(turtle_model[3][0], y, alpha);
+        vec2 rotation = mix(
+            vec2(turtle_model[3][1], turtle_model[3][2]), vec2(ct, st), alpha);
+        float len = length(rotation);
+        if (len > 0.001) {
+            ct = rotation.x / len;
+            st = rotation.y / len;
+        }
+    }
+
     // hand-rolled 2d scale/transform/rotate in row-major format
     mat4 model = transpose(mat4(
         ct * scale_x, -st * scale_y,  0.0, x / world_scale,
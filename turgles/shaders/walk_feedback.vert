@@ -0,0 +1,65 @@
+#version 130
+// One step of the random walk for every turtle, run with transform feedback,
+// see render/feedback.py. The same as random_walk_hashed in random_walk.c,
+// except random numbers are keyed on the turtle's index, not its id.
+//
+// Update shaders like this one read a turtle's model data as model0-3, the
+// four columns of its mat4 (see memory.py for the layout), and write its new
+// model data to out_model0-3. dt, tick and seed are always set, if used.
+
+uniform float dt;
+uniform int tick;
+uniform int seed;
+
+uniform float speed;
+uniform float half_w;
+uniform float half_h;
+uniform float degrees;
+
+in vec4 model0;
+in vec4 model1;
+in vec4 model2;
+in vec4 model3;
+
+out vec4 out_model0;
+out vec4 out_model1;
+out vec4 out_model2;
+out vec4 out_model3;
+
+// the same hash as rng.py
+uint mix32(uint x)
+{
+    x ^= x >> 16u;
+    x *= 0x85ebca6bu;
+    x ^= x >> 13u;
+    x *= 0xc2b2ae35u;
+    x ^= x >> 16u;
+    return x;
+}
+
+float hash_random(uint seed, uint id, uint tick)
+{
+    uint key = mix32(mix32(seed + 0x9e3779b9u) ^ tick);
+    return float(mix32(key ^ id) >> 8u) / 16777216.0;
+}
+
+void main()
+{
+    float x = model0[0];
+    float y = model0[1];
+    float angle = model1[0];
+    if (abs(x) > half_w || abs(y) > half_h) {
+        angle = mod(angle + 180.0, 360.0);
+    }
+    float r = hash_random(uint(seed), uint(gl_VertexID), uint(tick));
+    angle = mod(angle + (r * 2.0 * degrees) - degrees, 360.0);
+    float theta = radians(angle);
+    float ct = cos(theta);
+    float st = sin(theta);
+    float magnitude = speed * dt;
+
+    out_model0 = vec4(x + magnitude * ct, y + magnitude * st, model0.zw);
+    out_model1 = vec4(angle, model1[1], ct, st);
+    out_model2 = model2;
+    out_model3 = model3;
+}
@@ -0,0 +1,240 @@
+"""A uniform grid spatial index over turtle positions.
+
+The grid is rebuilt from the shape buffers' x and y each tick, and answers
+radius and rectangle queries with turtle ids, looking only at the cells the
+query covers.
+
+With numpy, all turtles are sorted by cell key (column + row * columns), so a
+row of cells in a query is one contiguous slice, found by binary search.
+Without, cells are a dict of lists.
+"""
+from __future__ import division, print_function, absolute_import
+
+from math import floor
+
+from turgles.memory import numpy, TURTLE_MODEL_DATA_SIZE
+
+
+class SpatialGrid(object):
+    """Buckets turtles into square cells of cell_size.
+
+    Queries return a numpy array of ids with numpy, else a list. Queries are
+    fastest when their size is close to cell_size.
+    """
+
+    def __init__(self, cell_size, use_numpy=True):
+        self.cell_size = cell_size
+        self.use_numpy = use_numpy and numpy is not None
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        if self.use_numpy:
+            self.ids = numpy.empty(0, dtype=numpy.int32)
+            self.x = numpy.empty(0, dtype=numpy.float32)
+            self.y = numpy.empty(0, dtype=numpy.float32)
+        else:
+            self.ids = []
+            self.x = []
+            self.y = []
+        # (buffer, offset of its first turtle in ids/x/y, live) per buffer,
+        # where live is None, or the indices of the buffer's live turtles
+        self.offsets = []
+        self.cells = {}
+        self.keys = None
+        self.order = None
+
+    def build(self, buffers):
+        """Index the live turtles in buffers"""
+        self.clear()
+        buffers = [b for b in buffers if b.count]
+        if self.use_numpy:
+            self._build_numpy(buffers)
+        else:
+            self._build_python(buffers)
+
+    def _build_numpy(self, buffers):
+        ids = []
+        xs = []
+        ys = []
+        offset = 0
+        for buffer in buffers:
+            model = buffer.model.as_array()
+            buffer_ids = numpy.frombuffer(
+                buffer.slots.id_of, numpy.int32, buffer.count)
+            x = model[:, 0]
+            y = model[:, 1]
+            live = live_indices(buffer)
+            if live is not None:
+                buffer_ids, x, y = buffer_ids[live], x[live], y[live]
+            self.offsets.append((buffer, offset, live))
+            offset += len(buffer_ids)
+            ids.append(buffer_ids)
+            xs.append(x)
+            ys.append(y)
+        if not ids:
+            return
+        self.ids = numpy.concatenate(ids)
+        self.x = numpy.concatenate(xs)
+        self.y = numpy.concatenate(ys)
+        self.count = len(self.ids)
+
+        column = numpy.floor(self.x / self.cell_size).astype(numpy.int64)
+        row = numpy.floor(self.y / self.cell_size).astype(numpy.int64)
+        self.min_column = column.min()
+        self.min_row = row.min()
+        self.columns = column.max() - self.min_column + 1
+        self.rows = row.max() - self.min_row + 1
+        keys = (column - self.min_column) + (row - self.min_row) * self.columns
+        self.order = numpy.argsort(keys, kind='mergesort')
+        self.keys = keys[self.order]
+
+    def _build_python(self, buffers):
+        cell_size = self.cell_size
+        cells = self.cells
+        ids = self.ids
+        xs = self.x
+        ys = self.y
+        for buffer in buffers:
+            removed = buffer.removed
+            live = None
+            if removed:
+                live = [i for i in range(buffer.count) if i not in removed]
+            self.offsets.append((buffer, len(ids), live))
+            data = buffer.model.data
+            id_of = buffer.slots.id_of
+            for index in range(buffer.count):
+                if index in removed:
+                    continue
+                offset = index * TURTLE_MODEL_DATA_SIZE
+                x = data[offset]
+                y = data[offset + 1]
+                cell = (int(floor(x / cell_size)), int(floor(y / cell_size)))
+                cells.setdefault(cell, []).append(len(ids))
+                ids.append(id_of[index])
+                xs.append(x)
+                ys.append(y)
+        self.count = len(ids)
+
+    def _cell_range(self, x0, y0, x1, y1):
+        cell_size = self.cell_size
+        return (
+            int(floor(x0 / cell_size)), int(floor(y0 / cell_size)),
+            int(floor(x1 / cell_size)), int(floor(y1 / cell_size)),
+        )
+
+    def candidates(self, x0, y0, x1, y1):
+        """Indices into ids/x/y of turtles in the cells the rect overlaps"""
+        c0, r0, c1, r1 = self._cell_range(x0, y0, x1, y1)
+        if not self.use_numpy:
+            cells = self.cells
+            found = []
+            for column in range(c0, c1 + 1):
+                for row in range(r0, r1 + 1):
+                    found.extend(cells.get((column, row), ()))
+            return found
+
+        if not self.count:
+            return numpy.empty(0, dtype=numpy.intp)
+        c0 = max(c0 - self.min_column, 0)
+        c1 = min(c1 - self.min_column, self.columns - 1)
+        r0 = max(r0 - self.min_row, 0)
+        r1 = min(r1 - self.min_row, self.rows - 1)
+        if c0 > c1 or r0 > r1:
+            return numpy.empty(0, dtype=numpy.intp)
+        rows = numpy.arange(r0, r1 + 1) * self.columns
+        starts = numpy.searchsorted(self.keys, rows + c0, 'left')
+        stops = numpy.searchsorted(self.keys, rows + c1, 'right')
+        return self.order[expand_ranges(starts, stops)]
+
+    def query_rect(self, x0, y0, x1, y1):
+        """Ids of turtles with x0 <= x <= x1 and y0 <= y <= y1"""
+        found = self.candidates(x0, y0, x1, y1)
+        if not self.use_numpy:
+            xs = self.x
+            ys = self.y
+            return [
+                self.ids[i] for i in found
+                if x0 <= xs[i] <= x1 and y0 <= ys[i] <= y1
+            ]
+        x = self.x[found]
+        y = self.y[found]
+        inside = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+        return self.ids[found[inside]]
+
+    def query_radius(self, x, y, radius):
+        """Ids of turtles within radius of (x, y)"""
+        found = self.candidates(x - radius, y - radius, x + radius, y + radius)
+        r2 = radius * radius
+        if not self.use_numpy:
+            xs = self.x
+            ys = self.y
+            return [
+                self.ids[i] for i in found
+                if (xs[i] - x) ** 2 + (ys[i] - y) ** 2 <= r2
+            ]
+        dx = self.x[found] - x
+        dy = self.y[found] - y
+        return self.ids[found[dx * dx + dy * dy <= r2]]
+
+    def pairs(self, radius):
+        """All pairs of different turtles within radius of each other.
+
+        Returns (i, j) arrays of indices into ids/x/y, with each pair in both
+        orders. Requires numpy.
+        """
+        empty = numpy.empty(0, dtype=numpy.intp)
+        if not self.count:
+            return empty, empty
+        keys = self.keys
+        columns = self.columns
+        column = keys % columns
+        row = keys // columns
+        entries = numpy.arange(self.count)
+        span = int(numpy.ceil(radius / self.cell_size))
+        found_i = []
+        found_j = []
+        for dr in range(-span, span + 1):
+            r = row + dr
+            for dc in range(-span, span + 1):
+                c = column + dc
+                valid = (c >= 0) & (c < columns) & (r >= 0) & (r < self.rows)
+                cell = c + r * columns
+                starts = numpy.searchsorted(keys, cell, 'left')
+                stops = numpy.searchsorted(keys, cell, 'right')
+                stops[~valid] = starts[~valid]
+                found_i.append(numpy.repeat(entries, stops - starts))
+                found_j.append(expand_ranges(starts, stops))
+        i = self.order[numpy.concatenate(found_i)]
+        j = self.order[numpy.concatenate(found_j)]
+        dx = self.x[j] - self.x[i]
+        dy = self.y[j] - self.y[i]
+        near = (dx * dx + dy * dy <= radius * radius) & (i != j)
+        return i[near], j[near]
+
+
+def live_indices(buffer):
+    """Numpy array of the indices of a buffer's turtles that aren't waiting
+    for removal, or None if all are live"""
+    if not buffer.removed:
+        return None
+    live = numpy.ones(buffer.count, dtype=bool)
+    live[list(buffer.removed)] = False
+    return numpy.flatnonzero(live)
+
+
+def expand_ranges(starts, stops):
+    """Concatenated aranges for each [start, stop), without a python loop"""
+    lengths = stops - starts
+    keep = lengths > 0
+    starts = starts[keep]
+    lengths = lengths[keep]
+    total = lengths.sum()
+    if not total:
+        return numpy.empty(0, dtype=numpy.intp)
+    # a run of 1s, with a jump at the start of each range
+    steps = numpy.ones(total, dtype=numpy.intp)
+    ends = numpy.cumsum(lengths)
+    steps[0] = starts[0]
+    steps[ends[:-1]] = starts[1:] - (starts[:-1] + lengths[:-1] - 1)
+    return numpy.cumsum(steps)
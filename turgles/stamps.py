@@ -0,0 +1,153 @@
+"""Stamps, frozen copies of turtles left where they were stamped.
+
+Each stamp is a copy of its turtle's model and color data, kept in a
+ShapeBuffer per shape, so a shape's stamps are drawn in one instanced call
+with the same geometry and shaders as turtles.
+
+Stamp ids count up from 0, as in the turtle module, and are never reused.
+In the buffers, stamps are known by slot numbers instead, which are reused
+once cleared, so the buffers' shared IdMap and the typed array of each
+slot's stamp id only grow with the most stamps there have been at once.
+Ids are mapped to slots in a dict. Each owner's stamp ids are kept in a
+typed array in the order they were stamped, so clearing an owner's stamps
+doesn't look at anyone else's, tidied up when they've doubled in length.
+
+A stamp can be made hidden, and placed later, so that stamp() can return
+its id straight away when the turtle's queued moves haven't run yet, see
+commands.py. Only the visible stamps are drawn.
+"""
+from __future__ import division, print_function, absolute_import
+
+from array import array
+
+from turgles.buffer import IdMap, ShapeBuffer
+from turgles.memory import TURTLE_MODEL_DATA_SIZE
+from turgles.scheduler import PREV_VALID
+
+# owners' stamp id arrays are first tidied at this length
+TIDY_LENGTH = 64
+
+
+class Stamps(object):
+
+    def __init__(self, size=16):
+        self.size = size
+        self.buffers = {}
+        self.shapes = []
+        # every shape's stamps, by slot, keyed by index into shapes
+        self.ids = IdMap()
+        # stamp id -> slot, and slot -> stamp id, -1 if free
+        self.slot_of = {}
+        self.stamp_of = array('i')
+        self.free = array('i')
+        self.next_id = 0
+        # owner's turtle id -> its stamp ids, oldest first
+        self.owned = {}
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def __contains__(self, id):
+        return id in self.slot_of
+
+    def get_buffer(self, shape):
+        if shape not in self.buffers:
+            self.buffers[shape] = ShapeBuffer(
+                shape, self.size, ids=self.ids, key=len(self.shapes))
+            self.shapes.append(shape)
+        return self.buffers[shape]
+
+    def _buffer(self, slot):
+        return self.buffers[self.shapes[self.ids.shape_of[slot]]]
+
+    def stamp(self, owner, shape, model, color, hidden=False):
+        """Copy a turtle's model and color data into a new stamp, returning
+        its id. A hidden stamp isn't drawn until place()d."""
+        id = self.next_id
+        self.next_id += 1
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = len(self.stamp_of)
+            self.stamp_of.append(-1)
+        buffer = self.get_buffer(shape)
+        model_data, color_data = buffer.new(slot, model, color)
+        # stamps don't move, so are never interpolated
+        model_data[PREV_VALID] = 0.0
+        if hidden:
+            buffer.hide(slot)
+        self.slot_of[id] = slot
+        self.stamp_of[slot] = id
+        ids = self.owned.get(owner)
+        if ids is None:
+            ids = self.owned[owner] = array('i')
+        elif len(ids) >= TIDY_LENGTH and not len(ids) & (len(ids) - 1):
+            # at powers of two, so only ever twice as long as needed
+            slot_of = self.slot_of
+            ids = self.owned[owner] = array(
+                'i', [i for i in ids if i in slot_of])
+        ids.append(id)
+        return id
+
+    def place(self, id, model):
+        """Copy a turtle's model data into a stamp, and show it, returning
+        False if there is no such stamp"""
+        slot = self.slot_of.get(id)
+        if slot is None:
+            return False
+        buffer = self._buffer(slot)
+        model_data = buffer.get_model(slot)
+        model_data[0:TURTLE_MODEL_DATA_SIZE] = model
+        model_data[PREV_VALID] = 0.0
+        buffer.show(slot)
+        buffer.mark_dirty(slot, color=False)
+        return True
+
+    def get(self, id):
+        """A stamp's model and color data"""
+        slot = self.slot_of[id]
+        return self._buffer(slot).get(slot)
+
+    def clear(self, id):
+        """Remove a stamp, returning False if there is no such stamp"""
+        slot = self.slot_of.pop(id, None)
+        if slot is None:
+            return False
+        # its data stays until compact(), but the buffers let the slot be
+        # reused straight away, see SlotMap
+        self._buffer(slot).remove(slot)
+        self.stamp_of[slot] = -1
+        self.free.append(slot)
+        return True
+
+    def clear_owned(self, owner, n=None):
+        """Remove all of an owner's stamps, or like turtle.clearstamps(),
+        the first n if n is positive, or the last -n if negative.
+
+        Returns the number removed.
+        """
+        ids = self.owned.get(owner)
+        if ids is None:
+            return 0
+        slot_of = self.slot_of
+        live = array('i', [id for id in ids if id in slot_of])
+        if n is None:
+            cleared, kept = live, None
+        elif n >= 0:
+            cleared, kept = live[:n], live[n:]
+        else:
+            cleared, kept = live[n:], live[:n]
+        for id in cleared:
+            self.clear(id)
+        if kept:
+            self.owned[owner] = kept
+        else:
+            del self.owned[owner]
+        return len(cleared)
+
+    def compact(self):
+        """Apply pending removals, before drawing"""
+        for buffer in self.buffers.values():
+            buffer.compact()
+            # nothing holds on to stamps' data
+            buffer.moved.clear()
@@ -0,0 +1,135 @@
+from math import cos, sin, radians
+from random import Random
+from unittest import TestCase, skipIf
+
+from turgles import boids
+from turgles.boids import half_w
+from turgles.buffer import BufferManager
+from turgles.config import speed, boids_max_turn
+from turgles.memory import numpy, TURTLE_MODEL_DATA_SIZE
+from turgles.scheduler import PREV_VALID
+
+
+def turtle(x, y, heading):
+    t = radians(heading)
+    model = [0.0] * TURTLE_MODEL_DATA_SIZE
+    model[0:8] = [x, y, 1, 1, heading, heading, cos(t), sin(t)]
+    return model
+
+
+class BoidsTests(object):
+    """Run against each variant of the boids kernel"""
+
+    update = None
+
+    def setUp(self):
+        self.manager = BufferManager(4)
+
+    def add(self, id, x, y, heading, shape='classic'):
+        self.manager.create_turtle(id, shape, turtle(x, y, heading), None)
+
+    def step(self, dt=1.0):
+        self.update(dt, list(self.manager.buffers.values()))
+
+    def model(self, id):
+        shape = self.manager.id_to_shape[id]
+        return list(self.manager.get_buffer(shape).get_model(id))
+
+    def test_empty(self):
+        self.step()
+        self.manager.get_buffer('classic')
+        self.step()
+
+    def test_alone_goes_straight(self):
+        self.add(0, 0, 0, 90)
+        self.step()
+        x, y, _, _, heading, _, ct, st = self.model(0)[:8]
+        self.assertAlmostEqual(heading, 90, places=4)
+        self.assertAlmostEqual(x, 0, places=3)
+        self.assertAlmostEqual(y, speed, places=3)
+        self.assertAlmostEqual(ct, 0, places=5)
+        self.assertAlmostEqual(st, 1, places=5)
+
+    def test_cohesion(self):
+        # side by side, out of separation range, so turn towards each other
+        self.add(0, 0, -10, 0)
+        self.add(1, 0, 10, 0, shape='square')
+        self.step(0.01)
+        self.assertAlmostEqual(self.model(0)[4], boids_max_turn, places=3)
+        self.assertAlmostEqual(self.model(1)[4], -boids_max_turn, places=3)
+
+    def test_separation(self):
+        # too close, so turn away from each other
+        self.add(0, 0, -2, 0)
+        self.add(1, 0, 2, 0)
+        self.step(0.01)
+        self.assertAlmostEqual(self.model(0)[4], -boids_max_turn, places=3)
+        self.assertAlmostEqual(self.model(1)[4], boids_max_turn, places=3)
+
+    def test_wraps_around(self):
+        self.add(0, half_w - 1, 0, 0)
+        self.step()
+        self.assertAlmostEqual(self.model(0)[0], speed - 1 - half_w, places=3)
+
+    def test_wrapping_invalidates_previous(self):
+        self.add(0, half_w - 1, 0, 0)
+        self.add(1, 0, 0, 0, shape='square')
+        for id in (0, 1):
+            shape = self.manager.id_to_shape[id]
+            self.manager.get_buffer(shape).get_model(id)[PREV_VALID] = 1.0
+        self.step()
+        self.assertEqual(self.model(0)[PREV_VALID], 0.0)
+        self.assertEqual(self.model(1)[PREV_VALID], 1.0)
+
+    def test_outliers(self):
+        # far outside the world, still neighbours, without a huge grid
+        self.add(0, 0, -2, 0)
+        self.add(1, 0, 2, 0)
+        self.add(2, 1e7, -2, 0)
+        self.add(3, 1e7, 2, 0)
+        self.add(4, -1e7, 1e7, 0)
+        self.step(0.01)
+        self.assertAlmostEqual(self.model(0)[4], -boids_max_turn, places=3)
+        self.assertAlmostEqual(self.model(2)[4], -boids_max_turn, places=3)
+        self.assertAlmostEqual(self.model(3)[4], boids_max_turn, places=3)
+        self.assertAlmostEqual(self.model(4)[4], 0, places=4)
+
+    def test_ignores_removed(self):
+        self.add(0, 0, -2, 0)
+        self.add(1, 0, 2, 0)
+        self.manager.destroy_turtle(1)
+        self.step(0.01)
+        self.assertAlmostEqual(self.model(0)[4], 0, places=4)
+
+    def test_matches_python(self):
+        random = Random(2)
+        for id in range(300):
+            self.add(id, random.uniform(-100, 100),
+                     random.uniform(-100, 100), random.uniform(0, 360),
+                     shape=('classic', 'square')[id % 2])
+        expected = BufferManager(4)
+        for id in range(300):
+            expected.create_turtle(
+                id, self.manager.id_to_shape[id], self.model(id), None)
+        boids.slow_update(0.1, list(expected.buffers.values()))
+        self.step(0.1)
+        for id in range(300):
+            shape = expected.id_to_shape[id]
+            want = expected.get_buffer(shape).get_model(id)
+            got = self.model(id)
+            for slot in (0, 1, 6, 7):
+                self.assertAlmostEqual(got[slot], want[slot], places=2)
+
+
+class PythonBoidsTestCase(BoidsTests, TestCase):
+    update = staticmethod(boids.slow_update)
+
+
+@skipIf(numpy is None, "requires numpy")
+class NumpyBoidsTestCase(BoidsTests, TestCase):
+    update = staticmethod(boids.numpy_update)
+
+
+@skipIf(boids.fast is None, "requires libfast.so, see Makefile")
+class CBoidsTestCase(BoidsTests, TestCase):
+    update = staticmethod(boids.fast_update)
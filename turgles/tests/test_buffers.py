@@ -1,8 +1,31 @@
 import itertools
-from unittest import TestCase
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from random import Random
+from unittest import TestCase, skipIf
 
-from turgles.buffer import ChunkBuffer, ShapeBuffer, BufferManager
-from turgles.memory import TURTLE_MODEL_DATA_SIZE, TURTLE_COLOR_DATA_SIZE
+from turgles.buffer import (
+    Arena,
+    ArenaChunkBuffer,
+    ChunkBuffer,
+    SharedChunkBuffer,
+    ShapeBuffer,
+    IdMap,
+    SlotMap,
+    BufferManager,
+    MAX_DIRTY_RANGES,
+    attach_buffers,
+)
+from turgles.memory import (
+    ffi,
+    numpy,
+    split_init_data,
+    TURTLE_MODEL_DATA_SIZE,
+    TURTLE_COLOR_DATA_SIZE,
+)
 
 MODEL_ZEROS = [0] * TURTLE_MODEL_DATA_SIZE
 MODEL_ONES = [1] * TURTLE_MODEL_DATA_SIZE
@@ -122,9 +145,174 @@ class ChunkBufferTestCase(TestCase):
         # check reuses previously removed turtle's space
         self.assert_turtle_data(buffer, 2, [4] * TURTLE_MODEL_DATA_SIZE)
 
-    def make_slices(self, size, array_size=20):
+    def test_extend(self):
+        buffer = ChunkBuffer(4, TURTLE_MODEL_DATA_SIZE)
+        buffer.new(MODEL_ONES)
+        start = buffer.extend(2, MODEL_TWOS + MODEL_THREES)
+        self.assertEqual(start, 1)
+        self.assertEqual(buffer.count, 3)
+        self.assertEqual(buffer.size, 4)
+        self.assert_turtle_data(buffer, 0, MODEL_ONES)
+        self.assert_turtle_data(buffer, 1, MODEL_TWOS)
+        self.assert_turtle_data(buffer, 2, MODEL_THREES)
+
+    def test_extend_resizes_once(self):
+        buffer = ChunkBuffer(2, TURTLE_MODEL_DATA_SIZE)
+        buffer.extend(9)
+        self.assertEqual(buffer.count, 9)
+        self.assertEqual(buffer.size, 9)
+        buffer.extend(1)
+        self.assertEqual(buffer.size, 18)
+
+    def test_extend_from_cdata(self):
+        buffer = ChunkBuffer(2, TURTLE_MODEL_DATA_SIZE)
+        init = ffi.new('float[]', MODEL_ONES + MODEL_TWOS)
+        buffer.extend(2, init)
+        self.assert_turtle_data(buffer, 0, MODEL_ONES)
+        self.assert_turtle_data(buffer, 1, MODEL_TWOS)
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_extend_from_numpy(self):
+        buffer = ChunkBuffer(2, TURTLE_MODEL_DATA_SIZE)
+        init = numpy.array([MODEL_ONES, MODEL_TWOS], dtype=numpy.float32)
+        buffer.extend(2, init)
+        self.assert_turtle_data(buffer, 0, MODEL_ONES)
+        self.assert_turtle_data(buffer, 1, MODEL_TWOS)
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_extend_wrong_size(self):
+        buffer = ChunkBuffer(2, TURTLE_MODEL_DATA_SIZE)
+        init = numpy.array(MODEL_ONES, dtype=numpy.float64)
+        with self.assertRaises(AssertionError):
+            buffer.extend(1, init)
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_as_array(self):
+        buffer = ChunkBuffer(4, TURTLE_MODEL_DATA_SIZE)
+        buffer.new(MODEL_ONES)
+        buffer.new(MODEL_TWOS)
+        array = buffer.as_array()
+        self.assertEqual(array.shape, (2, TURTLE_MODEL_DATA_SIZE))
+        self.assertEqual(list(array[1]), MODEL_TWOS)
+        array[0, 3] = 5.0
+        self.assertEqual(buffer.data[3], 5.0)
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_as_array_empty(self):
+        buffer = ChunkBuffer(4, TURTLE_MODEL_DATA_SIZE)
+        self.assertEqual(buffer.as_array().shape, (0, TURTLE_MODEL_DATA_SIZE))
+
+    def test_compact(self):
+        buffer = ChunkBuffer(8, TURTLE_MODEL_DATA_SIZE)
+        for i in range(6):
+            buffer.new([i] * TURTLE_MODEL_DATA_SIZE)
+        moved = buffer.compact([0, 2, 5])
+        self.assertEqual(buffer.count, 3)
+        self.assertEqual(moved, [(3, 0), (4, 2)])
+        self.assert_turtle_data(buffer, 0, [3] * TURTLE_MODEL_DATA_SIZE)
+        self.assert_turtle_data(buffer, 1, [1] * TURTLE_MODEL_DATA_SIZE)
+        self.assert_turtle_data(buffer, 2, [4] * TURTLE_MODEL_DATA_SIZE)
+        for i in range(3, 6):
+            self.assert_turtle_data(buffer, i, MODEL_ZEROS)
+
+    def test_compact_tail(self):
+        buffer = ChunkBuffer(4, TURTLE_MODEL_DATA_SIZE)
+        buffer.new(MODEL_ONES)
+        buffer.new(MODEL_TWOS)
+        buffer.new(MODEL_THREES)
+        moved = buffer.compact([1, 2])
+        self.assertEqual(moved, [])
+        self.assertEqual(buffer.count, 1)
+        self.assert_turtle_data(buffer, 0, MODEL_ONES)
+        self.assert_turtle_data(buffer, 1, MODEL_ZEROS)
+        self.assert_turtle_data(buffer, 2, MODEL_ZEROS)
+
+    def test_compact_nothing(self):
+        buffer = ChunkBuffer(4, TURTLE_MODEL_DATA_SIZE)
+        buffer.new(MODEL_ONES)
+        self.assertEqual(buffer.compact([]), [])
+        self.assertEqual(buffer.count, 1)
+
+    def test_new_marks_dirty(self):
+        buffer = ChunkBuffer(4, TURTLE_MODEL_DATA_SIZE)
+        buffer.new()
+        buffer.new()
+        self.assertEqual(buffer.dirty_ranges(), [(0, 2)])
+        buffer.clear_dirty()
+        self.assertEqual(buffer.dirty_ranges(), [])
+
+    def test_dirty_ranges_coalesced(self):
+        buffer = ChunkBuffer(10, TURTLE_MODEL_DATA_SIZE)
+        buffer.extend(10)
+        buffer.clear_dirty()
+        buffer.mark_dirty(6, 8)
+        buffer.mark_dirty(0, 1)
+        buffer.mark_dirty(7, 9)
+        buffer.mark_dirty(1, 2)
+        buffer.mark_dirty(4, 5)
+        self.assertEqual(buffer.dirty_ranges(), [(0, 2), (4, 5), (6, 9)])
+        chunk_bytes = TURTLE_MODEL_DATA_SIZE * 4
+        self.assertEqual(
+            buffer.dirty_byte_ranges(),
+            [(0, 2 * chunk_bytes),
+             (4 * chunk_bytes, chunk_bytes),
+             (6 * chunk_bytes, 3 * chunk_bytes)]
+        )
+
+    def test_dirty_ranges_clipped_to_count(self):
+        buffer = ChunkBuffer(4, TURTLE_MODEL_DATA_SIZE)
+        buffer.extend(3)
+        buffer.clear_dirty()
+        buffer.mark_dirty(1, 4)
+        buffer.compact([2])
+        self.assertEqual(buffer.dirty_ranges(), [(1, 2)])
+
+    def test_dirty_ranges_end(self):
+        buffer = ChunkBuffer(4, TURTLE_MODEL_DATA_SIZE)
+        buffer.extend(4)
+        buffer.clear_dirty()
+        buffer.mark_dirty(0, 1)
+        buffer.mark_dirty(2, 4)
+        self.assertEqual(buffer.dirty_ranges(3), [(0, 1), (2, 3)])
+        self.assertEqual(buffer.dirty_ranges(1), [(0, 1)])
+        chunk_bytes = TURTLE_MODEL_DATA_SIZE * 4
+        self.assertEqual(
+            buffer.dirty_byte_ranges(1), [(0, chunk_bytes)])
+
+    def test_swap(self):
+        buffer = ChunkBuffer(4, TURTLE_MODEL_DATA_SIZE)
+        buffer.extend(3, MODEL_ONES + MODEL_TWOS + MODEL_THREES)
+        buffer.clear_dirty()
+        buffer.swap(0, 2)
+        self.assert_turtle_data(buffer, 0, MODEL_THREES)
+        self.assert_turtle_data(buffer, 1, MODEL_TWOS)
+        self.assert_turtle_data(buffer, 2, MODEL_ONES)
+        self.assertEqual(buffer.dirty_ranges(), [(0, 1), (2, 3)])
+        buffer.clear_dirty()
+        buffer.swap(1, 1)
+        self.assertEqual(buffer.dirty_ranges(), [])
+
+    def test_too_many_dirty_ranges(self):
+        size = MAX_DIRTY_RANGES * 3
+        buffer = ChunkBuffer(size, TURTLE_MODEL_DATA_SIZE)
+        buffer.extend(size)
+        buffer.clear_dirty()
+        for i in range(1, size, 2):
+            buffer.mark_dirty(i, i + 1)
+        self.assertEqual(buffer.dirty_ranges(), [(1, size)])
+
+    def test_compact_marks_dirty(self):
+        buffer = ChunkBuffer(4, TURTLE_MODEL_DATA_SIZE)
+        buffer.extend(4)
+        buffer.clear_dirty()
+        buffer.compact([0, 3])
+        self.assertEqual(buffer.dirty_ranges(), [(0, 1)])
+
+    def make_slices(self, size, array_size=20, count=None):
         buffer = ChunkBuffer(array_size, TURTLE_MODEL_DATA_SIZE)
-        for i in range(array_size):
+        if count is None:
+            count = array_size
+        for i in range(count):
             buffer.new([i+1] * TURTLE_MODEL_DATA_SIZE)
 
         return buffer.slice(size)
@@ -174,16 +362,384 @@ class ChunkBufferTestCase(TestCase):
         with self.assertRaises(StopIteration):
             next(slices)
 
+    def test_slice_only_live_chunks(self):
+        slices = self.make_slices(4, 20, count=6)
+        size, slice = next(slices)
+        self.assertEqual(size, 4)
+        size, slice = next(slices)
+        self.assertEqual(size, 2)
+        self.assertEqual(len(slice), 2 * TURTLE_MODEL_DATA_SIZE)
+        self.assertEqual(
+            list(slice[TURTLE_MODEL_DATA_SIZE:2 * TURTLE_MODEL_DATA_SIZE]),
+            [6] * TURTLE_MODEL_DATA_SIZE
+        )
+        with self.assertRaises(StopIteration):
+            next(slices)
+
+    def test_slice_empty(self):
+        slices = self.make_slices(4, 20, count=0)
+        self.assertEqual(list(slices), [])
+
+    def test_slice_end(self):
+        buffer = ChunkBuffer(20, TURTLE_MODEL_DATA_SIZE)
+        buffer.extend(10)
+        sizes = [size for size, data in buffer.slice(4, 6)]
+        self.assertEqual(sizes, [4, 2])
+        sizes = [size for size, data in buffer.slice(4, 30)]
+        self.assertEqual(sizes, [4, 4, 2])
+
+
+class SlotMapTestCase(TestCase):
+
+    def test_add(self):
+        slots = SlotMap(2)
+        slots.add(3, 0)
+        self.assertIn(3, slots)
+        self.assertNotIn(0, slots)
+        self.assertNotIn(100, slots)
+        self.assertEqual(slots.index(3), 0)
+        self.assertEqual(slots.id(0), 3)
+        self.assertEqual(len(slots), 1)
+
+    def test_add_grows(self):
+        slots = SlotMap(2)
+        slots.add(10, 5)
+        self.assertEqual(slots.index(10), 5)
+        self.assertEqual(slots.id(5), 10)
+        self.assertGreaterEqual(len(slots.index_of), 11)
+        self.assertGreaterEqual(len(slots.id_of), 6)
+
+    def test_add_existing(self):
+        slots = SlotMap(2)
+        slots.add(1, 0)
+        with self.assertRaises(AssertionError):
+            slots.add(1, 1)
+
+    def test_add_range(self):
+        slots = SlotMap(2)
+        slots.add(0, 0)
+        slots.add_range([7, 3, 5], 1)
+        self.assertEqual(len(slots), 4)
+        self.assertEqual(list(slots.id_of[0:4]), [0, 7, 3, 5])
+        self.assertEqual(slots.index(7), 1)
+        self.assertEqual(slots.index(3), 2)
+        self.assertEqual(slots.index(5), 3)
+
+    def test_index_missing(self):
+        slots = SlotMap(2)
+        with self.assertRaises(KeyError):
+            slots.index(1)
+        with self.assertRaises(KeyError):
+            slots.index(-1)
+
+    def test_discard_and_move(self):
+        slots = SlotMap(4)
+        slots.add_range([0, 1, 2], 0)
+        self.assertEqual(slots.discard(0), 0)
+        self.assertNotIn(0, slots)
+        self.assertEqual(len(slots), 2)
+        slots.clear(0)
+        slots.move(2, 0)
+        self.assertEqual(slots.index(2), 0)
+        self.assertEqual(list(slots.id_of[0:3]), [2, 1, -1])
+
+    def test_swap(self):
+        slots = SlotMap(4)
+        slots.add_range([4, 5, 6], 0)
+        slots.swap(0, 2)
+        self.assertEqual(slots.index(4), 2)
+        self.assertEqual(slots.index(6), 0)
+        self.assertEqual(list(slots.id_of[0:3]), [6, 5, 4])
+
+    def test_swap_discarded(self):
+        slots = SlotMap(4)
+        slots.add_range([4, 5], 0)
+        slots.discard(4)
+        slots.swap(0, 1)
+        self.assertNotIn(4, slots)
+        self.assertEqual(slots.index(5), 0)
+        self.assertEqual(list(slots.id_of[0:2]), [5, 4])
+
+    def test_shared_ids(self):
+        ids = IdMap()
+        classic = SlotMap(2, ids, 0)
+        square = SlotMap(2, ids, 1)
+        classic.add(3, 0)
+        square.add(4, 0)
+        self.assertIn(3, classic)
+        self.assertNotIn(3, square)
+        self.assertEqual(square.index(4), 0)
+        with self.assertRaises(KeyError):
+            square.index(3)
+        with self.assertRaises(AssertionError):
+            square.add(3, 1)
+        self.assertEqual(len(ids), 2)
+
+    def test_swap_rescheduled_id(self):
+        # removed from one shape, and added to another before compacting
+        ids = IdMap()
+        classic = SlotMap(2, ids, 0)
+        square = SlotMap(2, ids, 1)
+        classic.add_range([1, 2], 0)
+        classic.discard(1)
+        square.add(1, 0)
+        classic.swap(0, 1)
+        self.assertEqual(square.index(1), 0)
+        self.assertEqual(classic.index(2), 0)
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_indices(self):
+        ids = IdMap()
+        classic = SlotMap(2, ids, 0)
+        square = SlotMap(2, ids, 1)
+        classic.add_range([0, 2], 0)
+        square.add(1, 0)
+        index = classic.indices(numpy.array([2, 1, -1, 100, 0], numpy.int32))
+        self.assertEqual(index.tolist(), [1, -1, -1, -1, 0])
+
+
+class IdMapTestCase(TestCase):
+
+    def test_serials(self):
+        ids = IdMap()
+        ids.add(0, 0, 0)
+        first = ids.serial(0)
+        self.assertNotEqual(first, 0)
+        ids.discard(0)
+        self.assertEqual(ids.serial(0), 0)
+        ids.add(0, 0, 0)
+        self.assertNotIn(ids.serial(0), (0, first))
+
+    def test_shrinks(self):
+        ids = IdMap()
+        for id in range(100):
+            ids.add(id, 0, id)
+        self.assertGreaterEqual(len(ids.index_of), 100)
+        for id in range(99, 1, -1):
+            ids.discard(id)
+        self.assertLess(len(ids.index_of), 100)
+        self.assertEqual(len(ids.shape_of), len(ids.serial_of))
+        self.assertIn(1, ids)
+        ids.add(50, 0, 2)
+        self.assertIn(50, ids)
+
 
+class ArenaTestCase(TestCase):
+
+    def assert_arena_data(self, arena, index, data):
+        offset = index * TURTLE_MODEL_DATA_SIZE
+        slice = arena.data[offset:offset + TURTLE_MODEL_DATA_SIZE]
+        self.assertEqual(list(slice), data)
+
+    def test_members_laid_out_in_order(self):
+        arena = Arena(TURTLE_MODEL_DATA_SIZE)
+        buffer1 = ArenaChunkBuffer(arena, 2, TURTLE_MODEL_DATA_SIZE)
+        buffer2 = ArenaChunkBuffer(arena, 3, TURTLE_MODEL_DATA_SIZE)
+        self.assertEqual(arena.size, 5)
+        self.assertEqual(buffer1.base, 0)
+        self.assertEqual(buffer2.base, 2)
+        self.assertEqual(len(buffer2.data), 3 * TURTLE_MODEL_DATA_SIZE)
+        buffer1.new(MODEL_ONES)
+        buffer2.new(MODEL_TWOS)
+        self.assert_arena_data(arena, 0, MODEL_ONES)
+        self.assert_arena_data(arena, 2, MODEL_TWOS)
+
+    def test_resize_moves_members(self):
+        arena = Arena(TURTLE_MODEL_DATA_SIZE)
+        buffer1 = ArenaChunkBuffer(arena, 1, TURTLE_MODEL_DATA_SIZE)
+        buffer2 = ArenaChunkBuffer(arena, 1, TURTLE_MODEL_DATA_SIZE)
+        buffer1.new(MODEL_ONES)
+        buffer2.new(MODEL_TWOS)
+        buffer1.new(MODEL_THREES)
+        self.assertEqual(buffer1.size, 2)
+        self.assertEqual(arena.size, 3)
+        self.assertEqual(buffer2.base, 2)
+        self.assert_arena_data(arena, 0, MODEL_ONES)
+        self.assert_arena_data(arena, 1, MODEL_THREES)
+        self.assert_arena_data(arena, 2, MODEL_TWOS)
+        self.assertEqual(list(buffer2.get(0)), MODEL_TWOS)
+
+    def test_dirty_byte_ranges(self):
+        arena = Arena(TURTLE_MODEL_DATA_SIZE)
+        buffer1 = ArenaChunkBuffer(arena, 2, TURTLE_MODEL_DATA_SIZE)
+        buffer2 = ArenaChunkBuffer(arena, 2, TURTLE_MODEL_DATA_SIZE)
+        buffer1.extend(2)
+        buffer2.new()
+        chunk_bytes = TURTLE_MODEL_DATA_SIZE * 4
+        self.assertEqual(arena.dirty_byte_ranges(), [(0, 3 * chunk_bytes)])
+        arena.clear_dirty()
+        self.assertEqual(arena.dirty_byte_ranges(), [])
+        buffer2.mark_dirty()
+        self.assertEqual(
+            arena.dirty_byte_ranges(), [(2 * chunk_bytes, chunk_bytes)])
+
+    def test_dirty_byte_ranges_clipped(self):
+        arena = Arena(TURTLE_MODEL_DATA_SIZE)
+        buffer1 = ArenaChunkBuffer(arena, 3, TURTLE_MODEL_DATA_SIZE)
+        buffer2 = ArenaChunkBuffer(arena, 3, TURTLE_MODEL_DATA_SIZE)
+        buffer3 = ArenaChunkBuffer(arena, 3, TURTLE_MODEL_DATA_SIZE)
+        for buffer in (buffer1, buffer2, buffer3):
+            buffer.extend(3)
+        chunk_bytes = TURTLE_MODEL_DATA_SIZE * 4
+        # only the first of buffer1 and two of buffer3 are drawn
+        ranges = arena.dirty_byte_ranges({buffer1: 1, buffer3: 2})
+        self.assertEqual(ranges, [
+            (0, chunk_bytes),
+            (6 * chunk_bytes, 2 * chunk_bytes),
+        ])
+
+    def test_manager_shares_arena(self):
+        manager = BufferManager(2, arena=True)
+        manager.create_turtle(0, 'classic', MODEL_ONES, COLOR_ONES)
+        manager.create_turtle(1, 'turtle', MODEL_TWOS, COLOR_TWOS)
+        classic = manager.buffers['classic']
+        turtle = manager.buffers['turtle']
+        self.assertIs(classic.model.arena, turtle.model.arena)
+        self.assertEqual(manager.model_arena.size, 4)
+        self.assertEqual(manager.color_arena.size, 4)
+        self.assertEqual(turtle.model.base, 2)
+        self.assertEqual(turtle.color.base, 2)
+        self.assert_arena_data(manager.model_arena, 2, MODEL_TWOS)
+
+    def test_manager_relayout_moves_everyone(self):
+        manager = BufferManager(1, arena=True)
+        manager.create_turtle(0, 'classic', MODEL_ONES, COLOR_ONES)
+        manager.create_turtle(1, 'turtle', MODEL_TWOS, COLOR_TWOS)
+        classic = manager.buffers['classic']
+        classic.moved.clear()
+        manager.buffers['turtle'].moved.clear()
+        # growing turtle's range lays out the whole arena again
+        manager.create_turtle(2, 'turtle', MODEL_THREES, COLOR_ONES)
+        self.assertEqual(classic.moved, set([0]))
+        self.assertEqual(manager.buffers['turtle'].moved, set([1, 2]))
+        classic.moved.clear()
+        # fetched again, the data is the arena's
+        model = classic.get_model(0)
+        model[0] = 9.0
+        self.assertEqual(manager.model_arena.data[0], 9.0)
+        # no relayout, nothing moved
+        manager.mark_dirty(0)
+        manager.destroy_turtle(2)
+        self.assertEqual(classic.moved, set())
+
+
+def _simulate_shared(directory):
+    """Moves every turtle in a shared BufferManager, from another process"""
+    for buffer in attach_buffers(directory):
+        buffer.refresh()
+        for model in buffer.model:
+            model[0] += 10
+        buffer.model.close()
+        buffer.color.close()
+
+
+class SharedChunkBufferTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.model')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_buffer(self, size=2):
+        buffer = SharedChunkBuffer(self.path, size, TURTLE_MODEL_DATA_SIZE)
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def attach(self):
+        buffer = SharedChunkBuffer.attach(self.path)
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def test_attach_shares_data(self):
+        buffer = self.make_buffer()
+        buffer.new(MODEL_ONES)
+        attached = self.attach()
+        self.assertEqual(attached.count, 1)
+        self.assertEqual(attached.size, 2)
+        self.assertEqual(attached.chunk_size, TURTLE_MODEL_DATA_SIZE)
+        self.assertEqual(list(attached.get(0)), MODEL_ONES)
+        attached.data[0] = 5
+        self.assertEqual(buffer.data[0], 5)
+
+    def test_attach_sees_new_count(self):
+        buffer = self.make_buffer()
+        attached = self.attach()
+        self.assertEqual(attached.count, 0)
+        buffer.new(MODEL_ONES)
+        self.assertEqual(attached.count, 1)
+
+    def test_resize_keeps_data(self):
+        buffer = self.make_buffer()
+        buffer.new(MODEL_ONES)
+        held = buffer.get(0)
+        buffer.extend(3, MODEL_TWOS * 3)
+        self.assertEqual(buffer.size, 4)
+        self.assertEqual(list(buffer.get(0)), MODEL_ONES)
+        self.assertEqual(list(buffer.get(3)), MODEL_TWOS)
+        # slices of the old mapping still see the file
+        buffer.data[0] = 7
+        self.assertEqual(held[0], 7)
+
+    def test_refresh_remaps(self):
+        buffer = self.make_buffer()
+        attached = self.attach()
+        buffer.extend(3, MODEL_TWOS * 3)
+        # not remapped yet, so can only see what is mapped
+        self.assertEqual(attached.count, 2)
+        attached.refresh()
+        self.assertEqual(attached.size, 4)
+        self.assertEqual(attached.count, 3)
+        self.assertEqual(list(attached.get(2)), MODEL_TWOS)
+
+    def test_compact(self):
+        buffer = self.make_buffer(4)
+        buffer.extend(3, MODEL_ONES + MODEL_TWOS + MODEL_THREES)
+        attached = self.attach()
+        buffer.compact([0])
+        self.assertEqual(attached.count, 2)
+        self.assertEqual(list(attached.get(0)), MODEL_THREES)
+
+    def test_attach_not_a_buffer(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            SharedChunkBuffer.attach(self.path)
+
+    def test_close_unlink(self):
+        buffer = SharedChunkBuffer(self.path, 2, TURTLE_MODEL_DATA_SIZE)
+        buffer.new(MODEL_ONES)
+        buffer.close(unlink=True)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(buffer.count, 1)
+
+    def test_shared_manager_from_another_process(self):
+        manager = BufferManager(4, shared=self.directory)
+        manager.create_turtle(0, 'classic', MODEL_ONES, COLOR_ONES)
+        manager.create_turtle(1, 'square', MODEL_TWOS, COLOR_TWOS)
+        process = multiprocessing.Process(
+            target=_simulate_shared, args=(self.directory,))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(manager.get_buffer('classic').get_model(0)[0], 11)
+        self.assertEqual(manager.get_buffer('square').get_model(1)[0], 12)
+        for buffer in manager.buffers.values():
+            buffer.model.close()
+            buffer.color.close()
 
 
 class ShapeBufferTestCase(TestCase):
 
     def assert_id_map(self, buffer, id, index):
-        self.assertIn(id, buffer.id_to_index)
-        self.assertIn(index, buffer.index_to_id)
-        self.assertEqual(buffer.id_to_index[id], index)
-        self.assertEqual(buffer.index_to_id[index], id)
+        self.assertIn(id, buffer.slots)
+        self.assertEqual(buffer.slots.index(id), index)
+        self.assertEqual(buffer.slots.id(index), id)
+
+    def assert_not_mapped(self, buffer, id, index):
+        self.assertNotIn(id, buffer.slots)
+        self.assertEqual(buffer.slots.id(index), -1)
 
     def assert_turtle_data(self, buffer, id, index, model, color):
         if id:
@@ -219,6 +775,66 @@ class ShapeBufferTestCase(TestCase):
         self.assert_id_map(buffer, 1, 1)
         self.assertEqual(buffer.count, 2)
 
+    def test_extend(self):
+        buffer = ShapeBuffer('shape', 4)
+        buffer.new(0)
+        start = buffer.extend(
+            [5, 6], MODEL_ONES + MODEL_TWOS, COLOR_ONES + COLOR_TWOS)
+        self.assertEqual(start, 1)
+        self.assertEqual(buffer.count, 3)
+        self.assert_turtle_data(buffer, 5, 1, MODEL_ONES, COLOR_ONES)
+        self.assert_turtle_data(buffer, 6, 2, MODEL_TWOS, COLOR_TWOS)
+
+    def test_extend_bad_id(self):
+        buffer = ShapeBuffer('shape', 4)
+        buffer.new(0)
+        with self.assertRaises(AssertionError):
+            buffer.extend([1, 0])
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_model_view(self):
+        buffer = ShapeBuffer('shape', 1)
+        buffer.new(0, list(range(TURTLE_MODEL_DATA_SIZE)), COLOR_ONES)
+        view = buffer.model_view
+        self.assertEqual(len(view), 1)
+        self.assertEqual(view['x'][0], 0)
+        self.assertEqual(view['heading'][0], 4)
+        self.assertEqual(view['speed'][0], 10)
+        view['y'] += 10
+        self.assertEqual(buffer.get_model(0)[1], 11)
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_model_view_after_resize(self):
+        buffer = ShapeBuffer('shape', 1)
+        buffer.new(0, MODEL_ONES, COLOR_ONES)
+        buffer.new(1, MODEL_TWOS, COLOR_TWOS)
+        self.assertEqual(buffer.size, 2)
+        view = buffer.model_view
+        self.assertEqual(list(view['x']), [1, 2])
+        view['x'] = 7
+        self.assertEqual(list(buffer.get_model(0)), [7] + MODEL_ONES[1:])
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_color_view(self):
+        buffer = ShapeBuffer('shape', 4)
+        buffer.new(0, MODEL_ONES, list(range(TURTLE_COLOR_DATA_SIZE)))
+        view = buffer.color_view
+        self.assertEqual(view['pen_alpha'][0], 3)
+        self.assertEqual(view['fill_r'][0], 4)
+        self.assertEqual(view['pen_width'][0], 8)
+
+    def test_slice(self):
+        buffer = ShapeBuffer('shape', 8)
+        for id in range(3):
+            buffer.new(
+                id, [id] * TURTLE_MODEL_DATA_SIZE,
+                [id] * TURTLE_COLOR_DATA_SIZE)
+        slices = list(buffer.slice(2))
+        self.assertEqual([size for size, _, _ in slices], [2, 1])
+        size, model, color = slices[1]
+        self.assertEqual(list(model), [2] * TURTLE_MODEL_DATA_SIZE)
+        self.assertEqual(list(color), [2] * TURTLE_COLOR_DATA_SIZE)
+
     def test_remove_id_end(self):
         buffer = ShapeBuffer('shape', 4)
         buffer.new(0, MODEL_ONES, COLOR_ONES)
@@ -226,13 +842,13 @@ class ShapeBufferTestCase(TestCase):
         buffer.new(2, MODEL_THREES, COLOR_THREES)
         self.assert_turtle_data(buffer, 2, 2, MODEL_THREES, COLOR_THREES)
         buffer.remove(2)
+        buffer.compact()
         self.assertEqual(buffer.count, 2)
         self.assert_turtle_data(buffer, 0, 0, MODEL_ONES, COLOR_ONES)
         self.assert_turtle_data(buffer, 1, 1, MODEL_TWOS, COLOR_TWOS)
         # check last one zeroed
         self.assert_turtle_data(buffer, None, 2, MODEL_ZEROS, COLOR_ZEROS)
-        self.assertNotIn(2, buffer.id_to_index)
-        self.assertNotIn(2, buffer.index_to_id)
+        self.assert_not_mapped(buffer, 2, 2)
 
     def test_remove_id_start(self):
         buffer = ShapeBuffer('shape', 4)
@@ -241,14 +857,15 @@ class ShapeBufferTestCase(TestCase):
         buffer.new(2, MODEL_THREES, COLOR_THREES)
         self.assert_turtle_data(buffer, 0, 0, MODEL_ONES, COLOR_ONES)
         buffer.remove(0)
+        buffer.compact()
         self.assertEqual(buffer.count, 2)
         # check last one has been copied to 0
         self.assert_turtle_data(buffer, 2, 0, MODEL_THREES, COLOR_THREES)
         self.assert_turtle_data(buffer, 1, 1, MODEL_TWOS, COLOR_TWOS)
         # check last one zeroed
         self.assert_turtle_data(buffer, None, 2, MODEL_ZEROS, COLOR_ZEROS)
-        self.assertNotIn(0, buffer.id_to_index)
-        self.assertNotIn(2, buffer.index_to_id)
+        self.assertNotIn(0, buffer.slots)
+        self.assertEqual(buffer.slots.id(2), -1)
 
     def test_remove_id_middle(self):
         buffer = ShapeBuffer('shape', 4)
@@ -257,14 +874,335 @@ class ShapeBufferTestCase(TestCase):
         buffer.new(2, MODEL_THREES, COLOR_THREES)
         self.assert_turtle_data(buffer, 1, 1, MODEL_TWOS, COLOR_TWOS)
         buffer.remove(1)
+        buffer.compact()
         self.assertEqual(buffer.count, 2)
         # check last has been copied to 1
         self.assert_turtle_data(buffer, 0, 0, MODEL_ONES, COLOR_ONES)
         self.assert_turtle_data(buffer, 2, 1, MODEL_THREES, COLOR_THREES)
         # check last one zeroed
         self.assert_turtle_data(buffer, None, 2, MODEL_ZEROS, COLOR_ZEROS)
-        self.assertNotIn(1, buffer.id_to_index)
-        self.assertNotIn(2, buffer.index_to_id)
+        self.assertNotIn(1, buffer.slots)
+        self.assertEqual(buffer.slots.id(2), -1)
+
+    def test_remove_is_deferred(self):
+        buffer = ShapeBuffer('shape', 4)
+        buffer.new(0, MODEL_ONES, COLOR_ONES)
+        buffer.new(1, MODEL_TWOS, COLOR_TWOS)
+        buffer.remove(0)
+        self.assertEqual(buffer.count, 2)
+        self.assertNotIn(0, buffer.slots)
+        self.assert_turtle_data(buffer, None, 0, MODEL_ONES, COLOR_ONES)
+        buffer.compact()
+        self.assertEqual(buffer.count, 1)
+        self.assert_turtle_data(buffer, 1, 0, MODEL_TWOS, COLOR_TWOS)
+
+    def test_remove_many(self):
+        buffer = ShapeBuffer('shape', 4)
+        for id in range(10):
+            buffer.new(id, [id] * TURTLE_MODEL_DATA_SIZE, COLOR_ONES)
+        for id in range(0, 10, 2):
+            buffer.remove(id)
+        buffer.compact()
+        self.assertEqual(buffer.count, 5)
+        self.assertEqual(len(buffer.slots), 5)
+        self.assertEqual(list(buffer.slots.id_of[5:10]), [-1] * 5)
+        for id in range(1, 10, 2):
+            index = buffer.slots.index(id)
+            self.assertLess(index, 5)
+            self.assert_turtle_data(
+                buffer, id, index, [id] * TURTLE_MODEL_DATA_SIZE, COLOR_ONES)
+
+    def test_remove_then_new_same_id(self):
+        buffer = ShapeBuffer('shape', 4)
+        buffer.new(0, MODEL_ONES, COLOR_ONES)
+        buffer.new(1, MODEL_TWOS, COLOR_TWOS)
+        buffer.remove(0)
+        buffer.new(0, MODEL_THREES, COLOR_THREES)
+        buffer.compact()
+        self.assertEqual(buffer.count, 2)
+        self.assert_turtle_data(buffer, 0, 0, MODEL_THREES, COLOR_THREES)
+        self.assert_turtle_data(buffer, 1, 1, MODEL_TWOS, COLOR_TWOS)
+
+    def test_copy(self):
+        buffer = ShapeBuffer('shape', 4)
+        buffer.new(0, MODEL_ONES, COLOR_ONES)
+        buffer.new(5, MODEL_TWOS, COLOR_TWOS)
+        copy = buffer.copy()
+        self.assertEqual(copy.shape, 'shape')
+        self.assertEqual(copy.count, 2)
+        self.assert_turtle_data(copy, 0, 0, MODEL_ONES, COLOR_ONES)
+        self.assert_turtle_data(copy, 5, 1, MODEL_TWOS, COLOR_TWOS)
+        copy.model.data[0] = 99
+        self.assertEqual(buffer.model.data[0], 1)
+
+    def test_copy_with_pending_removal(self):
+        buffer = ShapeBuffer('shape', 4)
+        buffer.new(0, MODEL_ONES, COLOR_ONES)
+        buffer.new(1, MODEL_TWOS, COLOR_TWOS)
+        buffer.remove(0)
+        buffer.new(0, MODEL_THREES, COLOR_THREES)
+        copy = buffer.copy()
+        self.assertEqual(copy.removed, set([0]))
+        copy.compact()
+        self.assertEqual(copy.count, 2)
+        self.assert_turtle_data(copy, 0, 0, MODEL_THREES, COLOR_THREES)
+        self.assert_turtle_data(copy, 1, 1, MODEL_TWOS, COLOR_TWOS)
+
+    def test_copy_first(self):
+        buffer = ShapeBuffer('shape', 4)
+        buffer.new(0, MODEL_ONES, COLOR_ONES)
+        buffer.new(5, MODEL_TWOS, COLOR_TWOS)
+        buffer.new(7, MODEL_THREES, COLOR_THREES)
+        buffer.hide(0)
+        copy = buffer.copy(2)
+        self.assertEqual(copy.count, 2)
+        self.assertEqual(copy.visible_count, 2)
+        self.assertNotIn(0, copy.slots)
+        self.assert_turtle_data(copy, 7, 0, MODEL_THREES, COLOR_THREES)
+        self.assertEqual(buffer.copy(10).count, 3)
+
+    def test_copy_empty(self):
+        copy = ShapeBuffer('shape', 4).copy()
+        self.assertEqual(copy.count, 0)
+        self.assertEqual(len(copy.slots), 0)
+
+    def make_visible_buffer(self, n):
+        buffer = ShapeBuffer('shape', 4)
+        for id in range(n):
+            buffer.new(
+                id, [id] * TURTLE_MODEL_DATA_SIZE,
+                [id] * TURTLE_COLOR_DATA_SIZE)
+        buffer.moved.clear()
+        return buffer
+
+    def assert_partition(self, buffer, visible):
+        """Checks visible ids, and only they, are in the visible prefix, and
+        every turtle's data is still its own"""
+        self.assertEqual(buffer.visible_count, len(visible))
+        for index in range(buffer.count):
+            id = buffer.slots.id(index)
+            if index in buffer.removed:
+                continue
+            self.assertEqual(buffer.slots.index(id), index)
+            self.assertEqual(buffer.model.get(index)[0], id)
+            self.assertEqual(buffer.color.get(index)[0], id)
+            self.assertEqual(buffer.is_visible(id), id in visible)
+
+    def test_new_is_visible(self):
+        buffer = self.make_visible_buffer(3)
+        self.assertEqual(buffer.visible_count, 3)
+        self.assertTrue(buffer.is_visible(1))
+
+    def test_hide_show(self):
+        buffer = self.make_visible_buffer(4)
+        buffer.model.clear_dirty()
+        buffer.hide(1)
+        self.assert_partition(buffer, {0, 2, 3})
+        self.assertEqual(buffer.slots.index(1), 3)
+        self.assertEqual(buffer.moved, {1, 3})
+        self.assertEqual(buffer.model.dirty_ranges(), [(1, 2), (3, 4)])
+        buffer.hide(1)
+        self.assert_partition(buffer, {0, 2, 3})
+        buffer.hide(0)
+        self.assert_partition(buffer, {2, 3})
+        buffer.show(1)
+        self.assert_partition(buffer, {1, 2, 3})
+        buffer.show(1)
+        self.assert_partition(buffer, {1, 2, 3})
+
+    def test_show_marks_dirty(self):
+        buffer = self.make_visible_buffer(2)
+        buffer.hide(1)
+        buffer.model.clear_dirty()
+        buffer.show(1)
+        self.assertEqual(buffer.model.dirty_ranges(), [(1, 2)])
+
+    def test_new_while_hidden(self):
+        buffer = self.make_visible_buffer(3)
+        buffer.hide(0)
+        model, color = buffer.new(
+            3, [3] * TURTLE_MODEL_DATA_SIZE, [3] * TURTLE_COLOR_DATA_SIZE)
+        self.assertEqual(model[0], 3)
+        self.assert_partition(buffer, {1, 2, 3})
+        self.assertEqual(buffer.slots.index(0), 3)
+
+    def test_extend_while_hidden(self):
+        for hidden, added in [(1, 3), (3, 1), (2, 2)]:
+            buffer = self.make_visible_buffer(4)
+            for id in range(hidden):
+                buffer.hide(id)
+            ids = list(range(4, 4 + added))
+            model_init = []
+            color_init = []
+            for id in ids:
+                model_init.extend([id] * TURTLE_MODEL_DATA_SIZE)
+                color_init.extend([id] * TURTLE_COLOR_DATA_SIZE)
+            first = buffer.extend(ids, model_init, color_init)
+            self.assertEqual(first, 4 - hidden)
+            self.assert_partition(buffer, set(range(hidden, 4 + added)))
+
+    def test_compact_keeps_partition(self):
+        random = Random(5)
+        for _ in range(20):
+            buffer = self.make_visible_buffer(12)
+            visible = set(range(12))
+            for id in random.sample(range(12), 6):
+                buffer.hide(id)
+                visible.discard(id)
+            for id in random.sample(range(12), 5):
+                buffer.remove(id)
+                visible.discard(id)
+            buffer.compact()
+            self.assertEqual(buffer.count, 7)
+            self.assert_partition(buffer, visible)
+
+    def test_compact_reports_moved(self):
+        buffer = self.make_visible_buffer(3)
+        buffer.remove(0)
+        buffer.compact()
+        self.assertEqual(buffer.moved, {2})
+
+
+class DoubleBufferTestCase(TestCase):
+
+    def test_single_buffered_front_is_back(self):
+        buffer = ShapeBuffer('shape', 4)
+        self.assertFalse(buffer.double)
+        self.assertIs(buffer.front_model, buffer.model)
+        self.assertIs(buffer.front_color, buffer.color)
+        buffer.swap()
+
+    def test_front_unchanged_until_swap(self):
+        buffer = ShapeBuffer('shape', 4, double=True)
+        self.assertTrue(buffer.double)
+        buffer.new(0, MODEL_ONES, COLOR_ONES)
+        self.assertEqual(buffer.front_model.count, 0)
+        buffer.swap()
+        self.assertEqual(buffer.front_model.count, 1)
+        self.assertEqual(list(buffer.front_model.get(0)), MODEL_ONES)
+        self.assertEqual(list(buffer.front_color.get(0)), COLOR_ONES)
+        buffer.model.data[0] = 5
+        self.assertEqual(buffer.front_model.data[0], 1)
+        buffer.swap()
+        self.assertEqual(buffer.front_model.data[0], 5)
+
+    def test_swap_moves_dirty_ranges(self):
+        buffer = ShapeBuffer('shape', 4, double=True)
+        buffer.new(0, MODEL_ONES, COLOR_ONES)
+        buffer.new(1, MODEL_TWOS, COLOR_TWOS)
+        buffer.swap()
+        self.assertEqual(buffer.model.dirty_ranges(), [])
+        self.assertEqual(buffer.front_model.dirty_ranges(), [(0, 2)])
+        self.assertEqual(buffer.front_color.dirty_ranges(), [(0, 2)])
+
+    def test_swap_by_reference(self):
+        buffer = ShapeBuffer('shape', 4, double=True)
+        back = buffer.model
+        front = buffer.front_model
+        buffer.new(0, MODEL_ONES, COLOR_ONES)
+        buffer.swap()
+        self.assertIsNot(buffer.front_model, front)
+        self.assertIs(buffer.model, back)
+        buffer.swap()
+        self.assertIs(buffer.front_model, front)
+        self.assertEqual(list(front.get(0)), MODEL_ONES)
+
+    def test_swap_keeps_ranges_not_uploaded(self):
+        buffer = ShapeBuffer('shape', 4, double=True)
+        buffer.new(0, MODEL_ONES, COLOR_ONES)
+        buffer.new(1, MODEL_TWOS, COLOR_TWOS)
+        buffer.swap()
+        buffer.mark_dirty(1)
+        buffer.swap()
+        self.assertEqual(buffer.model.dirty_ranges(), [])
+        self.assertEqual(buffer.front_model.dirty_ranges(), [(0, 2)])
+        self.assertEqual(buffer.spare_model.dirty_ranges(), [])
+        buffer.front_model.clear_dirty()
+        buffer.mark_dirty(1)
+        buffer.swap()
+        self.assertEqual(buffer.front_model.dirty_ranges(), [(1, 2)])
+
+    def test_swap_visible_count(self):
+        buffer = ShapeBuffer('shape', 4, double=True)
+        buffer.new(0, MODEL_ONES, COLOR_ONES)
+        buffer.new(1, MODEL_TWOS, COLOR_TWOS)
+        buffer.swap()
+        buffer.hide(0)
+        self.assertEqual(buffer.front_visible_count, 2)
+        buffer.swap()
+        self.assertEqual(buffer.front_visible_count, 1)
+        self.assertEqual(list(buffer.front_model.get(0)), MODEL_TWOS)
+
+    def test_swap_grows_front(self):
+        buffer = ShapeBuffer('shape', 2, double=True)
+        for id in range(5):
+            buffer.new(id, [id] * TURTLE_MODEL_DATA_SIZE, COLOR_ONES)
+        buffer.swap()
+        self.assertEqual(buffer.front_model.size, buffer.model.size)
+        self.assertEqual(buffer.front_model.count, 5)
+        self.assertEqual(
+            list(buffer.front_model.get(4)), [4] * TURTLE_MODEL_DATA_SIZE)
+
+    def test_manager_swap_applies_removals(self):
+        manager = BufferManager(4, double=True)
+        manager.create_turtle(0, 'shape', MODEL_ONES, COLOR_ONES)
+        manager.create_turtle(1, 'shape', MODEL_TWOS, COLOR_TWOS)
+        manager.swap()
+        manager.destroy_turtle(0)
+        buffer = manager.get_buffer('shape')
+        self.assertEqual(buffer.front_model.count, 2)
+        manager.swap()
+        self.assertEqual(buffer.front_model.count, 1)
+        self.assertEqual(list(buffer.front_model.get(0)), MODEL_TWOS)
+
+    def test_simulate_in_thread(self):
+        manager = BufferManager(4, double=True)
+        manager.create_turtles(range(100), 'shape')
+        buffer = manager.get_buffer('shape')
+        done = threading.Event()
+
+        def simulate():
+            while not done.is_set():
+                with manager.lock:
+                    for model in buffer.model:
+                        model[0] += 1
+
+        thread = threading.Thread(target=simulate)
+        thread.start()
+        try:
+            for _ in range(20):
+                manager.swap()
+                front = [model[0] for model in buffer.front_model]
+                # every turtle is from the same step
+                self.assertEqual(len(set(front)), 1)
+        finally:
+            done.set()
+            thread.join()
+
+    def test_render_while_simulating(self):
+        manager = BufferManager(4, double=True)
+        manager.create_turtles(range(100), 'shape')
+        buffer = manager.get_buffer('shape')
+        done = threading.Event()
+
+        def simulate():
+            while not done.is_set():
+                with manager.lock:
+                    for model in buffer.model:
+                        model[0] += 1
+                    manager.swap()
+
+        thread = threading.Thread(target=simulate)
+        thread.start()
+        try:
+            for _ in range(20):
+                # only waits for swaps, not steps
+                with manager.front_lock:
+                    front = [model[0] for model in buffer.front_model]
+                self.assertEqual(len(set(front)), 1)
+        finally:
+            done.set()
+            thread.join()
 
 
 class BufferManagerTestCase(TestCase):
@@ -290,6 +1228,19 @@ class BufferManagerTestCase(TestCase):
         self.assertIn('classic', manager.buffers)
         self.assertEqual(manager.buffers['classic'].size, 4)
 
+    def test_create_turtles(self):
+        manager = BufferManager(4)
+        init = list(itertools.chain(
+            MODEL_ONES, COLOR_ONES, MODEL_TWOS, COLOR_TWOS))
+        model_init, color_init = split_init_data(init, 2)
+        buffer, start = manager.create_turtles(
+            [3, 4], 'classic', model_init, color_init)
+        self.assertIs(buffer, manager.buffers['classic'])
+        self.assertEqual(start, 0)
+        self.assertEqual(manager.id_to_shape, {3: 'classic', 4: 'classic'})
+        self.assertEqual(list(buffer.get_model(4)), MODEL_TWOS)
+        self.assertEqual(list(buffer.get_color(3)), COLOR_ONES)
+
     def test_set_shape(self):
         manager = BufferManager(4)
         model, color = manager.create_turtle(
@@ -300,11 +1251,75 @@ class BufferManagerTestCase(TestCase):
         self.assertEqual(list(model2), MODEL_ONES)
         self.assertEqual(list(color2), COLOR_ONES)
 
+    def test_set_shape_one_map(self):
+        manager = BufferManager(4)
+        manager.create_turtle(5, 'classic', MODEL_ONES, COLOR_ONES)
+        serial = manager.ids.serial(5)
+        manager.set_shape(5, 'turtle')
+        self.assertNotIn(5, manager.buffers['classic'].slots)
+        self.assertIn(5, manager.buffers['turtle'].slots)
+        self.assertEqual(manager.ids.serial(5), serial)
+        manager.compact()
+        self.assertEqual(manager.buffers['classic'].count, 0)
+        self.assertEqual(list(manager.buffers['turtle'].get_model(5)),
+                         MODEL_ONES)
+
+    def test_set_shape_keeps_hidden(self):
+        manager = BufferManager(4)
+        manager.create_turtle(0, 'classic', MODEL_ONES, COLOR_ONES)
+        manager.create_turtle(1, 'turtle', MODEL_TWOS, COLOR_TWOS)
+        manager.create_turtle(2, 'turtle', MODEL_THREES, COLOR_THREES)
+        manager.hide(0)
+        manager.hide(2)
+        self.assertFalse(manager.is_visible(0))
+        model, color = manager.set_shape(0, 'turtle')
+        self.assertEqual(list(model), MODEL_ONES)
+        self.assertFalse(manager.is_visible(0))
+        self.assertTrue(manager.is_visible(1))
+        buffer = manager.buffers['turtle']
+        self.assertEqual(buffer.visible_count, 1)
+        self.assertEqual(list(buffer.get_model(2)), MODEL_THREES)
+        manager.show(0)
+        self.assertTrue(manager.is_visible(0))
+
+    def test_mark_dirty(self):
+        manager = BufferManager(4)
+        manager.create_turtle(0, 'classic', MODEL_ONES, COLOR_ONES)
+        manager.create_turtle(1, 'classic', MODEL_ONES, COLOR_ONES)
+        buffer = manager.buffers['classic']
+        buffer.model.clear_dirty()
+        buffer.color.clear_dirty()
+        manager.mark_dirty(1, model=False)
+        self.assertEqual(buffer.model.dirty_ranges(), [])
+        self.assertEqual(buffer.color.dirty_ranges(), [(1, 2)])
+
     def test_destroy_turtle(self):
         manager = BufferManager(4)
         model, color = manager.create_turtle(
             0, 'classic', MODEL_ONES, COLOR_ONES)
         manager.destroy_turtle(0)
+        self.assertEqual(manager.buffers['classic'].count, 1)
+        manager.compact()
         self.assertEqual(list(model), MODEL_ZEROS)
         self.assertEqual(list(color), COLOR_ZEROS)
         self.assertEqual(manager.buffers['classic'].count, 0)
+
+    def test_pull_before_reordering(self):
+        manager = BufferManager(4)
+        pulled = []
+        manager.pull = lambda buffer: pulled.append(buffer.shape)
+        manager.create_turtle(0, 'classic', MODEL_ONES, COLOR_ONES)
+        manager.create_turtle(1, 'classic', MODEL_TWOS, COLOR_TWOS)
+        # nothing hidden to move out of the way
+        self.assertEqual(pulled, [])
+        manager.hide(0)
+        self.assertEqual(pulled, ['classic'])
+        manager.create_turtle(2, 'classic', MODEL_THREES, COLOR_THREES)
+        manager.show(0)
+        self.assertEqual(pulled, ['classic'] * 3)
+        del pulled[:]
+        manager.set_shape(1, 'turtle')
+        self.assertEqual(pulled, ['classic'])
+        del pulled[:]
+        manager.sync()
+        self.assertEqual(pulled, ['classic', 'turtle'])
@@ -0,0 +1,109 @@
+from random import Random
+from unittest import TestCase, skipIf
+
+from turgles.buffer import BufferManager
+from turgles.collision import SHAPE_RADII, bounding_radius, collisions
+from turgles.memory import numpy, TURTLE_MODEL_DATA_SIZE
+
+
+def turtle(x, y, scale_x=1.0, scale_y=1.0):
+    model = [0.0] * TURTLE_MODEL_DATA_SIZE
+    model[0:4] = [x, y, scale_x, scale_y]
+    return model
+
+
+class BoundingRadiusTestCase(TestCase):
+
+    def test_bounding_radius(self):
+        polygon = {'scale': 2.0, 'vertex': (1, 0, 0, -3, -1, 1)}
+        self.assertEqual(bounding_radius(polygon), 6.0)
+
+    def test_shape_radii(self):
+        self.assertAlmostEqual(SHAPE_RADII['square'], 10 * 2 ** 0.5)
+        self.assertEqual(SHAPE_RADII['turtle'], 20.0)
+
+
+class CollisionTests(object):
+
+    use_numpy = None
+
+    def setUp(self):
+        self.manager = BufferManager(4)
+        self.radius = SHAPE_RADII['arrow']
+
+    def add(self, id, *args, **kwargs):
+        shape = kwargs.pop('shape', 'arrow')
+        self.manager.create_turtle(id, shape, turtle(*args), None)
+
+    def find(self, **kwargs):
+        pairs = collisions(
+            self.manager.buffers.values(), use_numpy=self.use_numpy,
+            **kwargs)
+        return sorted(tuple(sorted(pair)) for pair in self._list(pairs))
+
+    def _list(self, pairs):
+        if self.use_numpy:
+            return pairs.tolist()
+        return pairs
+
+    def test_none(self):
+        self.assertEqual(self.find(), [])
+        self.add(0, 0, 0)
+        self.assertEqual(self.find(), [])
+
+    def test_overlapping(self):
+        self.add(0, 0, 0)
+        self.add(1, 2 * self.radius - 0.1, 0)
+        self.add(2, 0, 2 * self.radius + 0.1)
+        self.assertEqual(self.find(), [(0, 1)])
+
+    def test_scale(self):
+        self.add(0, 0, 0)
+        self.add(1, 0, 2.5 * self.radius, 1.0, 2.0)
+        self.add(2, 0, -2.5 * self.radius, -2.0, 1.0)
+        self.assertEqual(self.find(), [(0, 1), (0, 2)])
+
+    def test_shapes(self):
+        self.add(0, 0, 0, shape='turtle')
+        self.add(1, 29, 0)
+        self.add(2, 35, 0, shape='square')
+        self.assertEqual(self.find(), [(0, 1), (1, 2)])
+
+    def test_ignores_removed(self):
+        self.add(0, 0, 0)
+        self.add(1, 1, 0)
+        self.manager.destroy_turtle(1)
+        self.assertEqual(self.find(), [])
+
+    def test_callback_batches(self):
+        for id in range(5):
+            self.add(id, id, 0)
+        batches = []
+        pairs = self.find(callback=batches.append, batch_size=4)
+        self.assertEqual(len(pairs), 10)
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+
+    def test_matches_brute_force(self):
+        random = Random(3)
+        positions = {}
+        for id in range(300):
+            x = random.uniform(-200, 200)
+            y = random.uniform(-200, 200)
+            scale = random.uniform(0.5, 2)
+            self.add(id, x, y, scale, scale)
+            positions[id] = (x, y, scale * self.radius)
+        expected = sorted(
+            (a, b)
+            for a, (ax, ay, ar) in positions.items()
+            for b, (bx, by, br) in positions.items()
+            if a < b and (ax - bx) ** 2 + (ay - by) ** 2 <= (ar + br) ** 2)
+        self.assertEqual(self.find(), expected)
+
+
+class PythonCollisionTestCase(CollisionTests, TestCase):
+    use_numpy = False
+
+
+@skipIf(numpy is None, "requires numpy")
+class NumpyCollisionTestCase(CollisionTests, TestCase):
+    use_numpy = True
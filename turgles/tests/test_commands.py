@@ -0,0 +1,220 @@
+from random import Random
+from unittest import TestCase, skipIf
+
+from turgles.buffer import BufferManager
+from turgles.commands import (
+    CommandQueue, FORWARD, GOTO, LEFT, SETHEADING, numpy_apply_commands)
+from turgles.memory import (
+    numpy, TURTLE_COLOR_DATA_SIZE, TURTLE_MODEL_DATA_SIZE)
+from turgles.stamps import Stamps
+
+
+def turtle(x, y, heading=0.0, orientation=None):
+    if orientation is None:
+        orientation = heading
+    model = [0.0] * TURTLE_MODEL_DATA_SIZE
+    model[0:2] = [x, y]
+    model[4:6] = [heading, orientation]
+    return model
+
+
+class CommandTests(object):
+
+    use_numpy = None
+
+    def setUp(self):
+        self.manager = BufferManager(4)
+        self.commands = CommandQueue(self.manager, self.use_numpy)
+
+    def add(self, id, *args, **kwargs):
+        shape = kwargs.pop('shape', 'classic')
+        self.manager.create_turtle(id, shape, turtle(*args), None)
+
+    def model(self, id):
+        shape = self.manager.id_to_shape[id]
+        return list(self.manager.buffers[shape].get_model(id)[0:10])
+
+    def assert_model(self, id, expected):
+        for actual, value in zip(self.model(id), expected):
+            self.assertAlmostEqual(actual, value, places=4)
+
+    def test_empty(self):
+        self.assertEqual(self.commands.execute(), 0)
+
+    def test_forward_back(self):
+        self.add(0, 1, 2, 90)
+        self.commands.forward(0, 10)
+        self.commands.back(0, 3)
+        self.assertEqual(len(self.commands), 2)
+        self.assertEqual(self.commands.execute(), 2)
+        self.assertEqual(len(self.commands), 0)
+        self.assert_model(0, [1, 9])
+
+    def test_pulls_before_moving(self):
+        self.add(0, 1, 2)
+        pulled = []
+        self.manager.pull = lambda buffer: pulled.append(buffer.shape)
+        self.commands.forward(0, 10)
+        self.commands.execute()
+        self.assertEqual(pulled, ['classic'])
+
+    def test_turns_in_order(self):
+        self.add(0, 0, 0, 0, 10)
+        self.commands.left(0, 90)
+        self.commands.forward(0, 5)
+        self.commands.right(0, 180)
+        self.commands.forward(0, 2)
+        self.commands.execute()
+        self.assert_model(
+            0, [0, 3, 0, 0, 270, 280, 0, -1, 0.17365, -0.98481])
+
+    def test_goto_setheading(self):
+        self.add(0, 5, 5, 30, 40)
+        self.commands.setheading(0, 180)
+        self.commands.goto(0, -1, 2)
+        self.commands.forward(0, 1)
+        self.commands.execute()
+        self.assert_model(0, [-2, 2, 0, 0, 180, 190, -1, 0])
+
+    def test_forward_keeps_heading(self):
+        self.add(0, 0, 0, -90)
+        self.commands.forward(0, 1)
+        self.commands.execute()
+        self.assert_model(0, [0, -1, 0, 0, -90, -90])
+
+    def test_many_turtles_and_shapes(self):
+        self.add(0, 0, 0)
+        self.add(1, 0, 0, 90, shape='square')
+        self.add(2, 0, 0, 180)
+        self.commands.forward(1, 1)
+        self.commands.forward(0, 2)
+        self.commands.forward(1, 1)
+        self.commands.execute()
+        self.assert_model(0, [2, 0])
+        self.assert_model(1, [0, 2])
+        self.assert_model(2, [0, 0])
+        buffer = self.manager.buffers['classic']
+        self.assertEqual(buffer.model.dirty_ranges(), [(0, 2)])
+
+    def test_drops_destroyed(self):
+        self.add(0, 0, 0)
+        self.add(1, 0, 0)
+        self.commands.forward(0, 1)
+        self.commands.forward(1, 1)
+        self.commands.forward(5, 1)
+        self.manager.destroy_turtle(1)
+        self.commands.execute()
+        self.assert_model(0, [1, 0])
+
+    def test_stamps_in_order(self):
+        stamps = Stamps(4)
+        commands = CommandQueue(self.manager, self.use_numpy, stamps=stamps)
+        self.add(0, 0, 0, 0, 30)
+        self.add(1, 0, 0, shape='square')
+        self.add(2, 0, 0)
+        color = [0.5] * TURTLE_COLOR_DATA_SIZE
+        made = []
+        for id in (0, 1, 2):
+            commands.forward(id, 10)
+            made.append(stamps.stamp(
+                id, self.manager.id_to_shape[id], self.model(id) + [0] * 6,
+                color, True))
+            commands.stamp(id, made[-1])
+            commands.left(id, 90)
+        self.manager.destroy_turtle(2)
+        commands.execute()
+        self.assertEqual(len(stamps), 2)
+        self.assertNotIn(made[2], stamps)
+        for id, orientation in ((0, 30), (1, 0)):
+            model = stamps.get(made[id])[0]
+            expected = [10, 0, 0, 0, 0, orientation]
+            for actual, value in zip(model[0:6], expected):
+                self.assertAlmostEqual(actual, value, places=4)
+        self.assertEqual(stamps.buffers['classic'].visible_count, 1)
+        self.assertEqual(stamps.buffers['square'].visible_count, 1)
+
+    def test_ignores_negative_ids(self):
+        for id in range(3):
+            self.add(id, 0, 0)
+        self.commands.forward(-1, 1)
+        self.commands.forward(-3, 1)
+        self.commands.execute()
+        for id in range(3):
+            self.assert_model(id, [0, 0])
+
+    def test_follows_shape_change(self):
+        self.add(0, 0, 0)
+        self.manager.set_shape(0, 'square')
+        self.commands.forward(0, 1)
+        self.commands.execute()
+        self.assert_model(0, [1, 0])
+
+    def test_drops_reused_id(self):
+        self.add(0, 0, 0)
+        self.add(1, 0, 0)
+        self.commands.forward(0, 1)
+        self.commands.forward(1, 1)
+        self.commands.left(0, 90)
+        self.manager.destroy_turtle(1)
+        self.add(1, 5, 5)
+        self.manager.set_shape(0, 'square')
+        self.commands.execute()
+        self.assert_model(0, [1, 0, 0, 0, 90, 90])
+        self.assert_model(1, [5, 5])
+
+
+class PythonCommandTestCase(CommandTests, TestCase):
+    use_numpy = False
+
+
+@skipIf(numpy is None, "requires numpy")
+class NumpyCommandTestCase(CommandTests, TestCase):
+    use_numpy = True
+
+    def test_matches_python(self):
+        random = Random(7)
+        queues = []
+        for use_numpy in (False, True):
+            manager = BufferManager(4)
+            for id in range(20):
+                manager.create_turtle(
+                    id, 'classic', turtle(0, 0, id * 17.0), None)
+            queues.append(CommandQueue(manager, use_numpy))
+        for _ in range(200):
+            id = random.randrange(20)
+            op = random.choice(['forward', 'back', 'left', 'right',
+                                'setheading', 'goto'])
+            values = [random.uniform(-100, 100)]
+            if op == 'goto':
+                values.append(random.uniform(-100, 100))
+            for queue in queues:
+                getattr(queue, op)(id, *values)
+        for queue in queues:
+            queue.execute()
+        python, fast = [q.manager.buffers['classic'] for q in queues]
+        for id in range(20):
+            for a, b in zip(python.get_model(id)[0:10],
+                            fast.get_model(id)[0:10]):
+                self.assertAlmostEqual(a, b, places=2)
+
+    def test_path(self):
+        model = numpy.zeros((3, TURTLE_MODEL_DATA_SIZE), numpy.float32)
+        model[1, 0:2] = [5, 5]
+        model[1, 4:6] = [90, 100]
+        index = numpy.array([1, 2, 1, 1, 1, 1])
+        ops = numpy.array([FORWARD, LEFT, LEFT, FORWARD, GOTO, SETHEADING])
+        args = numpy.array(
+            [[10, 0], [30, 0], [90, 0], [2, 0], [7, 8], [45, 0]], float)
+        path = numpy.empty((6, 6))
+        touched = numpy_apply_commands(model, index, ops, args, path)
+        self.assertEqual(list(touched), [1, 2])
+        numpy.testing.assert_allclose(path, [
+            [5, 5, 5, 15, 90, 100],
+            [0, 0, 0, 0, 30, 30],
+            [5, 15, 5, 15, 180, 190],
+            [5, 15, 3, 15, 180, 190],
+            [3, 15, 7, 8, 180, 190],
+            [7, 8, 7, 8, 45, 55],
+        ], atol=1e-6)
+        numpy.testing.assert_allclose(
+            model[1, 0:6], [7, 8, 0, 0, 45, 55], atol=1e-6)
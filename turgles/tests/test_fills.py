@@ -0,0 +1,270 @@
+from math import cos, pi, sin
+from unittest import TestCase, skipIf
+
+from turgles.buffer import BufferManager
+from turgles.commands import CommandQueue
+from turgles.fills import VERTEX_SIZE, Fills, triangulate
+from turgles.memory import numpy, TURTLE_MODEL_DATA_SIZE
+
+# pen rgba 0.1-0.4, fill 0.5-0.8, width 2
+COLOR = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 2.0]
+
+SQUARE = [0, 0, 10, 0, 10, 10, 0, 10]
+# an L, with a reflex corner at 5, 5
+ELL = [0, 0, 10, 0, 10, 5, 5, 5, 5, 10, 0, 10]
+
+
+def area(points):
+    """The area of a polygon, positive if anticlockwise"""
+    xs, ys = points[0::2], points[1::2]
+    return sum(
+        xs[i - 1] * ys[i] - xs[i] * ys[i - 1] for i in range(len(xs))) / 2
+
+
+def triangle_areas(points, triangles):
+    return [
+        area([points[2 * i + j] for i in triangles[t:t + 3] for j in (0, 1)])
+        for t in range(0, len(triangles), 3)
+    ]
+
+
+class TriangulateTestCase(TestCase):
+
+    def assert_fills(self, points, expected_area, expected_triangles):
+        triangles = triangulate(points)
+        self.assertEqual(len(triangles), 3 * expected_triangles)
+        areas = triangle_areas(points, triangles)
+        self.assertTrue(all(a > 0 for a in areas), areas)
+        self.assertEqual(sum(areas), expected_area)
+
+    def test_square(self):
+        self.assert_fills(SQUARE, 100, 2)
+
+    def test_clockwise(self):
+        points = []
+        for i in range(len(SQUARE) - 2, -1, -2):
+            points.extend(SQUARE[i:i + 2])
+        self.assert_fills(points, 100, 2)
+
+    def test_concave(self):
+        self.assert_fills(ELL, 75, 4)
+        # no triangle may cover the notch
+        triangles = triangulate(ELL)
+        for t in range(0, len(triangles), 3):
+            xs = [ELL[2 * i] for i in triangles[t:t + 3]]
+            ys = [ELL[2 * i + 1] for i in triangles[t:t + 3]]
+            self.assertFalse(min(xs) >= 5 and min(ys) >= 5)
+
+    def test_star(self):
+        star = [0, 10, 2, 2, 10, 0, 2, -2, 0, -10, -2, -2, -10, 0, -2, 2]
+        self.assert_fills(star, 80, 6)
+
+    def test_circle(self):
+        n = 360
+        points = []
+        for i in range(n):
+            points.extend((cos(2 * pi * i / n), sin(2 * pi * i / n)))
+        triangles = triangulate(points)
+        self.assertEqual(len(triangles), 3 * (n - 2))
+        areas = triangle_areas(points, triangles)
+        self.assertTrue(all(a > 0 for a in areas))
+        self.assertAlmostEqual(sum(areas), area(points), places=4)
+
+    def test_many_reflex_vertices(self):
+        # a star with 100 points, so half its vertices are reflex
+        n = 200
+        points = []
+        for i in range(n):
+            r = 10 if i % 2 else 4
+            points.extend((r * cos(2 * pi * i / n), r * sin(2 * pi * i / n)))
+        triangles = triangulate(points)
+        self.assertEqual(len(triangles), 3 * (n - 2))
+        areas = triangle_areas(points, triangles)
+        self.assertTrue(all(a > 0 for a in areas))
+        self.assertAlmostEqual(sum(areas), area(points), places=4)
+
+    def test_repeated_and_closing_points(self):
+        points = [0, 0, 0, 0, 10, 0, 10, 10, 10, 10, 0, 10, 0, 0]
+        self.assert_fills(points, 100, 2)
+
+    def test_collinear(self):
+        points = [0, 0, 5, 0, 10, 0, 10, 10, 0, 10]
+        self.assert_fills(points, 100, 3)
+
+    def test_degenerate(self):
+        self.assertEqual(triangulate([]), [])
+        self.assertEqual(triangulate([0, 0, 1, 1]), [])
+        self.assertEqual(triangulate([0, 0, 1, 1, 2, 2]), [])
+        self.assertEqual(triangulate([0, 0, 1, 1, 0, 0]), [])
+
+
+class FillsTestCase(TestCase):
+
+    def setUp(self):
+        self.fills = Fills(2)
+
+    def fill(self, owner, points):
+        self.fills.begin(owner, points[0], points[1])
+        for i in range(2, len(points), 2):
+            self.fills.moved_to(owner, points[i], points[i + 1])
+        return self.fills.end(owner, COLOR)
+
+    def vertices(self, id):
+        """A fill's vertices' x, y, by its triangles"""
+        fills = self.fills
+        start = fills.triangle_start[id] * 3
+        count = fills.triangle_count[id] * 3
+        return [
+            tuple(fills.vertices.get(i)[0:2])
+            for i in fills.triangles.data[start:start + count]
+        ]
+
+    def test_fill(self):
+        self.assertEqual(self.fill(3, SQUARE), 0)
+        self.assertFalse(self.fills.isfilling(3))
+        self.assertEqual(self.fill(3, ELL), 1)
+        self.assertEqual(len(self.fills), 2)
+        self.assertIn(1, self.fills)
+        self.assertNotIn(2, self.fills)
+        self.assertEqual(self.fills.vertices.count, 10)
+        self.assertEqual(self.fills.triangles.count, 6)
+        vertex = self.fills.vertices.get(4)
+        self.assertEqual(
+            [round(v, 4) for v in vertex],
+            [0, 0, 0.5, 0.6, 0.7, 0.8])
+        self.assertEqual(len(vertex), VERTEX_SIZE)
+        self.assertTrue(all(v[0] >= 0 for v in self.vertices(1)))
+        self.assertEqual(list(self.fills.owned[3]), [0, 1])
+
+    def test_nothing_to_fill(self):
+        self.assertIsNone(self.fills.end(0, COLOR))
+        self.assertIsNone(self.fill(0, [0, 0, 5, 5]))
+        self.assertEqual(len(self.fills), 0)
+
+    def test_forget(self):
+        self.fills.begin(0, 10, 0)
+        self.fills.forget(0)
+        self.assertFalse(self.fills.isfilling(0))
+        self.assertIsNone(self.fills.end(0, COLOR))
+        self.fills.forget(1)
+        self.assertEqual(self.fill(0, SQUARE), 0)
+
+    def test_clear_and_compact(self):
+        self.fill(0, SQUARE)
+        ell = self.fill(1, ELL)
+        self.fill(0, [20, 20, 30, 20, 30, 30])
+        before = self.vertices(ell)
+        self.fills.triangles.clear_dirty()
+        self.fills.vertices.clear_dirty()
+        self.assertEqual(self.fills.clear_owned(0), 2)
+        self.assertFalse(self.fills.clear(0))
+        self.assertEqual(self.fills.clear_owned(0), 0)
+        self.fills.compact()
+        self.assertEqual(len(self.fills), 1)
+        self.assertEqual(self.fills.vertices.count, 6)
+        self.assertEqual(self.fills.triangles.count, 4)
+        self.assertEqual(self.vertices(ell), before)
+        self.assertEqual(self.fills.vertices.dirty_ranges(), [(0, 6)])
+        self.assertEqual(self.fills.triangles.dirty_ranges(), [(0, 4)])
+        # ids are stable
+        self.assertEqual(self.fill(2, SQUARE), 3)
+        self.assertTrue(self.fills.clear(ell))
+        self.fills.compact()
+        self.assertEqual(self.fills.vertices.count, 4)
+        self.assertEqual(self.fills.vertex_start[3], 0)
+        self.assertEqual(
+            set(self.vertices(3)), set([(0, 0), (10, 0), (10, 10), (0, 10)]))
+
+    def test_compact_nothing_moved(self):
+        self.fill(0, SQUARE)
+        self.fill(1, SQUARE)
+        self.fills.vertices.clear_dirty()
+        self.fills.clear(1)
+        self.fills.compact()
+        self.assertEqual(self.fills.vertices.count, 4)
+        self.assertEqual(self.fills.vertices.dirty_ranges(), [])
+
+
+class CommandFillTests(object):
+
+    use_numpy = None
+
+    def test_commands_fill_path(self):
+        manager = BufferManager(4)
+        fills = Fills()
+        commands = CommandQueue(manager, self.use_numpy, fills=fills)
+        for id in (0, 1):
+            model = [0.0] * TURTLE_MODEL_DATA_SIZE
+            manager.create_turtle(id, 'classic', model, COLOR)
+        fills.begin(0, 0, 0)
+        for id in (0, 1):
+            commands.forward(id, 10)
+            commands.left(id, 90)
+            commands.forward(id, 10)
+            commands.goto(id, 0, 10)
+        commands.execute()
+        self.assertEqual(
+            [round(v, 4) for v in fills.paths[0]],
+            [0, 0, 10, 0, 10, 10, 0, 10])
+        self.assertNotIn(1, fills.paths)
+        id = fills.end(0, COLOR)
+        self.assertEqual(id, 0)
+        self.assertEqual(fills.triangles.count, 2)
+
+    def test_fill_commands_in_order(self):
+        manager = BufferManager(4)
+        fills = Fills()
+        commands = CommandQueue(manager, self.use_numpy, fills=fills)
+        for id in (0, 1):
+            model = [0.0] * TURTLE_MODEL_DATA_SIZE
+            manager.create_turtle(id, 'classic', model, COLOR)
+        color = list(COLOR)
+        commands.forward(0, 10)
+        commands.begin_fill(0)
+        commands.begin_fill(1)
+        commands.goto(0, 20, 10)
+        commands.goto(1, 5, 5)
+        commands.goto(0, 10, 10)
+        commands.end_fill(0, color)
+        commands.goto(0, 0, 0)
+        self.assertFalse(commands.isfilling(0))
+        self.assertTrue(commands.isfilling(1))
+        self.assertFalse(fills.isfilling(1))
+        # filled with the color it had when queued
+        color[4] = 0.0
+        commands.execute()
+        self.assertEqual(len(fills), 1)
+        self.assertEqual(
+            [round(v, 4) for v in fills.vertices.get(0)],
+            [10, 0, 0.5, 0.6, 0.7, 0.8])
+        self.assertEqual(fills.vertices.count, 3)
+        self.assertEqual([round(v, 4) for v in fills.paths[1]], [0, 0, 5, 5])
+        self.assertTrue(commands.isfilling(1))
+
+    def test_clear_command_in_order(self):
+        manager = BufferManager(4)
+        fills = Fills()
+        commands = CommandQueue(manager, self.use_numpy, fills=fills)
+        model = [0.0] * TURTLE_MODEL_DATA_SIZE
+        manager.create_turtle(0, 'classic', model, COLOR)
+        self.assertEqual(fills.add(0, SQUARE, [0, 1, 2], COLOR), 0)
+        for clear in (True, False):
+            commands.begin_fill(0)
+            commands.goto(0, 10, 0)
+            commands.goto(0, 10, 10)
+            commands.end_fill(0, COLOR)
+            commands.goto(0, 0, 0)
+            if clear:
+                commands.clear(0)
+        commands.execute()
+        self.assertEqual(len(fills), 1)
+        self.assertIn(2, fills)
+
+
+class PythonCommandFillTestCase(CommandFillTests, TestCase):
+    use_numpy = False
+
+
+@skipIf(numpy is None, "requires numpy")
+class NumpyCommandFillTestCase(CommandFillTests, TestCase):
+    use_numpy = True
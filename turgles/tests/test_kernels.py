@@ -0,0 +1,110 @@
+from time import sleep
+from unittest import TestCase
+
+from turgles import config
+from turgles import kernels
+from turgles.buffer import ShapeBuffer
+from turgles.memory import TURTLE_MODEL_DATA_SIZE, TURTLE_COLOR_DATA_SIZE
+
+
+def make_update(delay, calls):
+    def update(dt, buffers, tick=0, seed=None):
+        calls.append(list(buffers))
+        for b in buffers:
+            b.model.data[0] += 1
+        sleep(delay)
+    return update
+
+
+class KernelRegistryTestCase(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        kernels.register('test', 'slow', make_update(0.01, self.calls))
+        kernels.register('test', 'fast', make_update(0, self.calls))
+        kernels.register('test', 'slower', make_update(0.02, self.calls))
+
+    def tearDown(self):
+        del kernels.KERNELS['test']
+        kernels.FALLBACKS.pop('test', None)
+        kernels.SELECTED.pop('test', None)
+        config.kernels.pop('test', None)
+
+    def make_buffer(self):
+        buffer = ShapeBuffer('classic', 4)
+        buffer.new(0, [0] * TURTLE_MODEL_DATA_SIZE,
+                   [0] * TURTLE_COLOR_DATA_SIZE)
+        return buffer
+
+    def test_register_decorator(self):
+        @kernels.register('test', 'decorated')
+        def update(dt, buffers, tick=0, seed=None):
+            pass
+        self.assertIs(kernels.available('test')['decorated'], update)
+
+    def test_available_unknown(self):
+        with self.assertRaises(KeyError):
+            kernels.available('no such simulation')
+
+    def test_select_default_is_last_registered(self):
+        update = kernels.select('test')
+        self.assertIs(update, kernels.available('test')['slower'])
+        self.assertEqual(kernels.SELECTED['test'][0], 'slower')
+
+    def test_select_variant(self):
+        update = kernels.select('test', variant='slow')
+        self.assertIs(update, kernels.available('test')['slow'])
+
+    def test_select_unknown_variant(self):
+        with self.assertRaises(KeyError):
+            kernels.select('test', variant='no such variant')
+
+    def test_select_from_config(self):
+        config.kernels['test'] = 'slow'
+        update = kernels.select('test', [self.make_buffer()])
+        self.assertIs(update, kernels.available('test')['slow'])
+        self.assertEqual(self.calls, [])
+
+    def test_select_calibrates(self):
+        update = kernels.select('test', [self.make_buffer()])
+        self.assertIs(update, kernels.available('test')['fast'])
+
+    def test_calibrate_uses_copies(self):
+        buffer = self.make_buffer()
+        timings = kernels.calibrate('test', [buffer], ticks=2)
+        self.assertEqual(
+            [variant for _, variant in timings], ['fast', 'slow', 'slower'])
+        self.assertEqual(len(self.calls), 6)
+        self.assertTrue(all(buffer not in call for call in self.calls))
+        self.assertEqual(buffer.model.data[0], 0)
+
+    def test_calibrate_samples(self):
+        buffer = ShapeBuffer('classic', 4)
+        buffer.extend(range(30))
+        other = ShapeBuffer('square', 4)
+        other.extend(range(30, 40))
+        kernels.calibrate('test', [buffer, other], ticks=1, size=8)
+        for call in self.calls:
+            self.assertEqual([b.count for b in call], [6, 2])
+
+    def test_calibrate_skips_fallbacks(self):
+        kernels.register(
+            'test', 'python', make_update(0, self.calls), fallback=True)
+        timings = kernels.calibrate('test', [self.make_buffer()], ticks=1)
+        self.assertNotIn('python', [variant for _, variant in timings])
+        self.assertEqual(len(self.calls), 3)
+
+    def test_calibrate_only_fallbacks(self):
+        kernels.register(
+            'only', 'python', make_update(0, self.calls), fallback=True)
+        try:
+            update = kernels.select('only', [self.make_buffer()])
+            self.assertIs(update, kernels.available('only')['python'])
+            self.assertEqual(len(self.calls), 3)
+        finally:
+            del kernels.KERNELS['only']
+            del kernels.FALLBACKS['only']
+            kernels.SELECTED.pop('only', None)
+
+    def test_load_library_missing(self):
+        self.assertIsNone(kernels.load_library('libmissing.so'))
@@ -0,0 +1,223 @@
+import os
+import subprocess
+import sys
+from math import cos, sin, radians
+from unittest import TestCase, skipIf
+
+from turgles.buffer import ShapeBuffer
+from turgles.memory import numpy, TURTLE_COLOR_DATA_SIZE
+from turgles import random_walk
+from turgles.random_walk import (
+    fast,
+    fast_update,
+    numpy_walk,
+    numpy_update,
+    parallel_update,
+    slow_update,
+    walk,
+)
+
+
+def turtle(x, y, heading):
+    t = radians(heading)
+    return [x, y, 1, 1, heading, heading, cos(t), sin(t), cos(t), sin(t),
+            0, 0, 0, 0, 0, 0]
+
+
+@skipIf(numpy is None, "requires numpy")
+class NumpyWalkTestCase(TestCase):
+
+    def make_buffer(self, *turtles):
+        buffer = ShapeBuffer('classic', len(turtles))
+        for id, data in enumerate(turtles):
+            buffer.new(id, data, [0] * TURTLE_COLOR_DATA_SIZE)
+        return buffer
+
+    def test_walk_straight(self):
+        buffer = self.make_buffer(turtle(0, 0, 0), turtle(10, 10, 90))
+        numpy_walk(buffer.model_view, 5.0, 100, 100, 0)
+        view = buffer.model_view
+        self.assertAlmostEqual(view['x'][0], 5.0, places=5)
+        self.assertAlmostEqual(view['y'][0], 0.0, places=5)
+        self.assertAlmostEqual(view['x'][1], 10.0, places=5)
+        self.assertAlmostEqual(view['y'][1], 15.0, places=5)
+        self.assertAlmostEqual(view['heading'][1], 90.0, places=5)
+        self.assertAlmostEqual(view['sin_heading'][1], 1.0, places=5)
+
+    def test_bounce(self):
+        buffer = self.make_buffer(turtle(150, 0, 0))
+        numpy_walk(buffer.model_view, 5.0, 100, 100, 0)
+        view = buffer.model_view
+        self.assertAlmostEqual(view['heading'][0], 180.0, places=5)
+        self.assertAlmostEqual(view['cos_heading'][0], -1.0, places=5)
+        self.assertAlmostEqual(view['x'][0], 145.0, places=4)
+
+    def test_turn_within_degrees(self):
+        buffer = self.make_buffer(*[turtle(0, 0, 45)] * 100)
+        numpy_walk(buffer.model_view, 1.0, 100, 100, 4.0)
+        headings = buffer.model_view['heading']
+        self.assertTrue(numpy.all(headings >= 41.0))
+        self.assertTrue(numpy.all(headings <= 49.0))
+
+
+class BounceTestCase(TestCase):
+    """Every kernel bounces off the sides at half_w and the top and bottom
+    at half_h"""
+
+    turtles = [turtle(150, 0, 0), turtle(0, 150, 0), turtle(250, 0, 0)]
+
+    def make_buffer(self):
+        buffer = ShapeBuffer('classic', len(self.turtles))
+        for id, data in enumerate(self.turtles):
+            buffer.new(id, data, [0] * TURTLE_COLOR_DATA_SIZE)
+        return buffer
+
+    def assert_bounced(self, headings):
+        self.assertEqual([round(h, 4) for h in headings], [0, 180, 180])
+
+    def test_python(self):
+        buffer = self.make_buffer()
+        walk(buffer.model.data, buffer.count, 1.0, 200, 100, 0)
+        self.assert_bounced(
+            [buffer.model.get(i)[4] for i in range(buffer.count)])
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_numpy(self):
+        buffer = self.make_buffer()
+        numpy_walk(buffer.model_view, 1.0, 200, 100, 0)
+        self.assert_bounced(buffer.model_view['heading'].tolist())
+
+    @skipIf(not fast, "requires libfast.so")
+    def test_c(self):
+        buffer = self.make_buffer()
+        fast.random_walk_all(buffer.model.data, buffer.count, 1.0, 200, 100, 0)
+        self.assert_bounced(
+            [buffer.model.get(i)[4] for i in range(buffer.count)])
+
+
+class SeededWalkTestCase(TestCase):
+
+    def make_buffer(self, ids):
+        buffer = ShapeBuffer('classic', len(ids))
+        for id in ids:
+            buffer.new(id, turtle(id, -id, id * 10),
+                       [0] * TURTLE_COLOR_DATA_SIZE)
+        return buffer
+
+    def walk(self, update, ids, tick=0, seed=1):
+        buffer = self.make_buffer(ids)
+        update(1.0, [buffer], tick, seed)
+        return dict(
+            (id, list(buffer.get_model(id)[0:8])) for id in ids)
+
+    def assert_order_independent(self, update):
+        ids = list(range(10))
+        forwards = self.walk(update, ids)
+        backwards = self.walk(update, ids[::-1])
+        self.assertEqual(forwards, backwards)
+        self.assertEqual(forwards, self.walk(update, ids))
+        self.assertNotEqual(forwards, self.walk(update, ids, seed=2))
+        self.assertNotEqual(forwards, self.walk(update, ids, tick=1))
+
+    def test_slow_update_replays(self):
+        self.assert_order_independent(slow_update)
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_numpy_update_replays(self):
+        self.assert_order_independent(numpy_update)
+
+
+@skipIf(not fast, "requires libfast.so")
+class ParallelWalkTestCase(TestCase):
+
+    def tearDown(self):
+        random_walk.shutdown_pool()
+
+    def make_buffer(self, count):
+        buffer = ShapeBuffer('classic', count)
+        buffer.extend(range(count))
+        for index in range(count):
+            model = buffer.model.get(index)
+            model[0] = index % 500 - 250
+            model[4] = index % 360
+        return buffer
+
+    def test_matches_fast_update(self):
+        # more turtles than one job, so they're walked across threads
+        count = 3 * random_walk.MIN_JOB_SIZE + 10
+        serial = self.make_buffer(count)
+        threaded = self.make_buffer(count)
+        for tick in range(3):
+            fast_update(1.0, [serial], tick, seed=7)
+            parallel_update(1.0, [threaded], tick, seed=7, workers=3)
+        length = count * serial.model.chunk_size
+        self.assertEqual(
+            list(serial.model.data[0:length]),
+            list(threaded.model.data[0:length]))
+
+    def test_replaced_pool_is_closed(self):
+        buffer = self.make_buffer(10)
+        parallel_update(1.0, [buffer], workers=2)
+        pool = random_walk._pool
+        parallel_update(1.0, [buffer], workers=3)
+        self.assertIsNot(random_walk._pool, pool)
+        with self.assertRaises(ValueError):
+            pool.map(abs, [1])
+        random_walk.shutdown_pool()
+        self.assertIsNone(random_walk._pool)
+
+
+class StubPool(object):
+    """Records what's done to it, in place of a ThreadPool"""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def close(self):
+        self.calls.append('close')
+
+    def join(self):
+        self.calls.append('join')
+
+
+# installs a StubPool printing its calls, and exits, to shut it down
+EXIT_SCRIPT = """
+from turgles import random_walk
+
+class StubPool(object):
+    def close(self):
+        print('close')
+
+    def join(self):
+        print('join')
+
+random_walk._pool = StubPool()
+random_walk._pool_size = 2
+"""
+
+
+class ShutdownPoolTestCase(TestCase):
+
+    def tearDown(self):
+        random_walk._pool = random_walk._pool_size = None
+
+    def test_shutdown_pool(self):
+        calls = []
+        random_walk._pool = StubPool(calls)
+        random_walk._pool_size = 2
+        random_walk.shutdown_pool()
+        self.assertEqual(calls, ['close', 'join'])
+        self.assertIsNone(random_walk._pool)
+        self.assertIsNone(random_walk._pool_size)
+        # nothing left to shut down
+        random_walk.shutdown_pool()
+        self.assertEqual(calls, ['close', 'join'])
+
+    def test_shut_down_at_exit(self):
+        root = os.path.dirname(os.path.dirname(random_walk.__file__))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [root] + [p for p in [env.get('PYTHONPATH')] if p])
+        output = subprocess.check_output(
+            [sys.executable, '-c', EXIT_SCRIPT], env=env)
+        self.assertEqual(output.split(), [b'close', b'join'])
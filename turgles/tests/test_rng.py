@@ -0,0 +1,29 @@
+from unittest import TestCase, skipIf
+
+from turgles.memory import numpy
+from turgles.rng import hash_random, numpy_hash_random
+
+
+class HashRandomTestCase(TestCase):
+
+    def test_repeatable(self):
+        self.assertEqual(hash_random(1, 2, 3), hash_random(1, 2, 3))
+
+    def test_keyed_on_all_inputs(self):
+        r = hash_random(1, 2, 3)
+        self.assertNotEqual(r, hash_random(0, 2, 3))
+        self.assertNotEqual(r, hash_random(1, 0, 3))
+        self.assertNotEqual(r, hash_random(1, 2, 0))
+
+    def test_range(self):
+        values = [hash_random(0, id, 0) for id in range(10000)]
+        self.assertTrue(all(0 <= v < 1 for v in values))
+        self.assertAlmostEqual(sum(values) / len(values), 0.5, places=1)
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_numpy_matches_python(self):
+        ids = numpy.arange(1000)
+        values = numpy_hash_random(42, ids, 7)
+        self.assertEqual(values.dtype, numpy.float32)
+        expected = [hash_random(42, id, 7) for id in range(1000)]
+        self.assertEqual(values.tolist(), expected)
@@ -0,0 +1,110 @@
+from unittest import TestCase
+
+from turgles import scheduler
+from turgles.buffer import BufferManager
+from turgles.commands import CommandQueue
+from turgles.memory import TURTLE_MODEL_DATA_SIZE, TURTLE_COLOR_DATA_SIZE
+from turgles.scheduler import FixedStepScheduler, save_previous
+
+COLOR = [0] * TURTLE_COLOR_DATA_SIZE
+
+
+def turtle(x, y, ct, st):
+    model = [0.0] * TURTLE_MODEL_DATA_SIZE
+    model[0:2] = [x, y]
+    model[6:8] = [ct, st]
+    return model
+
+
+class SavePreviousTestCase(TestCase):
+
+    def make_buffer(self):
+        manager = BufferManager(4)
+        manager.create_turtle(0, 'classic', turtle(1, 2, 0.5, -0.5), COLOR)
+        manager.create_turtle(1, 'classic', turtle(3, 4, 1.0, 0.0), COLOR)
+        buffer = manager.get_buffer('classic')
+        buffer.model.clear_dirty()
+        return buffer
+
+    def assert_saved(self, buffer):
+        self.assertEqual(
+            list(buffer.get_model(0)[11:16]), [1, 2, 0.5, -0.5, 1])
+        self.assertEqual(list(buffer.get_model(1)[11:16]), [3, 4, 1, 0, 1])
+        self.assertEqual(buffer.model.dirty_ranges(), [(0, 2)])
+
+    def test_save_previous(self):
+        buffer = self.make_buffer()
+        save_previous(buffer)
+        self.assert_saved(buffer)
+
+    def test_save_previous_without_numpy(self):
+        numpy = scheduler.numpy
+        scheduler.numpy = None
+        try:
+            buffer = self.make_buffer()
+            save_previous(buffer)
+            self.assert_saved(buffer)
+        finally:
+            scheduler.numpy = numpy
+
+
+class FixedStepSchedulerTestCase(TestCase):
+
+    def setUp(self):
+        self.manager = BufferManager(4)
+        self.manager.create_turtle(0, 'classic', turtle(0, 0, 1, 0), COLOR)
+        self.calls = []
+
+    def update(self, dt, buffers, tick=0, seed=None):
+        self.calls.append((dt, tick, seed))
+        for buffer in buffers:
+            buffer.model.data[0] += 1
+
+    def test_steps(self):
+        stepper = FixedStepScheduler(self.manager, self.update, 0.1, seed=3)
+        self.assertAlmostEqual(stepper.advance(0.05), 0.5)
+        self.assertEqual(self.calls, [])
+        self.assertAlmostEqual(stepper.advance(0.2), 0.5)
+        self.assertEqual(self.calls, [(0.1, 0, 3), (0.1, 1, 3)])
+        self.assertEqual(stepper.tick, 2)
+
+    def test_saves_previous_before_step(self):
+        stepper = FixedStepScheduler(self.manager, self.update, 0.1)
+        stepper.advance(0.1)
+        model = self.manager.get_buffer('classic').get_model(0)
+        self.assertEqual(model[0], 1)
+        self.assertEqual(model[11], 0)
+        self.assertEqual(model[15], 1)
+
+    def test_drops_steps_under_load(self):
+        stepper = FixedStepScheduler(
+            self.manager, self.update, 0.1, max_steps=2)
+        stepper.advance(0.55)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(stepper.dropped, 3)
+        self.assertAlmostEqual(stepper.alpha, 0.5)
+
+    def test_swaps_each_step_when_double_buffered(self):
+        manager = BufferManager(4, double=True)
+        manager.create_turtle(0, 'classic', turtle(0, 0, 1, 0), COLOR)
+        buffer = manager.get_buffer('classic')
+        stepper = FixedStepScheduler(manager, self.update, 0.1)
+        stepper.advance(0.1)
+        self.assertEqual(buffer.front_model.get(0)[0], 1)
+        stepper.advance(0.1)
+        self.assertEqual(buffer.front_model.get(0)[0], 2)
+
+    def test_executes_commands_before_saving_previous(self):
+        commands = CommandQueue(self.manager)
+        stepper = FixedStepScheduler(
+            self.manager, self.update, 0.1, commands=commands)
+        self.assertTrue(commands.on_tick)
+        commands.goto(0, 5, 7)
+        stepper.advance(0.05)
+        self.assertEqual(len(commands), 1)
+        stepper.advance(0.05)
+        self.assertEqual(len(commands), 0)
+        model = self.manager.get_buffer('classic').get_model(0)
+        # previous is where the command left it, then the update moved it
+        self.assertEqual(list(model[0:2]), [6, 7])
+        self.assertEqual(list(model[11:13]), [5, 7])
@@ -1,6 +1,11 @@
 from unittest import TestCase
 
 from turgles.gl.program import Program, ShaderError
+from turgles.es_renderer import (
+    calculate_batch_size,
+    set_array_size,
+    BATCH_SIZE,
+)
 
 VERTEX = """
 uniform vec4 model;
@@ -64,3 +69,33 @@ class ShadersTestCase(TestCase):
             vertex='turgles/shaders/turtles.vert',
             fragment='turgles/shaders/turtles.frag',
         )
+
+    def test_es_vertex_shader_compiles(self):
+        self.assert_compiles(
+            vertex='turgles/shaders/turtles_es.vert',
+            fragment='turgles/shaders/turtles.frag',
+        )
+
+    def test_es_vertex_shader_array_size(self):
+        with open('turgles/shaders/turtles_es.vert') as f:
+            vertex = set_array_size(f.read(), 10)
+        with open('turgles/shaders/turtles.frag') as f:
+            fragment = f.read()
+        program = Program(vertex, fragment)
+        self.assertEqual(program.uniforms['turtle_model_array[0]'].size, 10)
+
+
+class BatchSizeTestCase(TestCase):
+
+    def test_default_batch_size(self):
+        self.assertEqual(BATCH_SIZE, 35)
+        self.assertEqual(calculate_batch_size(1024), 35)
+
+    def test_larger_batch_size(self):
+        self.assertEqual(calculate_batch_size(4096), 145)
+
+    def test_set_array_size(self):
+        source = set_array_size('#version 120\nvoid main() {}', 7)
+        self.assertEqual(
+            source.split('\n'),
+            ['#version 120', '#define ARRAY_SIZE 7', 'void main() {}'])
@@ -0,0 +1,98 @@
+from random import Random
+from unittest import TestCase, skipIf
+
+from turgles.buffer import BufferManager
+from turgles.memory import numpy, TURTLE_MODEL_DATA_SIZE
+from turgles.spatial import SpatialGrid, expand_ranges
+
+
+def turtle(x, y):
+    model = [0.0] * TURTLE_MODEL_DATA_SIZE
+    model[0:2] = [x, y]
+    return model
+
+
+class SpatialGridTests(object):
+
+    use_numpy = None
+
+    def setUp(self):
+        random = Random(1)
+        self.manager = BufferManager(16)
+        self.positions = {}
+        for id in range(300):
+            x = random.uniform(-100, 100)
+            y = random.uniform(-100, 100)
+            shape = ('classic', 'square', 'circle')[id % 3]
+            self.manager.create_turtle(id, shape, turtle(x, y), None)
+            self.positions[id] = (x, y)
+
+    def make_grid(self, cell_size=10):
+        grid = SpatialGrid(cell_size, use_numpy=self.use_numpy)
+        grid.build(self.manager.buffers.values())
+        return grid
+
+    def brute_radius(self, x, y, r):
+        return sorted(
+            id for id, (tx, ty) in self.positions.items()
+            if (tx - x) ** 2 + (ty - y) ** 2 <= r * r)
+
+    def test_count(self):
+        self.assertEqual(self.make_grid().count, 300)
+
+    def test_query_radius(self):
+        grid = self.make_grid()
+        for x, y, r in [(0, 0, 10), (50, -20, 25), (-99, 99, 5), (0, 0, 500)]:
+            found = sorted(grid.query_radius(x, y, r))
+            self.assertEqual(found, self.brute_radius(x, y, r))
+
+    def test_query_rect(self):
+        grid = self.make_grid(7)
+        expected = sorted(
+            id for id, (x, y) in self.positions.items()
+            if -30 <= x <= 15 and 5 <= y <= 60)
+        self.assertEqual(sorted(grid.query_rect(-30, 5, 15, 60)), expected)
+
+    def test_query_outside(self):
+        grid = self.make_grid()
+        self.assertEqual(len(grid.query_rect(500, 500, 600, 600)), 0)
+        self.assertEqual(len(grid.query_radius(-500, 0, 10)), 0)
+
+    def test_skips_removed(self):
+        for id in range(0, 300, 2):
+            self.manager.destroy_turtle(id)
+            del self.positions[id]
+        grid = self.make_grid()
+        self.assertEqual(grid.count, 150)
+        self.assertEqual(
+            sorted(grid.query_radius(0, 0, 50)), self.brute_radius(0, 0, 50))
+
+    def test_empty(self):
+        grid = SpatialGrid(10, use_numpy=self.use_numpy)
+        grid.build([])
+        self.assertEqual(grid.count, 0)
+        self.assertEqual(len(grid.query_radius(0, 0, 10)), 0)
+
+
+class PythonSpatialGridTestCase(SpatialGridTests, TestCase):
+    use_numpy = False
+
+
+@skipIf(numpy is None, "requires numpy")
+class NumpySpatialGridTestCase(SpatialGridTests, TestCase):
+    use_numpy = True
+
+    def test_expand_ranges(self):
+        ranges = expand_ranges(numpy.array([5, 2, 9]), numpy.array([8, 2, 11]))
+        self.assertEqual(ranges.tolist(), [5, 6, 7, 9, 10])
+
+    def test_pairs(self):
+        grid = self.make_grid(10)
+        i, j = grid.pairs(15)
+        found = sorted(zip(grid.ids[i].tolist(), grid.ids[j].tolist()))
+        expected = sorted(
+            (a, b)
+            for a, (ax, ay) in self.positions.items()
+            for b, (bx, by) in self.positions.items()
+            if a != b and (ax - bx) ** 2 + (ay - by) ** 2 <= 15 * 15)
+        self.assertEqual(found, expected)
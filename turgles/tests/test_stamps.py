@@ -0,0 +1,126 @@
+from unittest import TestCase
+
+from turgles.memory import TURTLE_MODEL_DATA_SIZE, TURTLE_COLOR_DATA_SIZE
+from turgles.stamps import Stamps
+
+COLOR = [0.5] * TURTLE_COLOR_DATA_SIZE
+
+
+def turtle(x):
+    return [float(x)] * TURTLE_MODEL_DATA_SIZE
+
+
+class StampsTestCase(TestCase):
+
+    def setUp(self):
+        self.stamps = Stamps(4)
+
+    def stamp(self, owner, x, shape='classic'):
+        return self.stamps.stamp(owner, shape, turtle(x), COLOR)
+
+    def live(self):
+        return sorted(
+            self.stamps.stamp_of[slot]
+            for buffer in self.stamps.buffers.values()
+            for slot in buffer.slots.id_of[0:buffer.count]
+            if slot in buffer.slots)
+
+    def test_stamp(self):
+        self.assertEqual(self.stamp(0, 3), 0)
+        self.assertEqual(self.stamp(1, 4, 'square'), 1)
+        self.assertEqual(len(self.stamps), 2)
+        self.assertIn(1, self.stamps)
+        self.assertNotIn(2, self.stamps)
+        model, color = self.stamps.get(1)
+        self.assertEqual(list(model[0:15]), [4] * 15)
+        self.assertEqual(model[15], 0)
+        self.assertEqual(list(color), COLOR)
+        self.assertEqual(self.stamps.buffers['square'].count, 1)
+
+    def test_hidden_until_placed(self):
+        self.stamp(0, 1)
+        id = self.stamps.stamp(0, 'classic', turtle(2), COLOR, True)
+        buffer = self.stamps.buffers['classic']
+        self.assertEqual(buffer.visible_count, 1)
+        self.assertTrue(self.stamps.place(id, turtle(5)))
+        self.assertEqual(buffer.visible_count, 2)
+        model, color = self.stamps.get(id)
+        self.assertEqual(list(model[0:15]), [5] * 15)
+        self.assertEqual(model[15], 0)
+        self.stamps.clear(id)
+        self.assertFalse(self.stamps.place(id, turtle(6)))
+
+    def test_stamp_copies(self):
+        data = turtle(1)
+        self.stamps.stamp(0, 'classic', data, COLOR)
+        data[0] = 2
+        self.assertEqual(self.stamps.get(0)[0][0], 1)
+
+    def test_clear(self):
+        self.stamp(0, 1)
+        self.stamp(0, 2)
+        self.assertTrue(self.stamps.clear(0))
+        self.assertFalse(self.stamps.clear(0))
+        self.assertFalse(self.stamps.clear(5))
+        self.stamps.compact()
+        self.assertEqual(self.live(), [1])
+        self.assertEqual(self.stamps.get(1)[0][0], 2)
+
+    def test_clear_owned(self):
+        for x in range(6):
+            self.stamp(x % 2, x)
+        self.assertEqual(self.stamps.clear_owned(0), 3)
+        self.assertEqual(self.stamps.clear_owned(0), 0)
+        self.stamps.compact()
+        self.assertEqual(self.live(), [1, 3, 5])
+        self.assertNotIn(0, self.stamps.owned)
+
+    def test_clear_owned_first_and_last(self):
+        for x in range(6):
+            self.stamp(0, x)
+        self.stamps.clear(1)
+        self.assertEqual(self.stamps.clear_owned(0, 2), 2)
+        self.assertEqual(list(self.stamps.owned[0]), [3, 4, 5])
+        self.assertEqual(self.stamps.clear_owned(0, -1), 1)
+        self.assertEqual(list(self.stamps.owned[0]), [3, 4])
+        self.stamps.compact()
+        self.assertEqual(self.live(), [3, 4])
+        for id in (3, 4):
+            self.assertEqual(self.stamps.get(id)[0][0], id)
+
+    def test_many_stamps_one_buffer_per_shape(self):
+        for x in range(100):
+            self.stamp(x % 3, x, ('classic', 'turtle')[x % 2])
+        self.assertEqual(sorted(self.stamps.buffers), ['classic', 'turtle'])
+        self.assertEqual(self.stamps.buffers['turtle'].count, 50)
+
+    def test_slots_reused(self):
+        for x in range(10):
+            self.stamp(0, x, ('classic', 'turtle')[x % 2])
+        for round in range(50):
+            self.stamps.clear_owned(0)
+            self.stamps.compact()
+            for x in range(10):
+                id = self.stamp(0, x, ('classic', 'turtle')[round % 2])
+        # ids keep counting up, but the buffers' maps don't grow
+        self.assertEqual(id, 509)
+        self.assertEqual(len(self.stamps.stamp_of), 10)
+        self.assertLessEqual(len(self.stamps.ids.index_of), 20)
+        self.assertEqual(len(self.stamps), 10)
+        self.assertEqual(self.stamps.get(id)[0][0], 9)
+        self.assertEqual(self.live(), list(range(500, 510)))
+
+    def test_reuse_before_compact(self):
+        self.stamp(0, 1)
+        self.stamp(0, 2)
+        self.stamps.clear(0)
+        self.assertEqual(self.stamp(0, 3, 'square'), 2)
+        self.stamps.compact()
+        self.assertEqual(self.live(), [1, 2])
+        self.assertEqual(self.stamps.get(1)[0][0], 2)
+        self.assertEqual(self.stamps.get(2)[0][0], 3)
+
+    def test_owned_tidied(self):
+        for x in range(200):
+            self.stamps.clear(self.stamp(0, x))
+        self.assertLess(len(self.stamps.owned[0]), 128)
@@ -0,0 +1,65 @@
+from unittest import TestCase, skipIf
+
+from turgles.buffer import ChunkBuffer
+from turgles.memory import ffi, numpy
+from turgles.render.sync import ModelSync
+
+
+class ModelSyncTests(object):
+
+    use_numpy = None
+
+    def setUp(self):
+        self.model = ChunkBuffer(4, 2)
+        self.model.extend(3, [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+        self.sync = ModelSync(self.use_numpy)
+        # as if uploaded
+        self.sync.synced_all(self.model, self.model.count)
+        self.model.clear_dirty()
+        # the GPU's copy, after it has moved everyone
+        self.gpu = ffi.new('float[8]', [10, 20, 30, 40, 50, 60, 0, 0])
+
+    def test_synced_all(self):
+        self.assertEqual(self.sync.count, 3)
+        self.assertEqual(list(self.sync.synced[0:6]), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(len(self.sync.synced), 8)
+
+    def test_changes(self):
+        self.assertEqual(self.sync.changes(self.model, 3), ([], []))
+        self.model.mark_dirty(1, 2)
+        self.model.new([7.0, 8.0])
+        self.assertEqual(
+            self.sync.changes(self.model, 4), ([(1, 2)], [(3, 4)]))
+        # only before stop
+        self.assertEqual(self.sync.changes(self.model, 3), ([(1, 2)], []))
+        self.model.mark_dirty(2, 4)
+        self.assertEqual(
+            self.sync.changes(self.model, 4), ([(1, 3)], [(3, 4)]))
+
+    def test_merge_keeps_gpu_slots_cpu_did_not_change(self):
+        # the CPU changes one slot of turtle 1, from its stale copy
+        self.model.data[3] = 9.0
+        self.sync.merge(self.model, self.gpu, 1, 2)
+        self.assertEqual(list(self.gpu[0:6]), [10, 20, 30, 9, 50, 60])
+        # the CPU now has the merged turtle, others are untouched
+        self.assertEqual(list(self.model.data[0:6]), [1, 2, 30, 9, 5, 6])
+        self.assertEqual(list(self.sync.synced[2:4]), [30, 9])
+        # the next change is compared to the merged data
+        self.model.data[2] = 31.0
+        self.gpu[3] = 41.0
+        self.sync.merge(self.model, self.gpu, 1, 2)
+        self.assertEqual(list(self.gpu[2:4]), [31, 41])
+
+    def test_uploaded(self):
+        self.model.new([7.0, 8.0])
+        self.sync.uploaded(self.model, 3, 4)
+        self.assertEqual(list(self.sync.synced[6:8]), [7, 8])
+
+
+class PythonModelSyncTestCase(ModelSyncTests, TestCase):
+    use_numpy = False
+
+
+@skipIf(numpy is None, "requires numpy")
+class NumpyModelSyncTestCase(ModelSyncTests, TestCase):
+    use_numpy = True
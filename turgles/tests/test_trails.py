@@ -0,0 +1,297 @@
+from unittest import TestCase, skipIf
+
+from turgles.buffer import BufferManager
+from turgles.commands import CommandQueue
+from turgles.memory import numpy, TURTLE_MODEL_DATA_SIZE
+from turgles.trails import MAX_OWNER, SEGMENT_SIZE, Trails, segment
+
+# pen rgba 0.1-0.4, fill 0.5-0.8, width 2
+COLOR = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 2.0]
+
+
+def turtle(x, y, heading=0.0):
+    model = [0.0] * TURTLE_MODEL_DATA_SIZE
+    model[0:2] = [x, y]
+    model[4:6] = [heading, heading]
+    return model
+
+
+def segments(*xs):
+    """Segments from x to x + 1, owned by x"""
+    data = []
+    for x in xs:
+        data.extend(segment(x, x, 0, x + 1, 0, COLOR))
+    return data
+
+
+class TrailsTestCase(TestCase):
+
+    def starts(self, trails):
+        """Each segment's start x, oldest first"""
+        buffer = trails.segments
+        return [
+            buffer.get(i)[0]
+            for start, count in trails.ranges()
+            for i in range(start, start + count)
+        ]
+
+    def test_segment(self):
+        self.assertEqual(len(segment(3, 1, 2, 4, 5, COLOR)), SEGMENT_SIZE)
+        self.assertEqual(
+            segment(3, 1, 2, 4, 5, COLOR),
+            [1, 2, 0.1, 0.2, 0.3, 0.4, 2.0, 3,
+             4, 5, 0.1, 0.2, 0.3, 0.4, 2.0, 3])
+
+    def test_pen(self):
+        trails = Trails()
+        self.assertFalse(trails.isdown(5))
+        trails.pendown(5, 1, 2)
+        self.assertTrue(trails.isdown(5))
+        self.assertFalse(trails.isdown(4))
+        self.assertEqual(list(trails.last[10:12]), [1, 2])
+        trails.penup(5)
+        trails.penup(100)
+        self.assertFalse(trails.isdown(5))
+
+    def test_owner_limit(self):
+        trails = Trails()
+        self.assertRaises(AssertionError, trails.pendown, MAX_OWNER, 0, 0)
+        self.assertRaises(AssertionError, trails.pendown, -1, 0, 0)
+        self.assertFalse(trails.isdown(MAX_OWNER))
+        # the largest owner survives being stored as a float
+        trails.add(segment(MAX_OWNER - 1, 0, 0, 1, 0, COLOR))
+        self.assertEqual(trails.segments.get(0)[7], MAX_OWNER - 1)
+        trails.clear_owned(MAX_OWNER - 2)
+        self.assertEqual(trails.segments.count, 1)
+
+    def test_add_grows(self):
+        trails = Trails(2)
+        trails.add(segments(0, 1, 2))
+        trails.add([])
+        self.assertEqual(len(trails), 3)
+        self.assertEqual(self.starts(trails), [0, 1, 2])
+        self.assertEqual(trails.segments.dirty_ranges(), [(0, 3)])
+
+    def test_ring(self):
+        trails = Trails(capacity=4)
+        trails.add(segments(0, 1, 2))
+        trails.segments.clear_dirty()
+        trails.add(segments(3, 4))
+        self.assertEqual(len(trails), 4)
+        self.assertEqual(trails.head, 1)
+        self.assertEqual(self.starts(trails), [1, 2, 3, 4])
+        self.assertEqual(trails.segments.dirty_ranges(), [(0, 1), (3, 4)])
+        trails.add(segments(5, 6, 7))
+        self.assertEqual(trails.head, 0)
+        self.assertEqual(self.starts(trails), [4, 5, 6, 7])
+        self.assertEqual(trails.ranges(), [(0, 4)])
+
+    def test_ring_overflow(self):
+        trails = Trails(capacity=3)
+        trails.add(segments(0))
+        trails.add(segments(*range(1, 8)))
+        self.assertEqual(self.starts(trails), [5, 6, 7])
+
+    def test_clear(self):
+        trails = Trails(capacity=3)
+        trails.add(segments(0, 1, 2, 3))
+        trails.clear()
+        self.assertEqual(len(trails), 0)
+        self.assertEqual(trails.ranges(), [])
+        trails.add(segments(4))
+        self.assertEqual(self.starts(trails), [4])
+
+    def test_newest(self):
+        trails = Trails(capacity=4)
+        self.assertEqual(trails.newest(2), [])
+        trails.add(segments(0, 1, 2))
+        self.assertEqual(trails.newest(2), [(1, 2)])
+        trails.add(segments(3, 4))
+        self.assertEqual(trails.newest(1), [(0, 1)])
+        self.assertEqual(trails.newest(3), [(2, 2), (0, 1)])
+        self.assertEqual(trails.newest(9), trails.ranges())
+
+    def test_added_and_generation(self):
+        trails = Trails(capacity=2)
+        trails.add(segments(0, 1, 2))
+        self.assertEqual(trails.added, 3)
+        self.assertEqual(trails.generation, 0)
+        trails.clear_owned(5)
+        self.assertEqual(trails.generation, 0)
+        trails.clear_owned(2)
+        self.assertEqual(trails.added, 1)
+        self.assertEqual(trails.generation, 1)
+        trails.clear()
+        self.assertEqual(trails.added, 0)
+        self.assertEqual(trails.generation, 2)
+
+    def test_clear_owned(self):
+        trails = Trails(capacity=4)
+        trails.add(segments(0, 1, 2, 1, 3, 1))
+        trails.clear_owned(1)
+        self.assertEqual(self.starts(trails), [2, 3])
+        trails.clear_owned(7)
+        self.assertEqual(self.starts(trails), [2, 3])
+
+
+class RecordTests(object):
+
+    use_numpy = None
+
+    def setUp(self):
+        self.manager = BufferManager(4)
+        self.trails = Trails()
+        self.manager.create_turtle(0, 'classic', turtle(0, 0), COLOR)
+        self.manager.create_turtle(1, 'square', turtle(5, 5), COLOR)
+        self.manager.create_turtle(2, 'classic', turtle(9, 9), COLOR)
+
+    def move(self, id, x, y):
+        buffer = self.manager.buffers[self.manager.id_to_shape[id]]
+        buffer.get_model(id)[0:2] = [x, y]
+
+    def record(self):
+        self.trails.record(self.manager, self.use_numpy)
+        buffer = self.trails.segments
+        return sorted(
+            tuple(buffer.get(i)[j] for j in (7, 0, 1, 8, 9))
+            for i in range(buffer.count))
+
+    def test_nothing_down(self):
+        self.move(0, 1, 1)
+        self.assertEqual(self.record(), [])
+
+    def test_record(self):
+        self.trails.pendown(0, 0, 0)
+        self.trails.pendown(1, 5, 5)
+        self.move(0, 1, 2)
+        self.move(2, 3, 3)
+        self.assertEqual(self.record(), [(0, 0, 0, 1, 2)])
+        self.assertEqual(
+            [round(v, 4) for v in self.trails.segments.get(0)[2:7]],
+            [0.1, 0.2, 0.3, 0.4, 2.0])
+        self.assertEqual(self.record(), [(0, 0, 0, 1, 2)])
+        self.move(0, 2, 2)
+        self.move(1, 6, 5)
+        self.assertEqual(self.record(), [
+            (0, 0, 0, 1, 2), (0, 1, 2, 2, 2), (1, 5, 5, 6, 5)])
+
+    def test_ignores_destroyed(self):
+        self.trails.pendown(0, 0, 0)
+        self.move(0, 1, 2)
+        self.manager.destroy_turtle(0)
+        self.assertEqual(self.record(), [])
+
+    def test_reused_id_starts_pen_up(self):
+        self.trails.pendown(0, 10, 0)
+        self.manager.destroy_turtle(0)
+        self.trails.forget(0)
+        self.manager.compact()
+        self.manager.create_turtle(0, 'classic', turtle(100, 100), COLOR)
+        self.assertFalse(self.trails.isdown(0))
+        self.assertEqual(self.record(), [])
+
+
+class PythonRecordTestCase(RecordTests, TestCase):
+    use_numpy = False
+
+
+@skipIf(numpy is None, "requires numpy")
+class NumpyRecordTestCase(RecordTests, TestCase):
+    use_numpy = True
+
+
+class CommandTrailTests(object):
+
+    use_numpy = None
+
+    def test_commands_draw_corners(self):
+        manager = BufferManager(4)
+        trails = Trails()
+        commands = CommandQueue(manager, self.use_numpy, trails)
+        manager.create_turtle(0, 'classic', turtle(0, 0), COLOR)
+        manager.create_turtle(1, 'classic', turtle(0, 0), COLOR)
+        trails.pendown(0, 0, 0)
+        for id in (0, 1):
+            commands.forward(id, 10)
+            commands.left(id, 90)
+            commands.forward(id, 5)
+            commands.goto(id, 0, 0)
+        commands.execute()
+        buffer = trails.segments
+        lines = [
+            [round(buffer.get(i)[j], 4) for j in (7, 0, 1, 8, 9)]
+            for i in range(buffer.count)]
+        self.assertEqual(lines, [
+            [0, 0, 0, 10, 0], [0, 10, 0, 10, 5], [0, 10, 5, 0, 0]])
+        # nothing left for record() to add
+        trails.record(manager)
+        self.assertEqual(buffer.count, 3)
+
+    def test_pen_commands_in_order(self):
+        manager = BufferManager(4)
+        trails = Trails()
+        commands = CommandQueue(manager, self.use_numpy, trails)
+        manager.create_turtle(0, 'classic', turtle(0, 0), COLOR)
+        manager.create_turtle(1, 'classic', turtle(0, 0, 90), COLOR)
+        commands.pendown(1)
+        commands.forward(0, 10)
+        commands.pendown(0)
+        commands.forward(1, 2)
+        commands.forward(0, 5)
+        commands.penup(0)
+        commands.penup(1)
+        commands.forward(0, 5)
+        commands.pendown(0)
+        self.assertTrue(commands.isdown(0))
+        self.assertFalse(commands.isdown(1))
+        # nothing is drawn or moved until the queue runs
+        self.assertFalse(trails.isdown(1))
+        self.assertEqual(trails.segments.count, 0)
+        commands.execute()
+        buffer = trails.segments
+        lines = sorted(
+            [round(buffer.get(i)[j], 4) for j in (7, 0, 1, 8, 9)]
+            for i in range(buffer.count))
+        self.assertEqual(lines, [[0, 10, 0, 15, 0], [1, 0, 0, 0, 2]])
+        self.assertTrue(trails.isdown(0))
+        self.assertFalse(trails.isdown(1))
+        self.assertTrue(commands.isdown(0))
+        # the pen went down where the turtle ended up
+        trails.record(manager)
+        self.assertEqual(buffer.count, 2)
+        commands.forward(0, 1)
+        commands.execute()
+        self.assertEqual(
+            [round(v, 4) for v in buffer.get(2)[0:2]], [20, 0])
+
+    def test_clear_command_in_order(self):
+        manager = BufferManager(4)
+        trails = Trails()
+        commands = CommandQueue(manager, self.use_numpy, trails)
+        manager.create_turtle(0, 'classic', turtle(0, 0), COLOR)
+        manager.create_turtle(1, 'classic', turtle(0, 0), COLOR)
+        trails.add(segments(0, 1))
+        commands.pendown(0)
+        commands.pendown(1)
+        for id in (0, 1):
+            commands.forward(id, 10)
+        commands.clear(0)
+        commands.forward(0, 5)
+        commands.forward(1, 5)
+        commands.execute()
+        buffer = trails.segments
+        lines = sorted(
+            [round(buffer.get(i)[j], 4) for j in (7, 0, 1, 8, 9)]
+            for i in range(buffer.count))
+        self.assertEqual(lines, [
+            [0, 10, 0, 15, 0], [1, 0, 0, 10, 0], [1, 1, 0, 2, 0],
+            [1, 10, 0, 15, 0]])
+
+
+class PythonCommandTrailTestCase(CommandTrailTests, TestCase):
+    use_numpy = False
+
+
+@skipIf(numpy is None, "requires numpy")
+class NumpyCommandTrailTestCase(CommandTrailTests, TestCase):
+    use_numpy = True
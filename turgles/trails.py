@@ -0,0 +1,259 @@
+"""Pen trails, the lines turtles draw as they move with their pen down.
+
+Segments are kept in a ChunkBuffer of floats, each two vertices of:
+
+    0:   x position
+    1:   y position
+    2-5: pen r, g, b, alpha
+    6:   pen width
+    7:   owner turtle id
+
+so they can be uploaded as they are and drawn as GL_LINES in one call. New
+segments are appended, either from queued movement (see commands.py), or by
+record(), once per tick, for turtles moved some other way. With a capacity,
+the buffer is a ring, and new segments overwrite the oldest once full.
+
+As owners are floats, only turtles with ids below MAX_OWNER, 2**24, can put
+their pens down, as float32 can't tell all higher ids apart.
+
+Pen state is kept in typed arrays indexed by turtle id, as IdMap does.
+Turtles' pens start up.
+"""
+from __future__ import division, print_function, absolute_import
+
+from array import array
+
+from turgles.buffer import ChunkBuffer
+from turgles.memory import ffi, numpy
+
+VERTEX_SIZE = 8
+SEGMENT_SIZE = 2 * VERTEX_SIZE
+
+# float32 holds every integer up to here, so owners stay exact
+MAX_OWNER = 2 ** 24
+
+# color data slots copied into each vertex, see memory.py
+PEN_COLOR = slice(0, 4)
+PEN_WIDTH = 8
+
+
+def segment(owner, x0, y0, x1, y1, color):
+    """A segment's data, from a turtle's color data"""
+    pen = list(color[PEN_COLOR]) + [color[PEN_WIDTH], owner]
+    return [x0, y0] + pen + [x1, y1] + pen
+
+
+def numpy_segments(owners, x0, y0, x1, y1, colors):
+    """Many segments' data, as a (n, SEGMENT_SIZE) float32 array. colors is
+    an array of each owner's color data"""
+    segments = numpy.empty((len(owners), SEGMENT_SIZE), numpy.float32)
+    for start, x, y in ((0, x0, y0), (VERTEX_SIZE, x1, y1)):
+        segments[:, start] = x
+        segments[:, start + 1] = y
+        segments[:, start + 2:start + 6] = colors[:, PEN_COLOR]
+        segments[:, start + 6] = colors[:, PEN_WIDTH]
+        segments[:, start + 7] = owners
+    return segments
+
+
+class Trails(object):
+
+    def __init__(self, size=1024, capacity=None):
+        self.capacity = capacity
+        self.segments = ChunkBuffer(capacity or size, SEGMENT_SIZE)
+        # in ring mode, the index of the oldest segment, once full
+        self.head = 0
+        # segments added since last cleared, including any overwritten
+        self.added = 0
+        # changes whenever segments are removed, see render/accumulation.py
+        self.generation = 0
+        # by turtle id, 1 if the pen is down
+        self.down = array('b')
+        # by turtle id, the x, y position the turtle's trail has reached
+        self.last = array('f')
+
+    def __len__(self):
+        return self.segments.count
+
+    def ranges(self):
+        """(start, count) ranges of segments, oldest first"""
+        count = self.segments.count
+        if not self.head:
+            return [(0, count)] if count else []
+        return [(self.head, count - self.head), (0, self.head)]
+
+    def newest(self, n):
+        """(start, count) ranges of the newest n segments, oldest first"""
+        newest = []
+        for start, count in reversed(self.ranges()):
+            if n <= 0:
+                break
+            take = min(n, count)
+            newest.insert(0, (start + count - take, take))
+            n -= take
+        return newest
+
+    def pendown(self, id, x, y):
+        assert 0 <= id < MAX_OWNER
+        missing = id + 1 - len(self.down)
+        if missing > 0:
+            self.down.extend(array('b', [0]) * missing)
+            self.last.extend(array('f', [0.0, 0.0]) * missing)
+        self.down[id] = 1
+        self.moved_to(id, x, y)
+
+    def penup(self, id):
+        if self.isdown(id):
+            self.down[id] = 0
+
+    def forget(self, id):
+        """Reset a destroyed turtle's pen, so a turtle reusing its id starts
+        with its pen up"""
+        if 0 <= id < len(self.down):
+            self.down[id] = 0
+            self.last[2 * id] = 0.0
+            self.last[2 * id + 1] = 0.0
+
+    def isdown(self, id):
+        return 0 <= id < len(self.down) and self.down[id] == 1
+
+    def moved_to(self, id, x, y):
+        """Set where a turtle's trail has reached, without drawing to it"""
+        self.last[2 * id] = x
+        self.last[2 * id + 1] = y
+
+    def down_mask(self, ids):
+        """A numpy bool array of whether each of an array of ids' pens is
+        down"""
+        down = numpy.frombuffer(self.down, numpy.int8)
+        known = ids < len(down)
+        mask = numpy.zeros(len(ids), bool)
+        mask[known] = down[ids[known]] == 1
+        return mask
+
+    def numpy_moved_to(self, ids, x, y):
+        """moved_to() for arrays of ids and positions"""
+        last = numpy.frombuffer(self.last, numpy.float32).reshape(-1, 2)
+        last[ids, 0] = x
+        last[ids, 1] = y
+
+    def add(self, segments):
+        """Append segments, a flat list of SEGMENT_SIZE floats per segment,
+        or a float32 array"""
+        if isinstance(segments, (list, tuple)):
+            if not segments:
+                return
+            block = ffi.new('float[]', segments)
+        else:
+            block = ffi.from_buffer(
+                'float[]', numpy.ascontiguousarray(segments, numpy.float32))
+        n = len(block) // SEGMENT_SIZE
+        self.added += n
+        buffer = self.segments
+        if self.capacity is None:
+            buffer.extend(n, block)
+            return
+
+        capacity = self.capacity
+        offset = 0
+        if n > capacity:
+            # only the newest would survive
+            offset = n - capacity
+            n = capacity
+        room = min(capacity - buffer.count, n)
+        if room:
+            start = offset * SEGMENT_SIZE
+            buffer.extend(room, block[start:start + room * SEGMENT_SIZE])
+            offset += room
+            n -= room
+        segment_bytes = SEGMENT_SIZE * buffer.ctype_size
+        while n:
+            # overwrite the oldest
+            length = min(n, capacity - self.head)
+            ffi.memmove(
+                buffer.data + self.head * SEGMENT_SIZE,
+                block + offset * SEGMENT_SIZE,
+                length * segment_bytes)
+            buffer.mark_dirty(self.head, self.head + length)
+            self.head = (self.head + length) % capacity
+            offset += length
+            n -= length
+
+    def record(self, manager, use_numpy=True):
+        """Add a segment for each turtle with its pen down that has moved
+        since its trail was last extended"""
+        if 1 not in self.down:
+            return
+        with manager.lock:
+            if use_numpy and numpy is not None:
+                self._record_numpy(manager)
+            else:
+                self._record_python(manager)
+
+    def _record_python(self, manager):
+        segments = []
+        for id, down in enumerate(self.down):
+            shape = manager.id_to_shape.get(id)
+            if not down or shape is None:
+                continue
+            model, color = manager.buffers[shape].get(id)
+            x, y = model[0], model[1]
+            x0, y0 = self.last[2 * id], self.last[2 * id + 1]
+            if x != x0 or y != y0:
+                segments.extend(segment(id, x0, y0, x, y, color))
+                self.moved_to(id, x, y)
+        self.add(segments)
+
+    def _record_numpy(self, manager):
+        down = numpy.flatnonzero(numpy.frombuffer(self.down, numpy.int8))
+        last = numpy.frombuffer(self.last, numpy.float32).reshape(-1, 2)
+        for buffer in manager.buffers.values():
+            if not buffer.count:
+                continue
+            index = buffer.slots.indices(down)
+            live = index >= 0
+            ids = down[live]
+            index = index[live]
+            model = buffer.model.as_array()
+            x = model[index, 0]
+            y = model[index, 1]
+            moved = (x != last[ids, 0]) | (y != last[ids, 1])
+            if not moved.any():
+                continue
+            ids = ids[moved]
+            x = x[moved]
+            y = y[moved]
+            self.add(numpy_segments(
+                ids, last[ids, 0], last[ids, 1], x, y,
+                buffer.color.as_array()[index[moved]]))
+            self.numpy_moved_to(ids, x, y)
+
+    def clear(self):
+        self.segments.count = 0
+        self.segments.clear_dirty()
+        self.head = 0
+        self.added = 0
+        self.generation += 1
+
+    def clear_owned(self, owner):
+        """Remove a turtle's segments, keeping the rest in order"""
+        buffer = self.segments
+        ordered = [
+            i for start, count in self.ranges()
+            for i in range(start, start + count)
+        ]
+        if numpy is not None:
+            data = buffer.as_array()[ordered]
+            kept = data[data[:, 7] != owner]
+            if len(kept) == len(data):
+                return
+        else:
+            kept = []
+            for i in ordered:
+                chunk = buffer.get(i)
+                if chunk[7] != owner:
+                    kept.extend(chunk)
+            if len(kept) == len(ordered) * SEGMENT_SIZE:
+                return
+        self.clear()
+        self.add(kept)
@@ -14,6 +14,13 @@ class Turgle(object):
         self.model = model
         self.color = color
         self._shape = shape
+        self._commands = renderer.commands
+
+    def _model_changed(self):
+        self.renderer.manager.mark_dirty(self.model.id, color=False)
+
+    def _color_changed(self):
+        self.renderer.manager.mark_dirty(self.model.id, model=False)
 
     def shape(self, shape=None):
         """We need to shift buffers in order to change shape"""
@@ -23,6 +30,7 @@ class Turgle(object):
         self.model.data = data
         self.color = color
         self._shape = shape
+        self.renderer.relink_moved()
 
     def shapesize(self, stretch_wid=None, stretch_len=None, outline=None):
         #TODO: outline
@@ -38,9 +46,45 @@ class Turgle(object):
             else:
                 self.model.data[2] = stretch_wid
                 self.model.data[3] = stretch_len
+            self._model_changed()
 
     turtlesize = shapesize
 
+    # Movement is queued, and applied in one batch by the renderer, see
+    # commands.py. So the model data only changes after the next execute().
+
+    def forward(self, distance):
+        self._commands.forward(self.model.id, distance)
+
+    fd = forward
+
+    def back(self, distance):
+        self._commands.back(self.model.id, distance)
+
+    bk = backward = back
+
+    def left(self, angle):
+        self._commands.left(self.model.id, angle)
+
+    lt = left
+
+    def right(self, angle):
+        self._commands.right(self.model.id, angle)
+
+    rt = right
+
+    def goto(self, x, y=None):
+        if y is None:
+            x, y = x
+        self._commands.goto(self.model.id, x, y)
+
+    setpos = setposition = goto
+
+    def setheading(self, angle):
+        self._commands.setheading(self.model.id, angle)
+
+    seth = setheading
+
     def _get_color_values(self, color):
         if color in COLORS:
             color = COLORS[color]
@@ -76,6 +120,7 @@ class Turgle(object):
             self.fillcolor(args[1])
         else:
             raise Exception("Invalid color arguments")
+        self._color_changed()
 
     def pencolor(self, *args):
         #TODO: store string names
@@ -87,6 +132,7 @@ class Turgle(object):
             # rgb params
             color_vals = self._get_color_values(args)
         self.color[0:3] = color_vals
+        self._color_changed()
 
     def fillcolor(self, *args):
         #TODO: store string names
@@ -98,30 +144,34 @@ class Turgle(object):
             # rgb params
             color_vals = self._get_color_values(args)
         self.color[4:7] = color_vals
+        self._color_changed()
 
     def hideturtle(self):
-        # TODO
-        pass
+        """Hidden turtles are not uploaded or drawn, see ShapeBuffer"""
+        self.renderer.manager.hide(self.model.id)
+        self.renderer.relink_moved()
 
     ht = hideturtle
 
     def showturtle(self):
-        # TODO
-        pass
+        self.renderer.manager.show(self.model.id)
+        self.renderer.relink_moved()
 
     st = showturtle
 
     def isvisible(self):
-        # TODO
-        return True
+        return self.renderer.manager.is_visible(self.model.id)
+
+    # Pen and fill changes are queued with movement, so queued moves are
+    # drawn and filled as things were when they were queued.
 
     def pendown(self):
-        pass
+        self._commands.pendown(self.model.id)
 
     pd = down = pendown
 
     def penup(self):
-        pass
+        self._commands.penup(self.model.id)
 
     pu = up = penup
 
@@ -130,6 +180,7 @@ class Turgle(object):
             return self.color[8]
         else:
             self.color[8] = size
+            self._color_changed()
 
     width = pensize
 
@@ -137,28 +188,39 @@ class Turgle(object):
         pass
 
     def isdown(self):
-        return False
+        return self._commands.isdown(self.model.id)
 
-    def begin_fill():
-        pass
+    def begin_fill(self):
+        """Start recording the path to fill, see fills.py"""
+        self._commands.begin_fill(self.model.id)
 
-    def end_fill():
-        pass
+    def end_fill(self):
+        """Fill the path since begin_fill(), with the current fill color"""
+        self._commands.end_fill(self.model.id, self.color)
+
+    def filling(self):
+        return self._commands.isfilling(self.model.id)
 
     def dot(self):
         pass
 
     def stamp(self):
-        pass
+        """Leave a copy of the turtle here, returning its stamp id"""
+        # made hidden now, and placed where queued movement leaves the turtle
+        id = self.renderer.stamps.stamp(
+            self.model.id, self._shape, self.model.data, self.color, True)
+        self._commands.stamp(self.model.id, id)
+        return id
 
-    def clear():
-        pass
+    def clear(self):
+        self.clearstamps()
+        self._commands.clear(self.model.id)
 
     def clearstamp(self, id):
-        pass
+        self.renderer.stamps.clear(id)
 
-    def clearstamps(self):
-        pass
+    def clearstamps(self, n=None):
+        self.renderer.stamps.clear_owned(self.model.id, n)
 
     def write(self):
         pass